@@ -0,0 +1 @@
+"""Benchmarks of the database client, run each with python -m benchmarks.<name>."""
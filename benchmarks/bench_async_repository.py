@@ -0,0 +1,70 @@
+"""Compare concurrent async and sync repository calls.
+
+Async native_sql with gather against the sync repository offloaded to threads with
+asyncio.to_thread.
+
+Usage::
+
+    python -m benchmarks.bench_async_repository --requests 2000 --concurrency 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+
+from tests.fixtures_db import Hero
+
+from qpydao import RepositoryMeta, gather, native_sql
+
+SQL = "select * from hero where name= :name"
+
+
+class SyncRepo(metaclass=RepositoryMeta, base_type=Hero):
+    @native_sql(SQL)
+    def find_hero_by_name(self, name): ...
+
+
+class AsyncRepo(metaclass=RepositoryMeta, base_type=Hero):
+    @native_sql(SQL)
+    async def find_hero_by_name(self, name): ...
+
+
+async def to_thread(requests: int, concurrency: int) -> None:
+    repo = SyncRepo()
+    await gather(
+        *(
+            asyncio.to_thread(repo.find_hero_by_name, name="test6")
+            for _ in range(requests)
+        ),
+        concurrency=concurrency,
+    )
+
+
+async def async_native(requests: int, concurrency: int) -> None:
+    repo = AsyncRepo()
+    await gather(
+        *(repo.find_hero_by_name(name="test6") for _ in range(requests)),
+        concurrency=concurrency,
+    )
+
+
+STRATEGIES = [to_thread, async_native]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    for strategy in STRATEGIES:
+        start = time.perf_counter()
+        asyncio.run(strategy(args.requests, args.concurrency))
+        elapsed = time.perf_counter() - start
+        print(f"{strategy.__name__:<20} {args.requests / elapsed:12.1f} calls/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Compare concurrent read throughput of the async and sync client paths.
+
+Usage::
+
+    python -m benchmarks.bench_async_vs_sync --requests 2000 --concurrency 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from qpydao import databases
+
+SQL = "select * from hero where name= :name"
+
+
+def run_sync(client, requests: int, concurrency: int) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(
+            executor.map(
+                lambda _: client.plain_query(SQL, name="test6"), range(requests)
+            )
+        )
+    return requests / (time.perf_counter() - start)
+
+
+async def run_async(client, requests: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await client.async_plain_query(SQL, name="test6")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return requests / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default="default")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    client = databases.get_db(args.db)
+    sync_qps = run_sync(client, args.requests, args.concurrency)
+    async_qps = asyncio.run(run_async(client, args.requests, args.concurrency))
+    print(f"sync  (threads): {sync_qps:10.1f} queries/sec")
+    print(f"async (asyncio): {async_qps:10.1f} queries/sec")
+
+
+if __name__ == "__main__":
+    main()
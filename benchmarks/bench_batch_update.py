@@ -0,0 +1,68 @@
+"""Compare rows/sec of per-row and batched update and delete.
+
+Usage::
+
+    python -m benchmarks.bench_batch_update --rows 5000 --chunk-size 1000
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+from tests.fixtures_db import Hero
+
+from qpydao import databases, init_database
+
+
+def insert_heroes(client, rows: int, prefix: str) -> list[Hero]:
+    heroes = [
+        Hero(name=f"{prefix}{i}", secret_name="bench", age=i) for i in range(rows)
+    ]
+    client.batch_save(heroes)
+    return heroes
+
+
+def update_by_id_loop(client, heroes, chunk_size):
+    for hero in heroes:
+        hero.age += 1
+        client.update_by_id(hero)
+
+
+def batch_update(client, heroes, chunk_size):
+    for hero in heroes:
+        hero.age += 1
+    client.batch_update(heroes, chunk_size=chunk_size)
+
+
+def delete_by_loop(client, heroes, chunk_size):
+    for hero in heroes:
+        client.delete_by(Hero, id=hero.id)
+
+
+def batch_delete(client, heroes, chunk_size):
+    client.batch_delete(Hero, [hero.id for hero in heroes], chunk_size=chunk_size)
+
+
+STRATEGIES = [update_by_id_loop, batch_update, delete_by_loop, batch_delete]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default="default")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+    client = databases.get_db(args.db)
+    init_database(client)
+
+    for strategy in STRATEGIES:
+        heroes = insert_heroes(client, args.rows, strategy.__name__)
+        start = time.perf_counter()
+        strategy(client, heroes, args.chunk_size)
+        elapsed = time.perf_counter() - start
+        print(f"{strategy.__name__:<20} {args.rows / elapsed:12.1f} rows/sec")
+
+
+if __name__ == "__main__":
+    main()
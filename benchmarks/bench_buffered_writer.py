@@ -0,0 +1,49 @@
+"""Compare rows/sec of save per event and a BufferedWriter.
+
+Usage::
+
+    python -m benchmarks.bench_buffered_writer --rows 20000 --max-rows 1000
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+from tests.fixtures_db import Hero
+
+from qpydao import databases, init_database
+
+
+def save_each(client, rows: int, max_rows: int) -> None:
+    for i in range(rows):
+        client.save(Hero(name="event", secret_name="bench", age=i))
+
+
+def buffered(client, rows: int, max_rows: int) -> None:
+    with client.buffered_writer(max_rows=max_rows, max_pending=max_rows * 10) as writer:
+        for i in range(rows):
+            writer.save(Hero(name="event", secret_name="bench", age=i))
+
+
+STRATEGIES = [save_each, buffered]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default="default")
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--max-rows", type=int, default=1000)
+    args = parser.parse_args()
+    client = databases.get_db(args.db)
+    init_database(client)
+
+    for strategy in STRATEGIES:
+        start = time.perf_counter()
+        strategy(client, args.rows, args.max_rows)
+        elapsed = time.perf_counter() - start
+        print(f"{strategy.__name__:<20} {args.rows / elapsed:12.1f} rows/sec")
+
+
+if __name__ == "__main__":
+    main()
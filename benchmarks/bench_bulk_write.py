@@ -0,0 +1,85 @@
+"""Compare rows/sec of the bulk write strategies.
+
+Usage::
+
+    python -m benchmarks.bench_bulk_write --rows 50000 --chunk-size 1000
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+from sqlmodel import Session
+from tests.fixtures_db import Hero
+
+from qpydao import databases, init_database
+
+
+def make_heroes(rows: int, prefix: str) -> list[Hero]:
+    return [Hero(name=f"{prefix}{i}", secret_name="bench", age=i) for i in range(rows)]
+
+
+def bulk_save_objects(client, rows, chunk_size):
+    heroes = make_heroes(rows, "orm")
+    with Session(client.engine) as s:
+        s.bulk_save_objects(heroes, return_defaults=True)
+        s.commit()
+
+
+def batch_save(client, rows, chunk_size):
+    client.batch_save(make_heroes(rows, "save"), chunk_size=chunk_size)
+
+
+def batch_insert(client, rows, chunk_size):
+    client.batch_insert(Hero, make_heroes(rows, "insert"), chunk_size=chunk_size)
+
+
+def batch_insert_returning(client, rows, chunk_size):
+    client.batch_insert(
+        Hero, make_heroes(rows, "returning"), chunk_size=chunk_size, returning=True
+    )
+
+
+def batch_upsert(client, rows, chunk_size):
+    client.batch_upsert(
+        Hero, make_heroes(rows, "upsert"), conflict_keys=["id"], chunk_size=chunk_size
+    )
+
+
+def copy_insert(client, rows, chunk_size):
+    client.copy_insert(Hero, make_heroes(rows, "copy"))
+
+
+STRATEGIES = [
+    bulk_save_objects,
+    batch_save,
+    batch_insert,
+    batch_insert_returning,
+    batch_upsert,
+    copy_insert,
+]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default="default")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+    client = databases.get_db(args.db)
+    init_database(client)
+
+    for strategy in STRATEGIES:
+        start = time.perf_counter()
+        try:
+            strategy(client, args.rows, args.chunk_size)
+        except Exception as e:
+            print(f"{strategy.__name__:<24} skipped: {e}")
+            continue
+        elapsed = time.perf_counter() - start
+        print(f"{strategy.__name__:<24} {args.rows / elapsed:12.1f} rows/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Compare plain_query + manual transpose against query_columnar.
+
+Usage::
+
+    python -m benchmarks.bench_columnar --sql "select * from hero"
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+import tracemalloc
+
+from qpydao import databases
+
+
+def measure(label, fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<24} {elapsed:8.3f}s peak={peak / 1024 / 1024:8.2f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default="default")
+    parser.add_argument("--sql", default="select * from hero")
+    parser.add_argument("--output", default="numpy")
+    args = parser.parse_args()
+    client = databases.get_db(args.db)
+
+    def rows_then_columns():
+        import numpy
+
+        rows = client.plain_query(args.sql)
+        if rows:
+            {key: numpy.asarray([row[key] for row in rows]) for key in rows[0]}
+
+    measure("plain_query transpose", rows_then_columns)
+    measure(
+        f"query_columnar {args.output}",
+        lambda: client.query_columnar(args.sql, output=args.output),
+    )
+
+
+if __name__ == "__main__":
+    main()
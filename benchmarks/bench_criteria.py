@@ -0,0 +1,60 @@
+"""Compare a LIKE '%x%' query with index-friendly criteria on an indexed column.
+
+The index report of the criteria is printed too.
+
+Usage::
+
+    python -m benchmarks.bench_criteria --rows 100000 --calls 200
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+from sqlmodel import select
+from tests.fixtures_db import Hero
+
+from qpydao import databases, init_database
+
+
+def like_anywhere(client, i):
+    client.query_for_model(select(Hero).where(Hero.name.like(f"%criteria{i}%")))
+
+
+def prefix_criteria(client, i):
+    client.find_by(Hero, name__startswith=f"criteria{i}")
+
+
+def range_criteria(client, i):
+    client.find_by(Hero, id__between=(i * 100, i * 100 + 10))
+
+
+STRATEGIES = [like_anywhere, prefix_criteria, range_criteria]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default="default")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+    client = databases.get_db(args.db)
+    init_database(client)
+    client.execute("CREATE INDEX IF NOT EXISTS ix_hero_name ON hero (name)")
+    client.batch_insert(
+        Hero,
+        [Hero(name=f"criteria{i}", secret_name="b", age=i) for i in range(args.rows)],
+    )
+    print(client.index_report(Hero, name__startswith="x", id__between=(1, 2)))
+
+    for strategy in STRATEGIES:
+        start = time.perf_counter()
+        for i in range(args.calls):
+            strategy(client, i)
+        elapsed = time.perf_counter() - start
+        print(f"{strategy.__name__:<20} {args.calls / elapsed:12.1f} queries/sec")
+
+
+if __name__ == "__main__":
+    main()
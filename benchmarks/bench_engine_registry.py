@@ -0,0 +1,50 @@
+"""Compare gateway style requests with and without the engine registry.
+
+A new client per request against Databases.invoke, which reuses the registered
+client and its engine.
+
+Usage::
+
+    python -m benchmarks.bench_engine_registry --requests 500
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+from qpydao import DatabaseClient, SqlRequestModel, databases
+
+SQL = "select 1"
+
+
+def new_client(request: SqlRequestModel) -> None:
+    DatabaseClient(request.config).execute(request.sql, **request.parameters)
+
+
+def invoke(request: SqlRequestModel) -> None:
+    databases.invoke(request)
+
+
+STRATEGIES = [new_client, invoke]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default="default")
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+    config = databases.get_db(args.db).config
+    request = SqlRequestModel(config=config, sql=SQL, db_name="bench_gateway")
+
+    for strategy in STRATEGIES:
+        start = time.perf_counter()
+        for _ in range(args.requests):
+            strategy(request)
+        elapsed = time.perf_counter() - start
+        print(f"{strategy.__name__:<20} {args.requests / elapsed:12.1f} requests/sec")
+    print(databases.engine_stats())
+
+
+if __name__ == "__main__":
+    main()
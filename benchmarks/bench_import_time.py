@@ -0,0 +1,64 @@
+"""Measure qpydao startup in fresh interpreters against a time budget.
+
+Usage::
+
+    python -m benchmarks.bench_import_time --repeat 10 --budget 0.1
+
+Exits with status 1 when the median ``import qpydao`` exceeds the budget.
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import subprocess
+import sys
+
+STATEMENTS = {
+    "import qpydao": "import qpydao",
+    "client class": "from qpydao import DatabaseClient",
+    "default client": "from qpydao import db",
+}
+
+_PROBE = """
+import time
+start = time.perf_counter()
+{statement}
+print(time.perf_counter() - start)
+"""
+
+
+def measure(statement: str, repeat: int) -> list[float]:
+    return [
+        float(
+            subprocess.run(  # noqa: S603
+                [sys.executable, "-c", _PROBE.format(statement=statement)],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.splitlines()[-1]
+        )
+        for _ in range(repeat)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--budget", type=float, default=0.1)
+    args = parser.parse_args()
+    medians = {}
+    for label, statement in STATEMENTS.items():
+        timings = measure(statement, args.repeat)
+        medians[label] = statistics.median(timings)
+        print(
+            f"{label:<16} median={medians[label] * 1000:8.2f}ms "
+            f"min={min(timings) * 1000:8.2f}ms max={max(timings) * 1000:8.2f}ms"
+        )
+    if medians["import qpydao"] > args.budget:
+        print(f"import qpydao exceeds the {args.budget * 1000:.0f}ms budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
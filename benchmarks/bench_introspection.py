@@ -0,0 +1,69 @@
+"""Compare full reflection, snapshot refresh and a current snapshot at startup.
+
+Usage::
+
+    python -m benchmarks.bench_introspection --tables 500
+"""
+
+from __future__ import annotations
+
+import argparse
+import tempfile
+import time
+
+from sqlalchemy import Column, Integer, MetaData, String, Table
+
+from qpydao import SchemaIntrospector, databases
+
+
+def create_tables(client, tables: int) -> MetaData:
+    metadata = MetaData()
+    for i in range(tables):
+        Table(
+            f"bench_introspect_{i}",
+            metadata,
+            Column("id", Integer, primary_key=True),
+            Column("name", String(64), nullable=False),
+            Column("note", String(256)),
+        )
+    metadata.create_all(client.engine)
+    return metadata
+
+
+def full_reflection(client, cache_dir):
+    MetaData().reflect(client.engine)
+
+
+def cold_snapshot(client, cache_dir):
+    SchemaIntrospector(client, cache_dir=tempfile.mkdtemp()).refresh()
+
+
+def current_snapshot(client, cache_dir):
+    SchemaIntrospector(client, cache_dir=cache_dir).refresh()
+
+
+STRATEGIES = [full_reflection, cold_snapshot, current_snapshot]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default="default")
+    parser.add_argument("--tables", type=int, default=500)
+    args = parser.parse_args()
+    client = databases.get_db(args.db)
+    metadata = create_tables(client, args.tables)
+    cache_dir = tempfile.mkdtemp()
+    SchemaIntrospector(client, cache_dir=cache_dir).refresh()
+
+    try:
+        for strategy in STRATEGIES:
+            start = time.perf_counter()
+            strategy(client, cache_dir)
+            elapsed = time.perf_counter() - start
+            print(f"{strategy.__name__:<20} {elapsed * 1000:12.1f} ms")
+    finally:
+        metadata.drop_all(client.engine)
+
+
+if __name__ == "__main__":
+    main()
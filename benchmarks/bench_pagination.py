@@ -0,0 +1,65 @@
+"""Compare deep page latency of OFFSET and keyset pagination.
+
+Usage::
+
+    python -m benchmarks.bench_pagination --pages 200 --page-size 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+from sqlmodel import SQLModel, select
+
+from qpydao import databases
+
+
+def entity_for(table: str) -> type[SQLModel]:
+    for mapper in SQLModel._sa_registry.mappers:
+        if mapper.local_table.name == table:
+            return mapper.class_
+    raise SystemExit(f"no SQLModel table named {table}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default="default")
+    parser.add_argument("--module", default="tests.fixtures_db")
+    parser.add_argument("--table", default="hero")
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--page-size", type=int, default=50)
+    args = parser.parse_args()
+    __import__(args.module)
+    client = databases.get_db(args.db)
+    entity = entity_for(args.table)
+
+    start = time.perf_counter()
+    last = 0.0
+    for n in range(args.pages):
+        page_start = time.perf_counter()
+        statement = (
+            select(entity)
+            .order_by(entity.id)
+            .offset(n * args.page_size)
+            .limit(args.page_size)
+        )
+        if not client.query_for_model(statement):
+            break
+        last = time.perf_counter() - page_start
+    print(f"offset   total={time.perf_counter() - start:8.3f}s last page={last:8.5f}s")
+
+    start = time.perf_counter()
+    after = None
+    for _ in range(args.pages):
+        page_start = time.perf_counter()
+        page = client.paginate(entity, after=after, page_size=args.page_size)
+        last = time.perf_counter() - page_start
+        if not page.has_more:
+            break
+        after = page.next_cursor
+    print(f"keyset   total={time.perf_counter() - start:8.3f}s last page={last:8.5f}s")
+
+
+if __name__ == "__main__":
+    main()
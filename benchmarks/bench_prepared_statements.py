@@ -0,0 +1,64 @@
+"""Compare native_sql latency with and without server side prepared statements.
+
+Needs a postgresql+psycopg database::
+
+    python -m benchmarks.bench_prepared_statements --calls 2000
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import time
+
+from tests.fixtures_db import Hero
+
+from qpydao import RepositoryMeta, database_config, databases, native_sql
+
+
+class HeroRepo(metaclass=RepositoryMeta, base_type=Hero):
+    @native_sql(
+        "select * from hero where age >= :age and name like :name order by id limit 10",
+        validate=False,
+    )
+    def find_heroes(self, age, name): ...
+
+
+def measure(label: str, db_name: str, calls: int):
+    repo = HeroRepo()
+    repo.db_qualifier = db_name
+    repo.find_heroes(age=0, name="%")
+    timings = []
+    for i in range(calls):
+        start = time.perf_counter()
+        repo.find_heroes(age=i % 50, name="test%")
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    print(
+        f"{label:<14} median={statistics.median(timings) * 1e6:9.1f}us "
+        f"p99={timings[int(len(timings) * 0.99)] * 1e6:9.1f}us"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default="default")
+    parser.add_argument("--calls", type=int, default=2000)
+    args = parser.parse_args()
+    config = database_config(args.db)
+    if not config.db_url.startswith("postgresql+psycopg"):
+        raise SystemExit("prepared statements need a postgresql+psycopg db_url")
+
+    variants = {
+        "unprepared": {"transaction_pooling": True},
+        "threshold=5": {"prepare_threshold": 5},
+        "threshold=0": {"prepare_threshold": 0, "prepared_max": 200},
+    }
+    for label, update in variants.items():
+        name = f"bench_{label}"
+        databases.register_db(name, config.model_copy(update=update))
+        measure(label, name, args.calls)
+
+
+if __name__ == "__main__":
+    main()
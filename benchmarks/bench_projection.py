@@ -0,0 +1,64 @@
+"""Compare find_by on a model with a wide text column.
+
+Loading whole models against deferring the column and selecting only the needed
+columns.
+
+Usage::
+
+    python -m benchmarks.bench_projection --rows 2000 --story-size 20000
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+from tests.fixtures_db import HeroStory
+
+from qpydao import databases, init_database
+
+
+def full_models(client):
+    return client.find_by(HeroStory, exclude=(), name="bench")
+
+
+def deferred_models(client):
+    return client.find_by(HeroStory, name="bench")
+
+
+def columns_only(client):
+    return client.find_by(HeroStory, columns=["id", "name"], name="bench")
+
+
+STRATEGIES = [full_models, deferred_models, columns_only]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default="default")
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--story-size", type=int, default=20_000)
+    parser.add_argument("--calls", type=int, default=20)
+    args = parser.parse_args()
+    client = databases.get_db(args.db)
+    init_database(client)
+    client.delete_by(HeroStory, name="bench")
+    client.batch_insert(
+        HeroStory,
+        [
+            HeroStory(name="bench", story="x" * args.story_size)
+            for _ in range(args.rows)
+        ],
+    )
+
+    for strategy in STRATEGIES:
+        start = time.perf_counter()
+        for _ in range(args.calls):
+            rows = strategy(client)
+        elapsed = time.perf_counter() - start
+        rate = args.calls * len(rows) / elapsed
+        print(f"{strategy.__name__:<16} {rate:12.0f} rows/sec")
+
+
+if __name__ == "__main__":
+    main()
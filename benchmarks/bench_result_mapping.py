@@ -0,0 +1,66 @@
+"""Compare rows/sec of the SqlResultMapper mapping modes, no database needed.
+
+Usage::
+
+    python -m benchmarks.bench_result_mapping --rows 100000
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from datetime import datetime
+
+from pydantic import BaseModel
+from tests.fixtures_db import Hero
+
+from qpydao import SqlResultMapper
+
+
+class HeroView(BaseModel):
+    id: int
+    name: str
+    secret_name: str
+    age: int | None = None
+    created_date: datetime
+
+
+def measure(label, fn, rows):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {rows / elapsed:12.1f} rows/sec")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    args = parser.parse_args()
+    now = datetime.now()
+    rows = [
+        {"id": i, "name": f"n{i}", "secret_name": "s", "age": i, "created_date": now}
+        for i in range(args.rows)
+    ]
+    for model_type in (Hero, HeroView):
+        name = model_type.__name__
+        measure(
+            f"{name} validate",
+            lambda m=model_type: SqlResultMapper.sql_result_to_model(rows, m),
+            args.rows,
+        )
+        measure(
+            f"{name} validate=False",
+            lambda m=model_type: SqlResultMapper.sql_result_to_model(
+                rows, m, validate=False
+            ),
+            args.rows,
+        )
+    measure(
+        "records",
+        lambda: SqlResultMapper.sql_result_to_records(rows, Hero),
+        args.rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
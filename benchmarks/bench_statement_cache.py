@@ -0,0 +1,44 @@
+"""Compare statement construction with and without the statement cache.
+
+Both loops also generate the SQLAlchemy cache key, which every execution
+does before it looks up the compiled form.
+
+Usage::
+
+    python -m benchmarks.bench_statement_cache --iterations 20000
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+from sqlmodel import select
+from tests.fixtures_db import Hero
+
+from qpydao import SqlBuilder
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=10000)
+    args = parser.parse_args()
+    start = time.perf_counter()
+    for i in range(args.iterations):
+        statement = select(Hero).filter_by(name=f"n{i}", age=i)
+        statement._generate_cache_key()
+    uncached = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(args.iterations):
+        statement, params = SqlBuilder.prepare_select(Hero, name=f"n{i}", age=i)
+        statement._generate_cache_key()
+    cached = time.perf_counter() - start
+
+    print(f"uncached: {args.iterations / uncached:12.1f} statements/sec")
+    print(f"cached  : {args.iterations / cached:12.1f} statements/sec")
+    print(SqlBuilder.cache_stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Compare peak memory of fully loaded and streamed query results.
+
+Usage::
+
+    python -m benchmarks.bench_streaming --sql "select * from hero" --batch-size 1000
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+import tracemalloc
+
+from qpydao import SqlResultMapper, databases
+
+
+def measure(label: str, consume):
+    tracemalloc.start()
+    start = time.perf_counter()
+    rows = consume()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    mib = peak / 1024 / 1024
+    print(f"{label:<12} rows={rows:<10} {elapsed:8.3f}s peak={mib:8.2f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default="default")
+    parser.add_argument("--sql", default="select * from hero")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    client = databases.get_db(args.db)
+
+    def load_all():
+        return len(
+            SqlResultMapper.sql_result_to_model(client.plain_query(args.sql), dict)
+        )
+
+    def stream():
+        return sum(
+            1 for _ in client.stream_models(args.sql, dict, batch_size=args.batch_size)
+        )
+
+    measure("plain_query", load_all)
+    measure("stream", stream)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Compare rows/sec of copying a table through memory and with copy_table.
+
+Usage::
+
+    python -m benchmarks.bench_table_copy --rows 100000 --workers 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+from tests.fixtures_db import Hero
+from tests.test_table_copy import HeroArchive
+
+from qpydao import databases, init_database
+
+
+def in_memory(client, args):
+    heroes = client.find_by(Hero)
+    client.batch_insert(HeroArchive, [hero.model_dump() for hero in heroes])
+
+
+def pipeline(client, args):
+    databases.copy_table(
+        args.db,
+        args.db,
+        Hero,
+        HeroArchive,
+        workers=args.workers,
+        batch_size=args.batch_size,
+    )
+
+
+STRATEGIES = [in_memory, pipeline]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default="default")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+    client = databases.get_db(args.db)
+    init_database(client)
+    client.execute("DELETE FROM hero")
+    heroes = [Hero(name=f"copy{i}", secret_name="b", age=i) for i in range(args.rows)]
+    client.batch_insert(Hero, heroes)
+
+    for strategy in STRATEGIES:
+        client.execute("DELETE FROM heroarchive")
+        start = time.perf_counter()
+        strategy(client, args)
+        elapsed = time.perf_counter() - start
+        print(f"{strategy.__name__:<20} {args.rows / elapsed:12.1f} rows/sec")
+
+
+if __name__ == "__main__":
+    main()
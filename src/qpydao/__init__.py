@@ -1,7 +1,151 @@
-from .dao_logger import *
-from .database_client import *
-from .decorators import *
-from .exceptions import *
-from .models import *
-from .repository import *
-from .sql_utils import *
+"""qpydao: database access with sqlmodel/sqlalchemy.
+
+Submodules are imported on first attribute access (PEP 562), so
+``import qpydao`` does not load sqlalchemy, sqlmodel or the settings.
+"""
+
+from __future__ import annotations
+
+import importlib
+import sys
+import types
+
+_EXPORTS = {
+    "buffered": (
+        "AsyncBufferedWriter",
+        "BufferedWriter",
+        "FlushFailure",
+        "WriterStats",
+    ),
+    "caching": ("CacheStats", "LRUCache", "ResultCache", "query_key"),
+    "columnar": (
+        "COLUMNAR_OUTPUTS",
+        "fetch_columns",
+        "to_arrow",
+        "to_columnar",
+        "to_numpy",
+    ),
+    "criteria": (
+        "OPERATORS",
+        "SEARCH_CONFIG",
+        "Criterion",
+        "IndexAdvice",
+        "IndexReport",
+        "index_report",
+        "parse_criteria",
+    ),
+    "dao_logger": ("dao_logger",),
+    "database_client": (
+        "DatabaseClient",
+        "Databases",
+        "databases",
+        "db",
+        "get_databases",
+        "init_database",
+    ),
+    "decorators": ("native_sql",),
+    "engines": (
+        "EngineRegistry",
+        "EngineStats",
+        "PoolStatus",
+        "RecentCheckinPrePing",
+        "TimedAsyncAdaptedQueuePool",
+        "TimedQueuePool",
+        "build_async_engine",
+        "build_engine",
+        "config_fingerprint",
+        "dispose_engine",
+        "engine_options",
+        "pool_status",
+        "prepared_statement_args",
+        "supports_async",
+    ),
+    "exceptions": (
+        "DAOException",
+        "DatabaseClientConfigError",
+        "RecordNotFoundException",
+    ),
+    "fanout": ("FanOutResult", "run_fan_out"),
+    "instrumentation": (
+        "LATENCY_BUCKETS",
+        "InMemoryExporter",
+        "LoggingExporter",
+        "ProfileSnapshot",
+        "PrometheusExporter",
+        "QueryProfiler",
+        "QueryRecord",
+        "StatementStats",
+    ),
+    "introspection": (
+        "SchemaIntrospector",
+        "SchemaSnapshot",
+        "field_meta",
+        "schema_hash",
+    ),
+    "models": (
+        "BaseEntity",
+        "BaseIDModel",
+        "DatabaseConfig",
+        "FieldMeta",
+        "SingletonMeta",
+        "SqlRequestModel",
+        "TableMeta",
+        "database_config",
+    ),
+    "pagination": (
+        "Page",
+        "decode_cursor",
+        "encode_cursor",
+        "keyset_predicate",
+        "keyset_select",
+        "keyset_sql",
+        "parse_order_by",
+        "with_primary_key",
+    ),
+    "projection": ("deferred_columns", "projection"),
+    "repository": ("RepositoryMeta", "gather"),
+    "routing": ("REPLICA_STRATEGIES", "Replica", "ReplicaRouter", "ReplicaStatus"),
+    "singleflight": ("AsyncSingleFlight", "FlightStats", "SingleFlight"),
+    "sql_utils": (
+        "SqlBuilder",
+        "SqlResultMapper",
+        "chunked",
+        "primary_key",
+        "referenced_tables",
+        "table_name",
+    ),
+    "table_copy": ("COPY_METHODS", "CopyStats", "copy_table", "key_ranges"),
+}
+
+_LAZY = {name: module for module, names in _EXPORTS.items() for name in names}
+
+# resolved on every access, the default client can be registered again
+_DYNAMIC = {"databases", "db"}
+
+__all__ = sorted(_LAZY)
+
+
+def __getattr__(name: str):
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    if name not in _DYNAMIC:
+        globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(_LAZY))
+
+
+class _Package(types.ModuleType):
+    def __setattr__(self, name: str, value) -> None:
+        # importing a submodule binds it on the package, the dao_logger
+        # submodule would replace the exported logger of the same name
+        if isinstance(value, types.ModuleType) and _LAZY.get(name) == name:
+            value = getattr(value, name)
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _Package
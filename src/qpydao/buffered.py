@@ -0,0 +1,342 @@
+from __future__ import annotations
+
+import asyncio
+import atexit
+import contextlib
+import threading
+import time
+from collections.abc import Callable
+from typing import Any
+
+from pydantic import BaseModel
+from sqlmodel import SQLModel
+
+from .dao_logger import dao_logger
+from .exceptions import DAOException
+from .sql_utils import SqlBuilder
+
+"""
+1. write-behind: save calls are buffered and written as bulk inserts
+2. a flush runs when max_rows are buffered or the oldest row waited max_delay
+3. save blocks while max_pending rows are waiting, close flushes what is left
+"""
+
+
+class FlushFailure(BaseModel):
+    """FlushFailure: rows of one table a flush could not insert."""
+
+    table: str
+    rows: list[dict[str, Any]]
+    error: str
+
+
+class WriterStats(BaseModel):
+    """WriterStats: rows saved, flushed and failed by a buffered writer."""
+
+    saved: int = 0
+    flushes: int = 0
+    flushed_rows: int = 0
+    failed_flushes: int = 0
+    failed_rows: int = 0
+    pending: int = 0
+    blocked: int = 0
+
+
+class _Buffer:
+    """Rows by entity, in save order."""
+
+    def __init__(self):
+        self.rows: dict[type[SQLModel], list[dict[str, Any]]] = {}
+        self.size = 0
+        self.first_at: float | None = None
+
+    def add(self, instance: SQLModel) -> None:
+        entity = type(instance)
+        self.rows.setdefault(entity, []).extend(SqlBuilder.to_rows(entity, [instance]))
+        self.size += 1
+        if self.first_at is None:
+            self.first_at = time.monotonic()
+
+    def due(self, max_rows: int, max_delay: float) -> bool:
+        if self.size >= max_rows:
+            return True
+        return self.first_at is not None and (
+            time.monotonic() - self.first_at >= max_delay
+        )
+
+    def wait_time(self, max_delay: float) -> float | None:
+        if self.first_at is None:
+            return None
+        return max(self.first_at + max_delay - time.monotonic(), 0)
+
+
+class _WriterBase:
+    def __init__(
+        self,
+        client,
+        max_rows: int,
+        max_delay: float,
+        max_pending: int,
+        chunk_size: int | None,
+        on_error: Callable[[FlushFailure], None] | None,
+    ):
+        if max_pending < max_rows:
+            raise DAOException("max_pending must be at least max_rows")
+        self.client = client
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.chunk_size = chunk_size
+        self.on_error = on_error
+        self.failures: list[FlushFailure] = []
+        self._stats = WriterStats()
+        self._buffer = _Buffer()
+        # buffered rows plus rows of running flushes
+        self._pending = 0
+        self._closed = False
+
+    def _take(self) -> _Buffer:
+        buffer, self._buffer = self._buffer, _Buffer()
+        return buffer
+
+    def _flushed(self, table: str, rows: list[dict], error: Exception | None) -> None:
+        if error is None:
+            self._stats.flushes += 1
+            self._stats.flushed_rows += len(rows)
+            return
+        failure = FlushFailure(
+            table=table, rows=rows, error=f"{type(error).__name__}: {error}"
+        )
+        self._stats.failed_flushes += 1
+        self._stats.failed_rows += len(rows)
+        self.failures.append(failure)
+        dao_logger.warning(f"flush of {len(rows)} rows into {table} failed: {error}")
+        if self.on_error is not None:
+            try:
+                self.on_error(failure)
+            except Exception as e:
+                dao_logger.warning(f"flush error handler failed: {e}")
+
+    def stats(self) -> WriterStats:
+        return self._stats.model_copy(update={"pending": self._pending})
+
+
+class BufferedWriter(_WriterBase):
+    """Buffer save calls from threads and insert them in bulk on a background thread.
+
+    Saved instances are not refreshed, generated keys stay unset.
+    """
+
+    def __init__(
+        self,
+        client,
+        max_rows: int = 1000,
+        max_delay: float = 0.5,
+        max_pending: int = 10_000,
+        chunk_size: int | None = None,
+        on_error: Callable[[FlushFailure], None] | None = None,
+    ):
+        """Start the background flush thread.
+
+        :param client: DatabaseClient to write with
+        :param max_rows: buffered rows that start a flush
+        :param max_delay: seconds the oldest buffered row waits at most
+        :param max_pending: rows buffered or flushing before save blocks
+        :param chunk_size: rows per executemany, default config.bulk_chunk_size
+        :param on_error: called with the rows of every failed flush
+        """
+        super().__init__(client, max_rows, max_delay, max_pending, chunk_size, on_error)
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = threading.Thread(
+            target=self._run, name="qpydao-buffered-writer", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    def save(self, instance: SQLModel, timeout: float | None = None) -> None:
+        """Buffer instance, blocks while max_pending rows are waiting.
+
+        :param instance:
+        :param timeout: seconds to wait for room, None waits as long as it takes
+        :return:
+        """
+        with self._condition:
+            if self._closed:
+                raise DAOException("buffered writer is closed")
+            if self._pending >= self.max_pending:
+                self._stats.blocked += 1
+                if not self._condition.wait_for(
+                    lambda: self._pending < self.max_pending or self._closed, timeout
+                ):
+                    raise DAOException(f"buffered writer full after {timeout}s")
+                if self._closed:
+                    raise DAOException("buffered writer is closed")
+            self._buffer.add(instance)
+            self._pending += 1
+            self._stats.saved += 1
+            # the first row starts the max_delay clock
+            if self._buffer.size in (1, self.max_rows):
+                self._condition.notify_all()
+
+    def flush(self) -> None:
+        """Insert every row saved before the call."""
+        with self._flush_lock:
+            with self._condition:
+                buffer = self._take()
+            self._write(buffer)
+
+    def close(self) -> None:
+        """Stop the background thread and flush the remaining rows."""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+        self.flush()
+        atexit.unregister(self.close)
+
+    def __enter__(self) -> BufferedWriter:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._closed and not self._buffer.due(
+                    self.max_rows, self.max_delay
+                ):
+                    self._condition.wait(self._buffer.wait_time(self.max_delay))
+                if self._closed:
+                    return
+            self.flush()
+
+    def _write(self, buffer: _Buffer) -> None:
+        for entity, rows in buffer.rows.items():
+            error = None
+            try:
+                self.client.batch_insert(entity, rows, chunk_size=self.chunk_size)
+            except Exception as e:
+                error = e
+            with self._condition:
+                self._flushed(entity.__table__.name, rows, error)
+                self._pending -= len(rows)
+                self._condition.notify_all()
+
+
+class AsyncBufferedWriter(_WriterBase):
+    """Buffer save calls from coroutines and insert them in bulk on an event loop task.
+
+    Saved instances are not refreshed.
+    """
+
+    def __init__(
+        self,
+        client,
+        max_rows: int = 1000,
+        max_delay: float = 0.5,
+        max_pending: int = 10_000,
+        chunk_size: int | None = None,
+        on_error: Callable[[FlushFailure], None] | None = None,
+    ):
+        super().__init__(client, max_rows, max_delay, max_pending, chunk_size, on_error)
+        self._condition: asyncio.Condition | None = None
+        self._flush_lock: asyncio.Lock | None = None
+        self._task: asyncio.Task | None = None
+
+    def _start(self) -> None:
+        # asyncio primitives and the task belong to the loop of the first save
+        if self._task is None:
+            self._condition = asyncio.Condition()
+            self._flush_lock = asyncio.Lock()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def save(self, instance: SQLModel, timeout: float | None = None) -> None:
+        """Buffer instance, waits while max_pending rows are waiting.
+
+        :param instance:
+        :param timeout: seconds to wait for room, None waits as long as it takes
+        :return:
+        """
+        if self._closed:
+            raise DAOException("buffered writer is closed")
+        self._start()
+        async with self._condition:
+            if self._pending >= self.max_pending:
+                self._stats.blocked += 1
+                try:
+                    await asyncio.wait_for(
+                        self._condition.wait_for(
+                            lambda: self._pending < self.max_pending or self._closed
+                        ),
+                        timeout,
+                    )
+                except TimeoutError:
+                    raise DAOException(
+                        f"buffered writer full after {timeout}s"
+                    ) from None
+                if self._closed:
+                    raise DAOException("buffered writer is closed")
+            self._buffer.add(instance)
+            self._pending += 1
+            self._stats.saved += 1
+            if self._buffer.size in (1, self.max_rows):
+                self._condition.notify_all()
+
+    async def flush(self) -> None:
+        """Insert every row saved before the call."""
+        if self._task is None:
+            return
+        async with self._flush_lock:
+            buffer = self._take()
+            await self._write(buffer)
+
+    async def close(self) -> None:
+        """Stop the flush task and flush the remaining rows."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._task is None:
+            return
+        async with self._condition:
+            self._condition.notify_all()
+        await self._task
+        await self.flush()
+
+    async def __aenter__(self) -> AsyncBufferedWriter:
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def _run(self) -> None:
+        while True:
+            async with self._condition:
+                while not self._closed and not self._buffer.due(
+                    self.max_rows, self.max_delay
+                ):
+                    with contextlib.suppress(TimeoutError):
+                        await asyncio.wait_for(
+                            self._condition.wait(),
+                            self._buffer.wait_time(self.max_delay),
+                        )
+                if self._closed:
+                    return
+            await self.flush()
+
+    async def _write(self, buffer: _Buffer) -> None:
+        for entity, rows in buffer.rows.items():
+            error = None
+            try:
+                await self.client.async_batch_insert(
+                    entity, rows, chunk_size=self.chunk_size
+                )
+            except Exception as e:
+                error = e
+            async with self._condition:
+                self._flushed(entity.__table__.name, rows, error)
+                self._pending -= len(rows)
+                self._condition.notify_all()
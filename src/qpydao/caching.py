@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable, Iterable
+from typing import Any
+
+from pydantic import BaseModel
+
+_MISSING = object()
+
+
+def query_key(sql: str, params: dict, *parts: Any) -> Hashable | None:
+    """Cache key of sql and its bind parameters.
+
+    None when a parameter value is not hashable.
+    """
+    key = (sql, *parts, tuple(sorted(params.items())))
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+class CacheStats(BaseModel):
+    """CacheStats: hit/miss counters of a cache."""
+
+    hits: int = 0
+    misses: int = 0
+    size: int = 0
+    maxsize: int = 0
+    invalidations: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class LRUCache:
+    """Thread safe, size bounded least-recently-used cache.
+
+    Entries optionally expire ttl seconds after they are set.
+    """
+
+    def __init__(self, maxsize: int = 512, ttl: float | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # key -> (value, expires_at or None)
+        self._data: OrderedDict[Hashable, tuple[Any, float | None]] = OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            expires_at = entry[1] if entry is not None else None
+            if expires_at is not None and expires_at < time.monotonic():
+                self._evict(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = None if ttl is None else time.monotonic() + ttl
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._evict(next(iter(self._data)))
+
+    def _evict(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def get_or_set(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = factory()
+            self.set(key, value)
+        return value
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            self._evict(key)
+            return entry[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+            self.invalidations = 0
+
+    def stats(self) -> CacheStats:
+        return CacheStats(
+            hits=self.hits,
+            misses=self.misses,
+            size=len(self._data),
+            maxsize=self.maxsize,
+            invalidations=self.invalidations,
+        )
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class ResultCache(LRUCache):
+    """Query result cache.
+
+    Entries are indexed by the tables they read, so writes to a table invalidate them.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float | None = None):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self._tables: dict[str, set[Hashable]] = {}
+        self._key_tables: dict[Hashable, tuple[str, ...]] = {}
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        ttl: float | None = None,
+        tables: Iterable[str] = (),
+    ) -> None:
+        with self._lock:
+            self._evict(key)
+            self._key_tables[key] = tuple(tables)
+            for table in self._key_tables[key]:
+                self._tables.setdefault(table, set()).add(key)
+            super().set(key, value, ttl)
+
+    def _evict(self, key: Hashable) -> None:
+        super()._evict(key)
+        for table in self._key_tables.pop(key, ()):
+            keys = self._tables.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tables[table]
+
+    def clear(self) -> None:
+        with self._lock:
+            super().clear()
+            self._tables.clear()
+            self._key_tables.clear()
+
+    def invalidate_tables(self, tables: Iterable[str] | None) -> None:
+        """Drop entries reading any of tables, None drops everything."""
+        if not self._data:
+            return
+        with self._lock:
+            if tables is None:
+                self.invalidations += len(self._data)
+                self._data.clear()
+                self._tables.clear()
+                self._key_tables.clear()
+                return
+            for table in tables:
+                for key in list(self._tables.get(table, ())):
+                    self.invalidations += 1
+                    self._evict(key)
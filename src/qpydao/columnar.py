@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+from typing import Any
+
+from sqlalchemy import Result
+
+from .exceptions import DAOException
+
+"""
+1. column oriented query results
+2. rows are transposed batch by batch, no per row dict is created
+3. numpy and pyarrow are optional: pip install qpydao[columnar]
+"""
+
+COLUMNAR_OUTPUTS = ("lists", "numpy", "arrow")
+
+
+def fetch_columns(result: Result, batch_size: int) -> tuple[list[str], list[list[Any]]]:
+    """Transpose a result into one list per column, batch_size rows at a time.
+
+    :param result:
+    :param batch_size:
+    :return: column names and column values
+    """
+    keys = list(result.keys())
+    columns: list[list[Any]] = [[] for _ in keys]
+    for partition in result.partitions(batch_size):
+        for column, values in zip(columns, zip(*partition, strict=True), strict=True):
+            column.extend(values)
+    return keys, columns
+
+
+def to_numpy(keys: list[str], columns: list[list[Any]]) -> dict[str, Any]:
+    try:
+        import numpy
+    except ImportError as e:
+        raise DAOException(
+            "numpy is required for numpy output: pip install qpydao[columnar]"
+        ) from e
+    return {
+        key: numpy.asarray(column) for key, column in zip(keys, columns, strict=True)
+    }
+
+
+def to_arrow(keys: list[str], columns: list[list[Any]]) -> Any:
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise DAOException(
+            "pyarrow is required for arrow output: pip install qpydao[columnar]"
+        ) from e
+    return pyarrow.table(
+        {key: pyarrow.array(column) for key, column in zip(keys, columns, strict=True)}
+    )
+
+
+def to_columnar(result: Result, output: str, batch_size: int) -> Any:
+    """Convert a result to the requested column oriented output.
+
+    :param result:
+    :param output: lists, numpy or arrow
+    :param batch_size:
+    :return:
+    """
+    if output not in COLUMNAR_OUTPUTS:
+        raise DAOException(
+            f"unknown columnar output {output}, expected one of {COLUMNAR_OUTPUTS}"
+        )
+    keys, columns = fetch_columns(result, batch_size)
+    if output == "numpy":
+        return to_numpy(keys, columns)
+    if output == "arrow":
+        return to_arrow(keys, columns)
+    return dict(zip(keys, columns, strict=True))
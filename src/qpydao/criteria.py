@@ -0,0 +1,287 @@
+from __future__ import annotations
+
+import re
+from collections import namedtuple
+from typing import Any
+
+import sqlalchemy
+from pydantic import BaseModel
+from sqlalchemy import bindparam, func, literal_column, not_
+from sqlmodel import SQLModel
+
+from .exceptions import DAOException
+
+"""
+1. find_by style criteria: field=value or field__operator=value
+2. every operator compiles to an expression the planner can match to an index,
+   btree for equality, ranges and IN, btree with text_pattern_ops for prefix,
+   pg_trgm GIN for LIKE and ILIKE, GIN on to_tsvector for full-text search
+3. the statement depends only on fields, operators and NULLs, values are bound
+4. index_report tells which criteria have no index to use
+"""
+
+Criterion = namedtuple("Criterion", ["field", "op", "value"])
+
+# text search configuration, the same literal must be used by the GIN index
+SEARCH_CONFIG = "english"
+
+# PostgreSQL btree opclasses and collations that compare bytes, LIKE 'x%' needs one
+PATTERN_OPS = ("text_pattern_ops", "varchar_pattern_ops", "bpchar_pattern_ops")
+_C_COLLATIONS = ("C", "POSIX")
+
+# operator -> index kind that can serve it, None when no index helps
+OPERATORS = {
+    "eq": "btree",
+    "ne": None,
+    "lt": "btree",
+    "lte": "btree",
+    "gt": "btree",
+    "gte": "btree",
+    "between": "btree",
+    "in": "btree",
+    "not_in": None,
+    "isnull": "btree",
+    "startswith": "pattern",
+    "contains": "trgm",
+    "ilike": "trgm",
+    "similar": "trgm",
+    "search": "fts",
+}
+
+_LIKE_ESCAPE = "\\"
+
+
+def _escape_like(value: str) -> str:
+    return (
+        value.replace(_LIKE_ESCAPE, _LIKE_ESCAPE * 2)
+        .replace("%", _LIKE_ESCAPE + "%")
+        .replace("_", _LIKE_ESCAPE + "_")
+    )
+
+
+def parse_criteria(entity: type[SQLModel], kwargs: dict) -> list[Criterion]:
+    """Split field__operator keys, a key without operator is eq.
+
+    :param entity:
+    :param kwargs: find_by keyword filters
+    :return: criteria sorted by field and operator
+    """
+    columns = entity.__table__.columns
+    criteria = []
+    for key, value in kwargs.items():
+        field, op = key, "eq"
+        if "__" in key:
+            name, suffix = key.rsplit("__", 1)
+            if suffix in OPERATORS:
+                field, op = name, suffix
+        if field not in columns:
+            raise DAOException(f"{entity.__name__} has no column {field}")
+        if value is None and op not in ("eq", "ne", "isnull"):
+            raise DAOException(f"{key} can't be None, use {field}__isnull")
+        if op == "between" and (not isinstance(value, list | tuple) or len(value) != 2):
+            raise DAOException(f"{key} expects a (low, high) pair")
+        criteria.append(Criterion(field, op, value))
+    return sorted(criteria, key=lambda c: (c.field, c.op))
+
+
+def criteria_key(criteria: list[Criterion]) -> tuple:
+    """Statement shape: fields, operators and the values that change the sql."""
+    key = []
+    for c in criteria:
+        if c.op == "isnull":
+            key.append((c.field, c.op, bool(c.value)))
+        else:
+            # None compiles to IS NULL / IS NOT NULL
+            key.append((c.field, c.op, c.value is None))
+    return tuple(key)
+
+
+def _bind(field: str, op: str) -> str:
+    return f"f_{field}" if op == "eq" else f"f_{field}__{op}"
+
+
+def _expression(column, field: str, op: str, is_none: bool):
+    name = _bind(field, op)
+    if op == "isnull":
+        return column.is_(None) if is_none else column.is_not(None)
+    if is_none and op in ("eq", "ne"):
+        return column.is_(None) if op == "eq" else column.is_not(None)
+    if op == "eq":
+        return column == bindparam(name)
+    if op == "ne":
+        return column != bindparam(name)
+    if op == "lt":
+        return column < bindparam(name)
+    if op == "lte":
+        return column <= bindparam(name)
+    if op == "gt":
+        return column > bindparam(name)
+    if op == "gte":
+        return column >= bindparam(name)
+    if op == "between":
+        return column.between(bindparam(f"{name}_lo"), bindparam(f"{name}_hi"))
+    if op == "in":
+        return column.in_(bindparam(name, expanding=True))
+    if op == "not_in":
+        return not_(column.in_(bindparam(name, expanding=True)))
+    if op in ("startswith", "contains"):
+        # LIKE 'prefix%' without a leading wildcard can use a pattern btree index
+        return column.like(bindparam(name), escape=_LIKE_ESCAPE)
+    if op == "ilike":
+        return column.ilike(bindparam(name), escape=_LIKE_ESCAPE)
+    if op == "similar":
+        return column.op("%")(bindparam(name))
+    # search, the expression must match the index: to_tsvector('english', col)
+    config = literal_column(f"'{SEARCH_CONFIG}'")
+    return func.to_tsvector(config, column).op("@@")(
+        func.websearch_to_tsquery(config, bindparam(name))
+    )
+
+
+def criteria_where(entity: type[SQLModel], key: tuple) -> list[Any]:
+    """Where clauses of a criteria_key, values are bind parameters."""
+    columns = entity.__table__.columns
+    return [_expression(columns[field], field, op, flag) for field, op, flag in key]
+
+
+def criteria_params(criteria: list[Criterion]) -> dict:
+    """Bind parameters of criteria, like patterns are escaped here."""
+    params = {}
+    for c in criteria:
+        name = _bind(c.field, c.op)
+        if c.op == "isnull" or c.value is None:
+            continue
+        if c.op == "between":
+            params[f"{name}_lo"], params[f"{name}_hi"] = c.value
+        elif c.op in ("in", "not_in"):
+            params[name] = list(c.value)
+        elif c.op == "startswith":
+            params[name] = _escape_like(c.value) + "%"
+        elif c.op == "contains":
+            params[name] = "%" + _escape_like(c.value) + "%"
+        else:
+            params[name] = c.value
+    return params
+
+
+class IndexAdvice(BaseModel):
+    """IndexAdvice: a criterion without an index and DDL for one that serves it."""
+
+    column: str
+    operator: str
+    kind: str | None
+    suggestion: str
+
+
+class IndexReport(BaseModel):
+    """IndexReport: criteria of a query with and without a supporting index."""
+
+    table: str
+    supported: list[str] = []
+    missing: list[IndexAdvice] = []
+
+    @property
+    def ok(self) -> bool:
+        return not self.missing
+
+
+def _index_kinds(inspector, table: str, schema: str | None) -> dict[str, set[str]]:
+    """Index kinds per column.
+
+    btree when it leads an index, pattern when that btree compares bytes, trgm and
+    fts for PostgreSQL GIN/GiST indexes on the column or its to_tsvector.
+    """
+    kinds: dict[str, set[str]] = {}
+    postgresql = inspector.dialect.name == "postgresql"
+    # a btree on a column with C collation serves prefixes too
+    c_collated = {
+        column["name"]
+        for column in inspector.get_columns(table, schema=schema)
+        if getattr(column["type"], "collation", None) in _C_COLLATIONS
+    }
+
+    def btree(name: str, ops: str = "") -> None:
+        kinds.setdefault(name, set()).add("btree")
+        if not postgresql or name in c_collated or ops in PATTERN_OPS:
+            kinds[name].add("pattern")
+
+    primary_keys = inspector.get_pk_constraint(table, schema=schema).get(
+        "constrained_columns"
+    )
+    if primary_keys:
+        btree(primary_keys[0])
+    for unique in inspector.get_unique_constraints(table, schema=schema):
+        if unique["column_names"]:
+            btree(unique["column_names"][0])
+    for index in inspector.get_indexes(table, schema=schema):
+        options = index.get("dialect_options", {})
+        using = options.get("postgresql_using", "btree")
+        ops = options.get("postgresql_ops", {})
+        expressions = [e for e in index.get("expressions", []) if e]
+        column_names = [c for c in index.get("column_names", []) if c]
+        if using in ("gin", "gist"):
+            for name in column_names:
+                if "trgm" in str(ops.get(name, "")):
+                    kinds.setdefault(name, set()).add("trgm")
+            for expression in expressions:
+                if "to_tsvector" not in expression:
+                    continue
+                for column in inspector.get_columns(table, schema=schema):
+                    if re.search(rf"\b{re.escape(column['name'])}\b", expression):
+                        kinds.setdefault(column["name"], set()).add("fts")
+        elif index.get("column_names") and index["column_names"][0]:
+            # only the leading column of a btree index serves a lone criterion
+            name = index["column_names"][0]
+            btree(name, str(ops.get(name, "")))
+    return kinds
+
+
+def _suggestion(table: str, column: str, kind: str | None, dialect: str) -> str:
+    if kind is None:
+        return f"{column}: no index serves this operator, add a selective criterion"
+    if kind == "pattern" and dialect == "postgresql":
+        return (
+            f"CREATE INDEX ix_{table}_{column}_pattern ON {table} "
+            f"({column} text_pattern_ops)"
+        )
+    if kind == "trgm":
+        return (
+            f"CREATE INDEX ix_{table}_{column}_trgm ON {table} "
+            f"USING gin ({column} gin_trgm_ops)"
+        )
+    if kind == "fts":
+        return (
+            f"CREATE INDEX ix_{table}_{column}_fts ON {table} "
+            f"USING gin (to_tsvector('{SEARCH_CONFIG}', {column}))"
+        )
+    return f"CREATE INDEX ix_{table}_{column} ON {table} ({column})"
+
+
+def index_report(engine, entity: type[SQLModel], **kwargs) -> IndexReport:
+    """Report criteria no index can serve.
+
+    :param engine: engine of the database to inspect
+    :param entity:
+    :param kwargs: find_by criteria
+    :return:
+    """
+    table = entity.__table__
+    kinds = _index_kinds(sqlalchemy.inspect(engine), table.name, table.schema)
+    report = IndexReport(table=table.name)
+    for c in parse_criteria(entity, kwargs):
+        kind = OPERATORS[c.op]
+        label = c.field if c.op == "eq" else f"{c.field}__{c.op}"
+        if kind is not None and kind in kinds.get(c.field, ()):
+            report.supported.append(label)
+        else:
+            report.missing.append(
+                IndexAdvice(
+                    column=c.field,
+                    operator=c.op,
+                    kind=kind,
+                    suggestion=_suggestion(
+                        table.name, c.field, kind, engine.dialect.name
+                    ),
+                )
+            )
+    return report
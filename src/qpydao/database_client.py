@@ -1,22 +1,73 @@
 from __future__ import annotations
 
+import asyncio
+import functools
+import time
 import typing
-from collections.abc import Coroutine, Sequence
+from collections.abc import AsyncIterator, Iterator, Sequence
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
 from typing import Any
 
-import sqlalchemy
-from qpyconf import settings
-from sqlalchemy import Row, RowMapping, text,MetaData
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy import Connection, Executable, Row, RowMapping, MetaData, func
+from sqlalchemy.exc import InterfaceError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncConnection
 from sqlmodel import Session, SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
+from .buffered import AsyncBufferedWriter, BufferedWriter
+from .caching import ResultCache, query_key
+from .columnar import to_columnar
+from .criteria import IndexReport, index_report
+from .engines import (
+    EngineRegistry,
+    EngineStats,
+    PoolStatus,
+    build_async_engine,
+    build_engine,
+    dispose_engine,
+    pool_status,
+)
+from .fanout import FanOutResult, run_fan_out
+from .instrumentation import ProfileSnapshot, QueryProfiler
+from .introspection import SchemaIntrospector
 from .models import (
     DatabaseConfig,
     SingletonMeta,
     SqlRequestModel,
+    TableMeta,
     database_config,
 )
-from .sql_utils import SqlBuilder
+from .pagination import (
+    Page,
+    decode_cursor,
+    encode_cursor,
+    keyset_select,
+    keyset_sql,
+    parse_order_by,
+    with_primary_key,
+)
+from .projection import (
+    fill_deferred,
+    load_on_access,
+    project,
+    projection,
+    statement_entity,
+    unloaded_columns,
+)
+from .routing import ReplicaRouter, ReplicaStatus
+from .singleflight import AsyncSingleFlight, FlightStats, SingleFlight
+from .sql_utils import (
+    SqlBuilder,
+    SqlResultMapper,
+    chunked,
+    detached_copy,
+    mark_committed,
+    primary_key,
+    referenced_tables,
+    table_name,
+)
+from .table_copy import CopyStats, copy_table
 
 from .exceptions import DAOException
 
@@ -31,79 +82,749 @@ from .exceptions import DAOException
     6. Like Query or With Some Dynamic Filter
 """
 
+# a unit of work session keeps loaded instances, refresh them from the rows
+# so writes done with execute inside the same unit of work are visible
+_REFRESH_IDENTITY_MAP = {"populate_existing": True}
+
+# session.info key of the invalidations a unit of work runs once it has committed
+_AFTER_COMMIT = "qpydao_after_commit"
+
+# errors that eject a replica when raised while connecting or by a dropped connection
+_REPLICA_ERRORS = (OperationalError, InterfaceError)
+
+_ESTIMATE_SQL = (
+    "SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:table AS regclass)"
+)
+
+
+def _keyset_page(
+    items: list[Any],
+    order: list[tuple[str, bool]],
+    page_size: int,
+    value: typing.Callable[[Any, str], Any],
+) -> Page:
+    """Page of the first page_size items, one extra item means there is more."""
+    has_more = len(items) > page_size
+    items = items[:page_size]
+    next_cursor = None
+    if has_more:
+        next_cursor = encode_cursor([value(items[-1], name) for name, _ in order])
+    return Page(items=items, next_cursor=next_cursor, has_more=has_more)
+
+
+def _projected(statement, columns, exclude):
+    """Statement of query_for_model with a projection of its model."""
+    entity = statement_entity(statement)
+    columns, exclude = projection(entity, columns, exclude or ())
+    return project(statement, entity, columns, exclude)
+
+
+def _updated_rows(conn, result, chunk: list[Any]) -> int:
+    """Rows matched by an executemany.
+
+    The chunk size when the driver doesn't report the row count of every statement.
+    """
+    if conn.dialect.supports_sane_multi_rowcount and result.rowcount >= 0:
+        return result.rowcount
+    return len(chunk)
+
+
+def _keyset_query(
+    plain_sql: str,
+    order: list[tuple[str, bool]],
+    after: str | None,
+    page_size: int,
+    nullable: Sequence[str],
+    kwargs: dict,
+) -> tuple[str, dict]:
+    """Keyset sql of a page and its parameters, the cursor values are bound."""
+    params = dict(kwargs, _page_limit=page_size + 1)
+    null_values = []
+    if after is not None:
+        values = decode_cursor(after)
+        if len(values) != len(order):
+            raise DAOException("pagination cursor does not match order by columns")
+        for (name, _), value in zip(order, values, strict=True):
+            if value is None and name not in nullable:
+                raise DAOException(f"{name} is NULL, pass it in nullable")
+            if value is None:
+                null_values.append(name)
+        params.update((f"_after_{i}", v) for i, v in enumerate(values))
+    sql = keyset_sql(plain_sql, order, after is not None, nullable, null_values)
+    return sql, params
+
 
 class DatabaseClient:
     """Database client, both synchronous and asynchronous."""
 
-    def __init__(self, config: DatabaseConfig = None):
+    def __init__(
+        self, config: DatabaseConfig = None, registry: EngineRegistry | None = None
+    ):
         self.config = config
+        self.registry = registry
         self._engine = None
         self._async_engine = None
+        # engines opened by the client and whether they belong to the registry
+        self._opened: list[tuple[typing.Any, bool]] = []
+        self.result_cache = ResultCache(
+            maxsize=config.result_cache_size if config else 1024,
+            ttl=config.result_cache_ttl if config else None,
+        )
+        # (table, primary key) -> instance, indexed by table for invalidation
+        self.identity_map = ResultCache(
+            maxsize=config.identity_map_size if config else 4096,
+            ttl=config.identity_map_ttl if config else None,
+        )
+        self.profiler: QueryProfiler | None = None
+        if config is not None and config.profile_queries:
+            self.enable_profiling()
+        self._session_var: ContextVar[Session | None] = ContextVar(
+            f"qpydao_session_{id(self)}", default=None
+        )
+        self._async_session_var: ContextVar[AsyncSession | None] = ContextVar(
+            f"qpydao_async_session_{id(self)}", default=None
+        )
+        self._introspectors: dict[str | None, SchemaIntrospector] = {}
+        self.single_flight: SingleFlight | None = None
+        self.async_single_flight: AsyncSingleFlight | None = None
+        if config is not None and config.coalesce_reads:
+            self.enable_coalescing()
+        self.replicas: ReplicaRouter | None = None
+        self.async_replicas: ReplicaRouter | None = None
+        if config is not None and config.replica_urls:
+            self.replicas = ReplicaRouter(
+                config.replica_urls,
+                self._replica_engine,
+                config.replica_strategy,
+                config.replica_retry_interval,
+            )
+        if config is not None and config.async_replica_urls:
+            self.async_replicas = ReplicaRouter(
+                config.async_replica_urls,
+                self._async_replica_engine,
+                config.replica_strategy,
+                config.replica_retry_interval,
+            )
 
     @property
     def engine(self):
         if self._engine is None:
-            self._engine = sqlalchemy.create_engine(
-                url=self.config.db_url,
-                pool_pre_ping=True,
-                pool_recycle=self.config.pool_recycle,
-                echo=self.config.echo_queries,
-            )
+            self._engine = self._open_engine(self.config)
         return self._engine
 
     @property
     def async_engine(self):
         if self._async_engine is None:
-            self._async_engine = create_async_engine(
-                url=self.config.db_url,
-                pool_pre_ping=True,
-                pool_recycle=self.config.pool_recycle,
-                echo=self.config.echo_queries,
-            )
+            self._async_engine = self._open_engine(self.config, async_engine=True)
         return self._async_engine
 
+    def _replica_engine(self, url: str):
+        return self._open_engine(self.config.model_copy(update={"db_url": url}))
+
+    def _async_replica_engine(self, url: str):
+        config = self.config.model_copy(update={"async_db_url": url})
+        return self._open_engine(config, async_engine=True)
+
+    def _open_engine(self, config: DatabaseConfig, async_engine: bool = False):
+        """Engine from the registry when the client has one, otherwise its own.
+
+        A profiled client uses its own engines so it only records its statements.
+        """
+        shared = self.registry is not None and self.profiler is None
+        if shared:
+            engine = self.registry.acquire(config, async_engine)
+        elif async_engine:
+            engine = build_async_engine(config)
+        else:
+            engine = build_engine(config)
+        self._opened.append((engine, shared))
+        if self.profiler is not None:
+            self.profiler.attach(engine.sync_engine if async_engine else engine)
+        return engine
+
+    def close(self) -> None:
+        """Release registry engines and dispose own engines.
+
+        The client opens new ones when it is used again.
+        """
+        if self.profiler is not None:
+            self.profiler.detach()
+        self._close_engines()
+
+    def _close_engines(self) -> None:
+        opened, self._opened = self._opened, []
+        for engine, shared in opened:
+            if shared:
+                self.registry.release(engine)
+            else:
+                dispose_engine(engine)
+        self._engine = None
+        self._async_engine = None
+        for router in (self.replicas, self.async_replicas):
+            for replica in router.replicas if router is not None else ():
+                replica._engine = None
+
+    def enable_profiling(
+        self, slowest: int | None = None, exporters: list[typing.Any] | None = None
+    ) -> QueryProfiler:
+        """Record statement latency, rows and slowest queries on both engines.
+
+        A client sharing registry engines switches to engines of its own.
+        :param slowest: how many slowest queries to keep, default config.profile_slowest
+        :param exporters: objects with export(snapshot), see qpydao.instrumentation
+        :return:
+        """
+        if self.profiler is None:
+            self.profiler = QueryProfiler(
+                slowest=slowest or self.config.profile_slowest, exporters=exporters
+            )
+            if self.registry is not None:
+                # reopened on next use, off the registry
+                self._close_engines()
+            if self._engine is not None:
+                self.profiler.attach(self._engine)
+            if self._async_engine is not None:
+                self.profiler.attach(self._async_engine.sync_engine)
+            for router in (self.replicas, self.async_replicas):
+                for replica in router.replicas if router else ():
+                    if replica._engine is not None:
+                        self.profiler.attach(
+                            getattr(replica._engine, "sync_engine", replica._engine)
+                        )
+        return self.profiler
+
+    def disable_profiling(self) -> None:
+        """Remove the engine event listeners, no overhead remains.
+
+        A registry client goes back to the shared engines.
+        """
+        if self.profiler is not None:
+            self.profiler.detach()
+            self.profiler = None
+            if self.registry is not None:
+                self._close_engines()
+
+    def profile_snapshot(self, export: bool = False) -> ProfileSnapshot | None:
+        """Profiler statistics with the sync pool status.
+
+        :param export: also push the snapshot to the profiler exporters
+        :return:
+        """
+        if self.profiler is None:
+            return None
+        pool = self.pool_status() if self._engine is not None else None
+        if export:
+            return self.profiler.export(pool)
+        return self.profiler.snapshot(pool)
+
+    def enable_coalescing(self) -> None:
+        """Run identical concurrent plain_query calls once and share the rows.
+
+        Covers async_plain_query and the native_sql reads using either.
+        """
+        if self.single_flight is None:
+            self.single_flight = SingleFlight()
+            self.async_single_flight = AsyncSingleFlight()
+
+    def disable_coalescing(self) -> None:
+        self.single_flight = None
+        self.async_single_flight = None
+
+    def coalescing_stats(self) -> FlightStats | None:
+        """Calls, executions and coalesced calls of both paths."""
+        if self.single_flight is None:
+            return None
+        return self.single_flight.stats() + self.async_single_flight.stats()
+
+    def pool_status(self) -> PoolStatus:
+        """Connection pool usage of the sync engine."""
+        return pool_status(self.engine)
+
+    def async_pool_status(self) -> PoolStatus:
+        """Connection pool usage of the async engine."""
+        return pool_status(self.async_engine)
+
+    def replica_status(self) -> list[ReplicaStatus]:
+        """Health and read latency of the sync and async read replicas."""
+        return [
+            *(self.replicas.status() if self.replicas else ()),
+            *(self.async_replicas.status() if self.async_replicas else ()),
+        ]
+
+    def introspector(self, schema: str | None = None) -> SchemaIntrospector:
+        """Schema introspector of schema, one per schema and client."""
+        introspector = self._introspectors.get(schema)
+        if introspector is None:
+            introspector = self._introspectors[schema] = SchemaIntrospector(
+                self, schema
+            )
+        return introspector
+
+    def table_metas(
+        self, schema: str | None = None, refresh: bool = True
+    ) -> dict[str, TableMeta]:
+        """TableMeta by table name, only changed tables are reflected.
+
+        :param schema: default the connection's current schema
+        :param refresh: False returns the saved snapshot without querying
+        :return:
+        """
+        introspector = self.introspector(schema)
+        snapshot = introspector.load() if not refresh else None
+        if snapshot is None:
+            snapshot = introspector.refresh()
+        return snapshot.tables
+
     @staticmethod
     def create(db_name: str) -> DatabaseClient:
         return DatabaseClient(database_config(db_name))
 
+    def invalidate(self, *entities: type[SQLModel] | SQLModel | str) -> None:
+        """Drop cached results reading the tables of entities or table names.
+
+        Instances only drop their own identity_map entry.
+        """
+        if not len(self.result_cache) and not len(self.identity_map):
+            return
+        tables = set()
+        entity_tables = set()
+        for e in entities:
+            if isinstance(e, str):
+                entity_tables.add(e.lower())
+            elif isinstance(e, type):
+                entity_tables.add(table_name(e))
+            else:
+                tables.add(table_name(e))
+                primary_keys = e.__table__.primary_key.columns
+                if len(primary_keys) == 1:
+                    ident = getattr(e, next(iter(primary_keys)).name)
+                    self.identity_map.pop((table_name(e), ident))
+                else:
+                    entity_tables.add(table_name(e))
+        self.result_cache.invalidate_tables(tables | entity_tables)
+        self.identity_map.invalidate_tables(entity_tables)
+
+    def _invalidate_tables(self, tables: set[str] | None) -> None:
+        """Drop cached results and instances of tables, None drops everything."""
+        self.result_cache.invalidate_tables(tables)
+        self.identity_map.invalidate_tables(tables)
+
+    def _after_commit(self, invalidate: typing.Callable[[], None], is_async: bool):
+        """Invalidate now, or once the current unit of work has committed.
+
+        Readers during the unit of work still see the old rows, invalidating
+        earlier would let them cache those again.
+        """
+        session = (self._async_session_var if is_async else self._session_var).get()
+        if session is None:
+            invalidate()
+        else:
+            session.info.setdefault(_AFTER_COMMIT, []).append(invalidate)
+
+    def _written(self, *entities: typing.Any, is_async: bool = False) -> None:
+        self._after_commit(functools.partial(self.invalidate, *entities), is_async)
+
+    def _written_tables(self, tables: set[str] | None, is_async: bool = False) -> None:
+        self._after_commit(functools.partial(self._invalidate_tables, tables), is_async)
+
+    @staticmethod
+    def _committed(session: Session | AsyncSession) -> None:
+        for invalidate in session.info.pop(_AFTER_COMMIT, ()):
+            invalidate()
+
+    @contextmanager
+    def unit_of_work(self) -> Iterator[Session]:
+        """Bind one session and transaction to the current context.
+
+        Client methods and native_sql repositories called inside reuse it
+        and everything is committed once on exit, rolled back on error.
+        Nested calls join the outer unit of work.
+        :return:
+        """
+        session = self._session_var.get()
+        if session is not None:
+            yield session
+            return
+        with Session(self.engine, expire_on_commit=False) as session:
+            token = self._session_var.set(session)
+            try:
+                with session.begin():
+                    yield session
+            finally:
+                self._session_var.reset(token)
+            self._committed(session)
+
+    @asynccontextmanager
+    async def async_unit_of_work(self) -> AsyncIterator[AsyncSession]:
+        """Async version of unit_of_work, shared by async_* methods."""
+        session = self._async_session_var.get()
+        if session is not None:
+            yield session
+            return
+        async with AsyncSession(self.async_engine, expire_on_commit=False) as session:
+            token = self._async_session_var.set(session)
+            try:
+                async with session.begin():
+                    yield session
+            finally:
+                self._async_session_var.reset(token)
+            self._committed(session)
+
+    def in_transaction(self) -> bool:
+        """True inside unit_of_work or async_unit_of_work."""
+        return (
+            self._session_var.get() is not None
+            or self._async_session_var.get() is not None
+        )
+
+    @contextmanager
+    def _session(self, commit: bool = True) -> Iterator[Session]:
+        session = self._session_var.get()
+        if session is not None:
+            yield session
+            return
+        with Session(self.engine, expire_on_commit=False) as session:
+            yield session
+            if commit:
+                session.commit()
+
+    @asynccontextmanager
+    async def _async_session(self, commit: bool = True) -> AsyncIterator[AsyncSession]:
+        session = self._async_session_var.get()
+        if session is not None:
+            yield session
+            return
+        async with AsyncSession(self.async_engine, expire_on_commit=False) as session:
+            yield session
+            if commit:
+                await session.commit()
+
+    @contextmanager
+    def _connection(self, write: bool = False) -> Iterator[Connection]:
+        session = self._session_var.get()
+        if session is not None:
+            yield session.connection()
+        elif write:
+            with self.engine.begin() as conn:
+                yield conn
+        else:
+            with self.engine.connect() as conn:
+                yield conn
+
+    @asynccontextmanager
+    async def _async_connection(
+        self, write: bool = False
+    ) -> AsyncIterator[AsyncConnection]:
+        session = self._async_session_var.get()
+        if session is not None:
+            yield await session.connection()
+        elif write:
+            async with self.async_engine.begin() as conn:
+                yield conn
+        else:
+            async with self.async_engine.connect() as conn:
+                yield conn
+
+    def _read(self, execute: typing.Callable[[typing.Any], Any], orm: bool = False):
+        """Run a read on a replica when configured and outside unit_of_work.
+
+        Reads go to the primary otherwise, or when the replica can't be reached.
+        :param execute: called with a Connection, or a Session when orm
+        :param orm:
+        :return:
+        """
+        replica = None
+        if self.replicas is not None and not self.in_transaction():
+            replica = self.replicas.choose()
+        if replica is not None:
+            connected = False
+            start = time.perf_counter()
+            try:
+                with replica.engine.connect() as conn:
+                    connected = True
+                    if orm:
+                        with Session(conn) as session:
+                            result = execute(session)
+                    else:
+                        result = execute(conn)
+            except _REPLICA_ERRORS as e:
+                if connected and not e.connection_invalidated:
+                    raise
+                self.replicas.eject(replica, e)
+            else:
+                self.replicas.record(replica, time.perf_counter() - start)
+                return result
+        if orm:
+            with self._session(commit=False) as session:
+                return execute(session)
+        with self._connection() as conn:
+            return execute(conn)
+
+    async def _async_read(
+        self,
+        execute: typing.Callable[[typing.Any], typing.Awaitable],
+        orm: bool = False,
+    ):
+        """Async version of _read."""
+        replica = None
+        if self.async_replicas is not None and not self.in_transaction():
+            replica = self.async_replicas.choose()
+        if replica is not None:
+            connected = False
+            start = time.perf_counter()
+            try:
+                async with replica.engine.connect() as conn:
+                    connected = True
+                    if orm:
+                        async with AsyncSession(conn) as session:
+                            result = await execute(session)
+                    else:
+                        result = await execute(conn)
+            except _REPLICA_ERRORS as e:
+                if connected and not e.connection_invalidated:
+                    raise
+                self.async_replicas.eject(replica, e)
+            else:
+                self.async_replicas.record(replica, time.perf_counter() - start)
+                return result
+        if orm:
+            async with self._async_session(commit=False) as session:
+                return await execute(session)
+        async with self._async_connection() as conn:
+            return await execute(conn)
+
     def save(self, instance: SQLModel | typing.Any):
         """Save a sql model instance
         :param instance:
         :return:
         """
-        with Session(self.engine) as s:
+        with self._session() as s:
             s.add(instance)
-            s.commit()
+            s.flush()
             s.refresh(instance)
+        self._written(instance)
         return instance
 
-    def async_save(self, instance: SQLModel | typing.Any):
+    async def async_save(self, instance: SQLModel | typing.Any):
         """Save a sql model instance
         :param instance:
         :return:
         """
-        with AsyncSession(self.async_engine) as s:
+        async with self._async_session() as s:
             s.add(instance)
-            s.commit()
-            s.refresh(instance)
+            await s.flush()
+            await s.refresh(instance)
+        self._written(instance, is_async=True)
         return instance
 
-    def batch_save(self, instances: list[SQLModel | typing.Any]):
-        with Session(self.engine) as s:
-            s.bulk_save_objects(instances, return_defaults=True)
-            s.commit()
+    def batch_save(
+        self, instances: list[SQLModel | typing.Any], chunk_size: int | None = None
+    ):
+        """Save sql model instances.
+
+        Every chunk is flushed as multi-row INSERT ... RETURNING so generated keys
+        are set on the instances.
+        :param instances:
+        :param chunk_size: default config.bulk_chunk_size
+        :return:
+        """
+        with self._session() as s:
+            for chunk in chunked(instances, chunk_size or self.config.bulk_chunk_size):
+                s.add_all(chunk)
+                s.flush()
+        self._written(*instances)
+        return instances
+
+    async def async_batch_save(
+        self, instances: list[SQLModel | typing.Any], chunk_size: int | None = None
+    ):
+        """Save sql model instances in one session.
+
+        :param instances:
+        :param chunk_size: default config.bulk_chunk_size
+        :return:
+        """
+        async with self._async_session() as s:
+            for chunk in chunked(instances, chunk_size or self.config.bulk_chunk_size):
+                s.add_all(chunk)
+                await s.flush()
+        self._written(*instances, is_async=True)
         return instances
 
+    def batch_insert(
+        self,
+        entity: type[SQLModel],
+        rows: list[SQLModel | dict],
+        chunk_size: int | None = None,
+        returning: bool = False,
+    ) -> list[typing.Any] | int:
+        """Insert rows with executemany, without creating orm state.
+
+        :param entity:
+        :param rows: models or column dicts
+        :param chunk_size: default config.bulk_chunk_size
+        :param returning: return generated primary keys instead of row count
+        :return:
+        """
+        statement = SqlBuilder.build_insert_statement(entity, returning=returning)
+        inserted = []
+        count = 0
+        with self._connection(write=True) as conn:
+            for chunk in chunked(
+                SqlBuilder.to_rows(entity, rows),
+                chunk_size or self.config.bulk_chunk_size,
+            ):
+                result = conn.execute(statement, chunk)
+                if returning:
+                    inserted.extend(result.all())
+                count += len(chunk)
+        self._written(entity)
+        return inserted if returning else count
+
+    async def async_batch_insert(
+        self,
+        entity: type[SQLModel],
+        rows: list[SQLModel | dict],
+        chunk_size: int | None = None,
+        returning: bool = False,
+    ) -> list[typing.Any] | int:
+        """Async version of batch_insert."""
+        statement = SqlBuilder.build_insert_statement(entity, returning=returning)
+        inserted = []
+        count = 0
+        async with self._async_connection(write=True) as conn:
+            for chunk in chunked(
+                SqlBuilder.to_rows(entity, rows),
+                chunk_size or self.config.bulk_chunk_size,
+            ):
+                result = await conn.execute(statement, chunk)
+                if returning:
+                    inserted.extend(result.all())
+                count += len(chunk)
+        self._written(entity, is_async=True)
+        return inserted if returning else count
+
+    def batch_upsert(
+        self,
+        entity: type[SQLModel],
+        rows: list[SQLModel | dict],
+        conflict_keys: list[str],
+        update_columns: list[str] | None = None,
+        chunk_size: int | None = None,
+    ) -> int:
+        """Insert rows, updating the existing row on conflict_keys collision.
+
+        :param entity:
+        :param rows: models or column dicts
+        :param conflict_keys: columns of a unique index or primary key
+        :param update_columns: default every non-key column present in rows
+        :param chunk_size: default config.bulk_chunk_size
+        :return: count of rows sent
+        """
+        params = SqlBuilder.to_rows(entity, rows)
+        if not params:
+            return 0
+        if update_columns is None:
+            primary_keys = {c.name for c in entity.__table__.primary_key.columns}
+            update_columns = [
+                k for k in params[0] if k not in conflict_keys and k not in primary_keys
+            ]
+        statement = SqlBuilder.build_upsert_statement(
+            entity, self.engine.dialect.name, conflict_keys, update_columns
+        )
+        with self._connection(write=True) as conn:
+            for chunk in chunked(params, chunk_size or self.config.bulk_chunk_size):
+                conn.execute(statement, chunk)
+        self._written(entity)
+        return len(params)
+
+    def copy_insert(
+        self,
+        entity: type[SQLModel],
+        rows: list[SQLModel | dict],
+        columns: list[str] | None = None,
+    ) -> int:
+        """Load rows with PostgreSQL COPY FROM STDIN, psycopg driver only.
+
+        :param entity:
+        :param rows: models or column dicts
+        :param columns: default the keys of the first row
+        :return: count of rows copied
+        """
+        if self.engine.dialect.driver != "psycopg":
+            raise DAOException("copy_insert requires the postgresql+psycopg driver")
+        params = SqlBuilder.to_rows(entity, rows)
+        if not params:
+            return 0
+        columns = columns or list(params[0])
+        with self._connection(write=True) as conn:
+            preparer = conn.dialect.identifier_preparer
+            sql = "COPY {} ({}) FROM STDIN".format(
+                preparer.format_table(entity.__table__),
+                ", ".join(preparer.quote(c) for c in columns),
+            )
+            cursor = conn.connection.driver_connection.cursor()
+            with cursor, cursor.copy(sql) as copy:
+                for row in params:
+                    copy.write_row([row.get(c) for c in columns])
+        self._written(entity)
+        return len(params)
+
+    def buffered_writer(self, **kwargs) -> BufferedWriter:
+        """Write-behind writer, save calls are inserted in bulk on a background thread.
+
+        See BufferedWriter for max_rows, max_delay and max_pending.
+        """
+        return BufferedWriter(self, **kwargs)
+
+    def async_buffered_writer(self, **kwargs) -> AsyncBufferedWriter:
+        """Write-behind writer flushing on a task of the running event loop."""
+        return AsyncBufferedWriter(self, **kwargs)
+
     def plain_query(self, plain_sql: str, **kwargs) -> Sequence[RowMapping]:
         """Execute sql with binding parameters
         :param plain_sql:
         :param kwargs:
         :return:
         """
-        s = text(plain_sql)
-        with self.engine.connect() as conn:
-            result = conn.execute(s, kwargs).mappings().all()
-        return result
+        s = SqlBuilder.from_plain_sql(plain_sql)
+
+        def read():
+            return self._read(lambda conn: conn.execute(s, kwargs).mappings().all())
+
+        single_flight = self.single_flight
+        # inside unit_of_work the rows may include uncommitted writes
+        if single_flight is None or self.in_transaction():
+            return read()
+        key = query_key(plain_sql, kwargs)
+        if key is None:
+            return read()
+        return list(single_flight.do(key, read))
+
+    def query_columnar(
+        self,
+        plain_sql: str,
+        output: str = "numpy",
+        batch_size: int | None = None,
+        **kwargs,
+    ) -> typing.Any:
+        """Execute sql and return column oriented data instead of row mappings.
+
+        :param plain_sql:
+        :param output: numpy for dict of arrays, arrow for a pyarrow Table,
+            lists for dict of lists
+        :param batch_size: rows fetched per round trip, default config.stream_batch_size
+        :param kwargs:
+        :return:
+        """
+        batch_size = batch_size or self.config.stream_batch_size
+        s = SqlBuilder.from_plain_sql(plain_sql)
+
+        def read(conn):
+            result = conn.execution_options(yield_per=batch_size).execute(s, kwargs)
+            return to_columnar(result, output, batch_size)
+
+        return self._read(read)
 
     async def async_plain_query(self, plain_sql: str, **kwargs) -> Sequence[RowMapping]:
         """Execute sql with binding parameters
@@ -111,108 +832,789 @@ class DatabaseClient:
         :param kwargs:
         :return:
         """
-        s = text(plain_sql)
-        async with AsyncSession(self.async_engine) as conn:
-            result = await conn.execute(s, kwargs)
-        return result.mappings().all()
+        s = SqlBuilder.from_plain_sql(plain_sql)
+
+        async def read(conn):
+            return (await conn.execute(s, kwargs)).mappings().all()
+
+        single_flight = self.async_single_flight
+        if single_flight is None or self.in_transaction():
+            return await self._async_read(read)
+        key = query_key(plain_sql, kwargs)
+        if key is None:
+            return await self._async_read(read)
+        return list(await single_flight.do(key, lambda: self._async_read(read)))
+
+    def stream_query(
+        self, plain_sql: str | Executable, batch_size: int | None = None, **kwargs
+    ) -> Iterator[RowMapping]:
+        """Execute sql with a server side cursor and yield rows batch by batch.
+
+        :param plain_sql: plain sql or a core select, which keeps column types
+        :param batch_size: rows fetched per round trip, default config.stream_batch_size
+        :param kwargs:
+        :return:
+        """
+        for partition in self._partitions(plain_sql, batch_size, **kwargs):
+            yield from partition
+
+    async def async_stream_query(
+        self, plain_sql: str, batch_size: int | None = None, **kwargs
+    ) -> AsyncIterator[RowMapping]:
+        """Execute sql with a server side cursor and yield rows batch by batch.
+
+        :param plain_sql:
+        :param batch_size: rows fetched per round trip, default config.stream_batch_size
+        :param kwargs:
+        :return:
+        """
+        async for partition in self._async_partitions(plain_sql, batch_size, **kwargs):
+            for row in partition:
+                yield row
+
+    def stream_models(
+        self,
+        statement: str | select,
+        model_type: type[SQLModel] | typing.Any = None,
+        batch_size: int | None = None,
+        validate: bool = True,
+        **kwargs,
+    ) -> Iterator[SQLModel | typing.Any]:
+        """Stream models for a select statement or plain sql.
+
+        Plain sql rows are mapped to model_type one batch at a time.
+        :param statement:
+        :param model_type:
+        :param batch_size:
+        :param validate: False skips pydantic validation of plain sql rows
+        :param kwargs:
+        :return:
+        """
+        if isinstance(statement, str):
+            if model_type is None:
+                raise DAOException("model_type is required to stream plain sql")
+            yield from SqlResultMapper.stream_to_model(
+                self._partitions(statement, batch_size, **kwargs), model_type, validate
+            )
+            return
+        with self._session(commit=False) as session:
+            result = session.exec(
+                statement.execution_options(
+                    yield_per=batch_size or self.config.stream_batch_size
+                )
+            )
+            for partition in result.partitions():
+                yield from partition
+
+    async def async_stream_models(
+        self,
+        statement: str | select,
+        model_type: type[SQLModel] | typing.Any = None,
+        batch_size: int | None = None,
+        validate: bool = True,
+        **kwargs,
+    ) -> AsyncIterator[SQLModel | typing.Any]:
+        """Async version of stream_models.
+
+        :param statement:
+        :param model_type:
+        :param batch_size:
+        :param validate:
+        :param kwargs:
+        :return:
+        """
+        if isinstance(statement, str):
+            if model_type is None:
+                raise DAOException("model_type is required to stream plain sql")
+            async for partition in self._async_partitions(
+                statement, batch_size, **kwargs
+            ):
+                for item in SqlResultMapper.sql_result_to_model(
+                    partition, model_type, validate
+                ):
+                    yield item
+            return
+        async with self._async_session(commit=False) as session:
+            result = await session.stream_scalars(
+                statement,
+                execution_options={
+                    "yield_per": batch_size or self.config.stream_batch_size
+                },
+            )
+            async for partition in result.partitions():
+                for item in partition:
+                    yield item
+
+    def _partitions(
+        self, plain_sql: str | Executable, batch_size: int | None = None, **kwargs
+    ) -> Iterator[Sequence[RowMapping]]:
+        if isinstance(plain_sql, str):
+            plain_sql = SqlBuilder.from_plain_sql(plain_sql)
+        with self._connection() as conn:
+            result = conn.execution_options(
+                yield_per=batch_size or self.config.stream_batch_size
+            ).execute(plain_sql, kwargs)
+            yield from result.mappings().partitions()
+
+    async def _async_partitions(
+        self, plain_sql: str, batch_size: int | None = None, **kwargs
+    ) -> AsyncIterator[Sequence[RowMapping]]:
+        async with self._async_connection() as conn:
+            result = await conn.stream(
+                SqlBuilder.from_plain_sql(plain_sql),
+                kwargs,
+                execution_options={
+                    "yield_per": batch_size or self.config.stream_batch_size
+                },
+            )
+            async for partition in result.mappings().partitions():
+                yield partition
 
     def query_for_model(
-        self, statement: select
+        self,
+        statement: select,
+        params: dict | None = None,
+        columns: Sequence[str] | None = None,
+        exclude: Sequence[str] | None = None,
     ) -> Sequence[Row[Any] | RowMapping | Any]:
-        with Session(self.engine) as session:
-            result = session.exec(statement).fetchall()
+        """Models of a select statement, the statement runs as given.
+
+        __deferred_columns__ only apply to find_by and get_by_id.
+        :param statement: select of one model
+        :param params:
+        :param columns: select only these columns, returns rows
+        :param exclude: defer these columns of the models, they load on access
+        :return:
+        """
+        if columns is not None:
+            statement = _projected(statement, columns, None)
+            return self._read(lambda conn: conn.execute(statement, params).all())
+        if exclude:
+            statement = _projected(statement, None, exclude)
+        result = self._read(
+            lambda session: session.exec(
+                statement, params=params, execution_options=_REFRESH_IDENTITY_MAP
+            ).fetchall(),
+            orm=True,
+        )
+        load_on_access(self, result)
         return result
 
-    def async_query_for_model(
-        self, statement: select
+    async def async_query_for_model(
+        self,
+        statement: select,
+        params: dict | None = None,
+        columns: Sequence[str] | None = None,
+        exclude: Sequence[str] | None = None,
     ) -> Sequence[Row[Any] | RowMapping | Any]:
-        with AsyncSession(self.engine) as session:
-            result = session.exec(statement).fetchall()
+        if columns is not None:
+            statement = _projected(statement, columns, None)
+
+            async def read_rows(conn):
+                result = await conn.execute(statement, params)
+                return result.all()
+
+            return await self._async_read(read_rows)
+        if exclude:
+            statement = _projected(statement, None, exclude)
+
+        async def read(session):
+            result = await session.exec(
+                statement, params=params, execution_options=_REFRESH_IDENTITY_MAP
+            )
+            return result.all()
+
+        result = await self._async_read(read, orm=True)
+        load_on_access(self, result, is_async=True)
         return result
 
     def execute(self, plain_sql: str, **kwargs):
-        """Execute sql
+        """Execute sql, committed unless inside unit_of_work.
+
         :param plain_sql:
         :param kwargs:
         :return:
         """
         s = SqlBuilder.from_plain_sql(plain_sql)
-        with self.engine.connect() as conn:
-            return conn.execute(s, kwargs)
+        with self._connection(write=True) as conn:
+            result = conn.execute(s, kwargs)
+        # after the commit, a reader in between would cache the old rows again
+        self._written_tables(referenced_tables(plain_sql))
+        return result
 
     async def async_execute(self, plain_sql: str, **kwargs):
-        """Execute sql
+        """Execute sql, committed unless inside async_unit_of_work.
+
         :param plain_sql:
         :param kwargs:
         :return:
         """
         s = SqlBuilder.from_plain_sql(plain_sql)
-        with self.async_engine.connect() as conn:
-            return conn.execute(s, kwargs)
+        async with self._async_connection(write=True) as conn:
+            result = await conn.execute(s, kwargs)
+        self._written_tables(referenced_tables(plain_sql), is_async=True)
+        return result
+
+    def paginate(
+        self,
+        entity: type[SQLModel],
+        order_by: str | Sequence[str] = ("id",),
+        after: str | None = None,
+        page_size: int = 50,
+        count: str | None = None,
+        **kwargs,
+    ) -> Page:
+        """Keyset pagination, rows after the cursor instead of OFFSET.
+
+        Every page costs the same, the primary key is appended as tie breaker.
+        :param entity:
+        :param order_by: column names, -name for descending, NULLs sort last
+        :param after: next_cursor of the previous page, None for the first page
+        :param page_size:
+        :param count: None, exact (cached in result_cache) or estimate
+        :param kwargs: filters as in find_by
+        :return:
+        """
+        order = with_primary_key(entity, parse_order_by(order_by))
+        statement, params = keyset_select(entity, order, after, page_size + 1, **kwargs)
+        items = list(self.query_for_model(statement=statement, params=params))
+        page = _keyset_page(items, order, page_size, getattr)
+        if count is not None:
+            page.total = self.count(entity, estimate=count == "estimate", **kwargs)
+        return page
+
+    async def async_paginate(
+        self,
+        entity: type[SQLModel],
+        order_by: str | Sequence[str] = ("id",),
+        after: str | None = None,
+        page_size: int = 50,
+        count: str | None = None,
+        **kwargs,
+    ) -> Page:
+        """Async version of paginate, count estimate is not supported."""
+        order = with_primary_key(entity, parse_order_by(order_by))
+        statement, params = keyset_select(entity, order, after, page_size + 1, **kwargs)
+        items = list(
+            await self.async_query_for_model(statement=statement, params=params)
+        )
+        page = _keyset_page(items, order, page_size, getattr)
+        if count is not None:
+            page.total = await self.async_count(entity, **kwargs)
+        return page
+
+    def paginate_query(
+        self,
+        plain_sql: str,
+        order_by: str | Sequence[str],
+        after: str | None = None,
+        page_size: int = 50,
+        count: bool = False,
+        nullable: Sequence[str] = (),
+        **kwargs,
+    ) -> Page:
+        """Keyset pagination of plain sql.
+
+        The sql is wrapped as a subquery and order_by must name unique (combined)
+        columns of its result.
+        :param plain_sql:
+        :param order_by: result column names, -name for descending
+        :param after: next_cursor of the previous page
+        :param page_size:
+        :param count: include the cached total row count
+        :param nullable: order_by columns that may be NULL, NULLs sort last,
+            the others must be NOT NULL
+        :param kwargs:
+        :return: page of row mappings
+        """
+        order = parse_order_by(order_by)
+        sql, params = _keyset_query(
+            plain_sql, order, after, page_size, nullable, kwargs
+        )
+        rows = list(self.plain_query(sql, **params))
+        page = _keyset_page(rows, order, page_size, RowMapping.__getitem__)
+        if count:
+            page.total = self._cached_count(
+                f"SELECT COUNT(*) FROM ({plain_sql}) AS _count",  # noqa: S608
+                referenced_tables(plain_sql),
+                **kwargs,
+            )
+        return page
+
+    async def async_paginate_query(
+        self,
+        plain_sql: str,
+        order_by: str | Sequence[str],
+        after: str | None = None,
+        page_size: int = 50,
+        count: bool = False,
+        nullable: Sequence[str] = (),
+        **kwargs,
+    ) -> Page:
+        """Async version of paginate_query, the total row count is not cached."""
+        order = parse_order_by(order_by)
+        sql, params = _keyset_query(
+            plain_sql, order, after, page_size, nullable, kwargs
+        )
+        rows = list(await self.async_plain_query(sql, **params))
+        page = _keyset_page(rows, order, page_size, RowMapping.__getitem__)
+        if count:
+            total = await self.async_plain_query(
+                f"SELECT COUNT(*) AS total FROM ({plain_sql}) AS _count",  # noqa: S608
+                **kwargs,
+            )
+            page.total = total[0]["total"]
+        return page
+
+    def count(self, entity: type[SQLModel], estimate: bool = False, **kwargs) -> int:
+        """Row count of entity filtered by kwargs.
+
+        Cached in result_cache until the table is written or the ttl expires.
+        :param entity:
+        :param estimate: PostgreSQL planner estimate for unfiltered counts
+        :param kwargs:
+        :return:
+        """
+        table = table_name(entity)
+        if estimate and not kwargs and self.engine.dialect.name == "postgresql":
+            with self._connection() as conn:
+                estimated = conn.execute(
+                    SqlBuilder.from_plain_sql(_ESTIMATE_SQL), {"table": table}
+                ).scalar()
+            # -1 or 0 until the table is analyzed
+            if estimated and estimated > 0:
+                return int(estimated)
+        statement, params = SqlBuilder.prepare_select(entity, **kwargs)
+        return self._cached_count(
+            select(func.count()).select_from(statement.subquery()), {table}, **params
+        )
+
+    async def async_count(self, entity: type[SQLModel], **kwargs) -> int:
+        statement, params = SqlBuilder.prepare_select(entity, **kwargs)
+        statement = select(func.count()).select_from(statement.subquery())
+
+        async def read(conn):
+            return (await conn.execute(statement, params)).scalar_one()
+
+        return await self._async_read(read)
+
+    def _cached_count(self, statement, tables: set[str] | None, **kwargs) -> int:
+        sql = statement if isinstance(statement, str) else str(statement)
+        # None when a parameter, like the list of an IN criterion, is not hashable
+        key = query_key(sql, kwargs, "count")
+        cacheable = key is not None and tables is not None and not self.in_transaction()
+        if cacheable:
+            cached = self.result_cache.get(key)
+            if cached is not None:
+                return cached
+        if isinstance(statement, str):
+            statement = SqlBuilder.from_plain_sql(statement)
+        total = self._read(lambda conn: conn.execute(statement, kwargs).scalar_one())
+        if cacheable:
+            self.result_cache.set(key, total, tables=tables)
+        return total
 
     def find_by(
-        self, entity: [SQLModel], **kwargs
+        self,
+        entity: [SQLModel],
+        columns: Sequence[str] | None = None,
+        exclude: Sequence[str] | None = None,
+        **kwargs,
     ) -> Sequence[Row[Any] | RowMapping | Any]:
-        query = SqlBuilder.build_select_query(entity, **kwargs)
-        return self.query_for_model(statement=query)
+        """Models of entity matching criteria.
+
+        :param entity:
+        :param columns: select only these columns, returns rows instead of models
+        :param exclude: columns loaded on first access or with load_deferred,
+            None excludes __deferred_columns__ of entity, () loads every column
+        :param kwargs: field=value, or field__operator=value with eq, ne, lt, lte,
+            gt, gte, between, in, not_in, isnull, startswith, contains, ilike,
+            similar and search (the last two PostgreSQL only)
+        :return:
+        """
+        query, params = SqlBuilder.prepare_select(entity, columns, exclude, **kwargs)
+        return self._fetch_projected(query, params, columns)
 
     async def async_find_by(
-        self, entity: [SQLModel], **kwargs
+        self,
+        entity: [SQLModel],
+        columns: Sequence[str] | None = None,
+        exclude: Sequence[str] | None = None,
+        **kwargs,
     ) -> Sequence[Row[Any] | RowMapping | Any]:
-        query = SqlBuilder.build_select_query(entity, **kwargs)
-        return self.async_query_for_model(statement=query)
+        query, params = SqlBuilder.prepare_select(entity, columns, exclude, **kwargs)
+        return await self._async_fetch_projected(query, params, columns)
+
+    def _fetch_projected(self, statement, params: dict, columns) -> Sequence[Any]:
+        # statements of prepare_select are projected already
+        if columns is not None:
+            return self._read(lambda conn: conn.execute(statement, params).all())
+        return self.query_for_model(statement=statement, params=params)
+
+    async def _async_fetch_projected(
+        self, statement, params: dict, columns
+    ) -> Sequence[Any]:
+        if columns is not None:
+
+            async def read(conn):
+                result = await conn.execute(statement, params)
+                return result.all()
+
+            return await self._async_read(read)
+        return await self.async_query_for_model(statement=statement, params=params)
+
+    def index_report(self, entity: type[SQLModel], **kwargs) -> IndexReport:
+        """Criteria of a find_by call that no index of the table can serve."""
+        return index_report(self.engine, entity, **kwargs)
 
     def find_one(self, entity: [SQLModel], **kwargs) -> SQLModel | None:
         return self.one_or_none(entity, **kwargs)
 
-    async def async_find_one(
-        self, entity: [SQLModel], **kwargs
-    ) -> Coroutine[Any, Any, Any]:
-        return self.async_one_or_none(entity, **kwargs)
+    async def async_find_one(self, entity: [SQLModel], **kwargs) -> SQLModel | None:
+        return await self.async_one_or_none(entity, **kwargs)
+
+    def load_deferred(
+        self,
+        instances: SQLModel | Sequence[SQLModel],
+        *columns: str,
+        chunk_size: int | None = None,
+    ) -> typing.Any:
+        """Load deferred columns of instances of one model.
 
-    def one_or_none(self, entity: type[SQLModel], **kwargs) -> typing.Any:
-        query = SqlBuilder.build_select_query(entity, **kwargs)
-        result = self.query_for_model(statement=query)
+        One IN query per chunk, instances already holding the columns are skipped.
+        :param instances: instance or instances of one model
+        :param columns: columns to load, default every unloaded column
+        :param chunk_size: ids per query, default config.bulk_chunk_size
+        :return: instances
+        """
+        plan = self._deferred_plan(instances, columns)
+        if plan is None:
+            return instances
+        entity, names, pending, ids = plan
+        statement = SqlBuilder.build_select_columns_by_ids(entity, names)
+        for chunk in chunked(ids, chunk_size or self.config.bulk_chunk_size):
+            rows = self._read(
+                lambda conn, ids=chunk: conn.execute(statement, {"ids": ids}).all()
+            )
+            fill_deferred(pending, rows, names)
+        return instances
+
+    async def async_load_deferred(
+        self,
+        instances: SQLModel | Sequence[SQLModel],
+        *columns: str,
+        chunk_size: int | None = None,
+    ) -> typing.Any:
+        """Async version of load_deferred."""
+        plan = self._deferred_plan(instances, columns)
+        if plan is None:
+            return instances
+        entity, names, pending, ids = plan
+        statement = SqlBuilder.build_select_columns_by_ids(entity, names)
+        for chunk in chunked(ids, chunk_size or self.config.bulk_chunk_size):
+
+            async def read(conn, ids=chunk):
+                result = await conn.execute(statement, {"ids": ids})
+                return result.all()
+
+            fill_deferred(pending, await self._async_read(read), names)
+        return instances
+
+    @staticmethod
+    def _deferred_plan(
+        instances: SQLModel | Sequence[SQLModel], columns: tuple[str, ...]
+    ) -> tuple[type[SQLModel], tuple[str, ...], list[SQLModel], list[Any]] | None:
+        """Model, columns to load, instances missing them and their ids."""
+        if isinstance(instances, SQLModel):
+            instances = [instances]
+        if not instances:
+            return None
+        entity = type(instances[0])
+        if any(type(instance) is not entity for instance in instances):
+            raise DAOException("load_deferred needs instances of one model")
+        key = primary_key(entity).name
+        unloaded = [unloaded_columns(instance) for instance in instances]
+        names = (
+            projection(entity, exclude=columns)[1]
+            if columns
+            else tuple(sorted(set().union(*unloaded)))
+        )
+        pending = [
+            instance
+            for instance, missing in zip(instances, unloaded, strict=True)
+            if missing & set(names)
+        ]
+        if not names or not pending:
+            return None
+        ids = list(dict.fromkeys(getattr(instance, key) for instance in pending))
+        return entity, names, pending, ids
+
+    def one_or_none(
+        self,
+        entity: type[SQLModel],
+        columns: Sequence[str] | None = None,
+        exclude: Sequence[str] | None = None,
+        **kwargs,
+    ) -> typing.Any:
+        query, params = SqlBuilder.prepare_select_one(
+            entity, columns, exclude, **kwargs
+        )
+        result = self._fetch_projected(query, params, columns)
         if len(result) < 1:
             # raise RecordNotFoundException("Record Not Found", kwargs)
             return None
         else:
             return result[0]
 
-    async def async_one_or_none(self, entity: type[SQLModel], **kwargs) -> typing.Any:
-        """TODO: Check Out Work or Not."""
-        query = SqlBuilder.build_select_query(entity, **kwargs)
-        result = self.async_query_for_model(statement=query)
+    async def async_one_or_none(
+        self,
+        entity: type[SQLModel],
+        columns: Sequence[str] | None = None,
+        exclude: Sequence[str] | None = None,
+        **kwargs,
+    ) -> typing.Any:
+        query, params = SqlBuilder.prepare_select_one(
+            entity, columns, exclude, **kwargs
+        )
+        result = await self._async_fetch_projected(query, params, columns)
         if len(result) < 1:
             # raise RecordNotFoundException("Record Not Found", kwargs)
             return None
         else:
             return result[0]
 
+    def get_by_id(self, entity: type[SQLModel], ident: typing.Any) -> typing.Any:
+        """Instance by primary key, from identity_map when cached.
+
+        :param entity:
+        :param ident: primary key value
+        :return: instance or None
+        """
+        result = self.get_many_by_ids(entity, [ident])
+        return result[0] if result else None
+
+    async def async_get_by_id(
+        self, entity: type[SQLModel], ident: typing.Any
+    ) -> typing.Any:
+        result = await self.async_get_many_by_ids(entity, [ident])
+        return result[0] if result else None
+
+    def get_many_by_ids(
+        self,
+        entity: type[SQLModel],
+        ids: Sequence[typing.Any],
+        chunk_size: int | None = None,
+    ) -> list[typing.Any]:
+        """Instances by primary keys.
+
+        Ids missing from identity_map are loaded with one IN query per chunk.
+        Every call gets its own copies, identity_map keeps instances of its own.
+        Inside unit_of_work identity_map is bypassed, the session has its own.
+        :param entity:
+        :param ids: primary key values
+        :param chunk_size: ids per query, default config.bulk_chunk_size
+        :return: instances in ids order, ids without a row are left out
+        """
+        found, missing = self._identity_lookup(entity, ids)
+        load_on_access(self, list(found.values()))
+        if missing:
+            statement = SqlBuilder.build_select_by_ids(entity)
+            for chunk in chunked(missing, chunk_size or self.config.bulk_chunk_size):
+                self._identity_store(
+                    entity, found, self.query_for_model(statement, {"ids": chunk})
+                )
+        return [found[i] for i in ids if i in found]
+
+    async def async_get_many_by_ids(
+        self,
+        entity: type[SQLModel],
+        ids: Sequence[typing.Any],
+        chunk_size: int | None = None,
+    ) -> list[typing.Any]:
+        """Async version of get_many_by_ids."""
+        found, missing = self._identity_lookup(entity, ids)
+        load_on_access(self, list(found.values()), is_async=True)
+        if missing:
+            statement = SqlBuilder.build_select_by_ids(entity)
+            for chunk in chunked(missing, chunk_size or self.config.bulk_chunk_size):
+                self._identity_store(
+                    entity,
+                    found,
+                    await self.async_query_for_model(statement, {"ids": chunk}),
+                )
+        return [found[i] for i in ids if i in found]
+
+    def _identity_lookup(
+        self, entity: type[SQLModel], ids: Sequence[typing.Any]
+    ) -> tuple[dict[typing.Any, typing.Any], list[typing.Any]]:
+        table = table_name(entity)
+        found = {}
+        missing = {}
+        cached = not self.in_transaction() and len(self.identity_map)
+        for ident in ids:
+            instance = self.identity_map.get((table, ident)) if cached else None
+            if instance is None:
+                missing[ident] = None
+            else:
+                found[ident] = detached_copy(instance)
+        return found, list(missing)
+
+    def _identity_store(
+        self,
+        entity: type[SQLModel],
+        found: dict[typing.Any, typing.Any],
+        instances: Sequence[typing.Any],
+    ) -> None:
+        table = table_name(entity)
+        name = primary_key(entity).name
+        cache = not self.in_transaction()
+        for instance in instances:
+            ident = getattr(instance, name)
+            found[ident] = instance
+            if cache:
+                self.identity_map.set(
+                    (table, ident), detached_copy(instance), tables=(table,)
+                )
+
     def delete_by(self, entity: type[SQLModel], **kwargs) -> typing.NoReturn:
         if len(kwargs.values()) == 0:
             raise DAOException("can't execute delete without any filter")
-        with Session(self.engine) as session:
-            statement = SqlBuilder.build_delete_statement(entity, **kwargs)
-            session.exec(statement)
-            session.commit()
+        with self._session() as session:
+            statement, params = SqlBuilder.prepare_delete(entity, **kwargs)
+            session.exec(statement, params=params)
+        self._written(entity)
+
+    async def async_delete_by(
+        self, entity: type[SQLModel], **kwargs
+    ) -> typing.NoReturn:
+        if len(kwargs.values()) == 0:
+            raise DAOException("can't execute delete without any filter")
+        async with self._async_session() as session:
+            statement, params = SqlBuilder.prepare_delete(entity, **kwargs)
+            await session.exec(statement, params=params)
+        self._written(entity, is_async=True)
 
     def update_by_id(self, instance: SQLModel | typing.Any):
-        with Session(self.engine) as session:
-            statement = SqlBuilder.build_update_statement(instance)
-            session.exec(statement)
-            session.commit()
+        with self._session() as session:
+            statement, params = SqlBuilder.prepare_update(instance)
+            session.exec(statement, params=params)
+        self._written(instance)
+
+    async def async_update_by_id(self, instance: SQLModel | typing.Any):
+        async with self._async_session() as session:
+            statement, params = SqlBuilder.prepare_update(instance)
+            await session.exec(statement, params=params)
+        self._written(instance, is_async=True)
+
+    def batch_update(
+        self,
+        instances: list[SQLModel | typing.Any],
+        fields: list[str] | None = None,
+        chunk_size: int | None = None,
+    ) -> int:
+        """Update instances by primary key.
+
+        One executemany per entity and column set, only changed columns are sent.
+        :param instances:
+        :param fields: columns to send for every instance, default the changed ones
+        :param chunk_size: default config.bulk_chunk_size
+        :return: count of rows updated
+        """
+        groups = SqlBuilder.group_updates(instances, fields)
+        chunk_size = chunk_size or self.config.bulk_chunk_size
+        count = 0
+        with self._connection(write=True) as conn:
+            for (entity, columns), group in groups.items():
+                statement = SqlBuilder.build_batch_update_statement(entity, columns)
+                for chunk in chunked(group, chunk_size):
+                    result = conn.execute(
+                        statement,
+                        [SqlBuilder.to_update_params(i, columns) for i in chunk],
+                    )
+                    count += _updated_rows(conn, result, chunk)
+        for (_, columns), group in groups.items():
+            for instance in group:
+                mark_committed(instance, columns)
+        self._written(*{entity for entity, _ in groups})
+        return count
+
+    async def async_batch_update(
+        self,
+        instances: list[SQLModel | typing.Any],
+        fields: list[str] | None = None,
+        chunk_size: int | None = None,
+    ) -> int:
+        """Async version of batch_update."""
+        groups = SqlBuilder.group_updates(instances, fields)
+        chunk_size = chunk_size or self.config.bulk_chunk_size
+        count = 0
+        async with self._async_connection(write=True) as conn:
+            for (entity, columns), group in groups.items():
+                statement = SqlBuilder.build_batch_update_statement(entity, columns)
+                for chunk in chunked(group, chunk_size):
+                    result = await conn.execute(
+                        statement,
+                        [SqlBuilder.to_update_params(i, columns) for i in chunk],
+                    )
+                    count += _updated_rows(conn, result, chunk)
+        for (_, columns), group in groups.items():
+            for instance in group:
+                mark_committed(instance, columns)
+        self._written(*{entity for entity, _ in groups}, is_async=True)
+        return count
+
+    def batch_delete(
+        self,
+        entity: type[SQLModel],
+        ids: list[typing.Any],
+        chunk_size: int | None = None,
+    ) -> int:
+        """Delete rows by primary key with DELETE ... WHERE id IN (...) per chunk.
+
+        :param entity:
+        :param ids: primary key values
+        :param chunk_size: ids per statement, default config.bulk_chunk_size
+        :return: count of rows deleted
+        """
+        statement = SqlBuilder.build_batch_delete_statement(entity)
+        count = 0
+        with self._connection(write=True) as conn:
+            for chunk in chunked(ids, chunk_size or self.config.bulk_chunk_size):
+                count += conn.execute(statement, {"ids": chunk}).rowcount
+        self._written(entity)
+        return count
+
+    async def async_batch_delete(
+        self,
+        entity: type[SQLModel],
+        ids: list[typing.Any],
+        chunk_size: int | None = None,
+    ) -> int:
+        """Async version of batch_delete."""
+        statement = SqlBuilder.build_batch_delete_statement(entity)
+        count = 0
+        async with self._async_connection(write=True) as conn:
+            for chunk in chunked(ids, chunk_size or self.config.bulk_chunk_size):
+                count += (await conn.execute(statement, {"ids": chunk})).rowcount
+        self._written(entity, is_async=True)
+        return count
 
 
 class Databases(metaclass=SingletonMeta):
-    def __init__(self, conf=settings.DATABASES):
+    def __init__(self, conf=None, registry: EngineRegistry | None = None):
+        if conf is None:
+            from qpyconf import settings
+
+            conf = settings.DATABASES
         self._databases = {}
         self._settings = conf
+        # clients of every database share engines with the same config
+        self.registry = registry or EngineRegistry()
         self.__db_setup__()
 
     def __db_setup__(self):
         for item in self._settings:
-            self._databases[item] = DatabaseClient(database_config(item))
+            self._databases[item] = DatabaseClient(database_config(item), self.registry)
 
     def __getitem__(self, name):
         try:
@@ -230,9 +1632,28 @@ class Databases(metaclass=SingletonMeta):
         return self._databases["default"]
 
     def register_db(self, db_name: str, config: DatabaseConfig):
-        self._databases[db_name] = DatabaseClient(config)
+        """Register a client for config under db_name.
+
+        The registered client is kept when its config is the same, a replaced client
+        is closed.
+        :param db_name:
+        :param config:
+        :return:
+        """
+        client = self._databases.get(db_name)
+        if client is not None and client.config == config:
+            return client
+        self._databases[db_name] = DatabaseClient(config, self.registry)
+        if client is not None:
+            client.close()
         return self._databases[db_name]
 
+    def unregister_db(self, db_name: str) -> None:
+        """Close the client registered under db_name and forget it."""
+        client = self._databases.pop(db_name, None)
+        if client is not None:
+            client.close()
+
     def invoke(self, request: SqlRequestModel):
         """TODO: SQL Injection Protection
         :param request:
@@ -241,25 +1662,160 @@ class Databases(metaclass=SingletonMeta):
         client = self.register_db(request.db_name, request.config)
         return client.execute(request.sql, **request.parameters)
 
+    def engine_stats(self) -> EngineStats:
+        """Engines created, reused and disposed by the shared registry."""
+        return self.registry.stats()
+
+    def close(self) -> None:
+        """Close every client and dispose the engines of the registry."""
+        for client in self._databases.values():
+            client.close()
+        self.registry.dispose_all()
+
     def get_db(self, db_name: str = "default") -> DatabaseClient:
         if db_name is None:
             return self._databases["default"]
         else:
             return self._databases[db_name]
 
+    def _fan_out_jobs(
+        self,
+        sql: str | None,
+        params: dict | None,
+        db_names: Sequence[str] | None,
+        queries: dict[str, tuple[str, str, dict | None]] | None,
+    ) -> dict[str, tuple[DatabaseClient, str, dict]]:
+        if queries is not None:
+            return {
+                label: (self.get_db(name), query, query_params or {})
+                for label, (name, query, query_params) in queries.items()
+            }
+        if sql is None:
+            raise DAOException("fan out needs sql or queries")
+        return {
+            name: (self.get_db(name), sql, params or {})
+            for name in db_names or list(self._databases)
+        }
+
+    def fan_out(
+        self,
+        sql: str | None = None,
+        params: dict | None = None,
+        db_names: Sequence[str] | None = None,
+        queries: dict[str, tuple[str, str, dict | None]] | None = None,
+        concurrency: int = 10,
+        timeout: float | None = None,
+    ) -> FanOutResult:
+        """Run sql on several databases concurrently in worker threads.
 
-databases: Databases = Databases()
-db = databases.default_client()
+        Databases that fail or time out are reported in errors.
+        :param sql:
+        :param params:
+        :param db_names: default every registered database
+        :param queries: label -> (db_name, sql, params), instead of sql on db_names
+        :param concurrency: queries running at the same time
+        :param timeout: seconds per database
+        :return: results and errors by db name, or by label for queries
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            jobs = self._fan_out_jobs(sql, params, db_names, queries)
+            return asyncio.run(run_fan_out(jobs, concurrency, timeout, use_async=False))
+        raise DAOException("fan_out can't run inside an event loop, use async_fan_out")
+
+    async def async_fan_out(
+        self,
+        sql: str | None = None,
+        params: dict | None = None,
+        db_names: Sequence[str] | None = None,
+        queries: dict[str, tuple[str, str, dict | None]] | None = None,
+        concurrency: int = 10,
+        timeout: float | None = None,
+    ) -> FanOutResult:
+        """Async version of fan_out.
+
+        Databases with an async capable driver run on the event loop, the others
+        in worker threads.
+        """
+        jobs = self._fan_out_jobs(sql, params, db_names, queries)
+        return await run_fan_out(jobs, concurrency, timeout)
+
+    def copy_table(
+        self,
+        src: str,
+        dst: str,
+        table: type[SQLModel],
+        dst_table: type[SQLModel] | None = None,
+        key_column: str | None = "id",
+        workers: int = 4,
+        batch_size: int = 5000,
+        queue_size: int = 8,
+        method: str = "auto",
+        progress: typing.Callable[[CopyStats], None] | None = None,
+    ) -> CopyStats:
+        """Copy a table from database src to database dst.
+
+        Key ranges are read with server side cursors and written in parallel.
+        :param src: source db name
+        :param dst: destination db name
+        :param table:
+        :param dst_table: table to write, default table
+        :param key_column: integer column to split into ranges, None reads one range
+        :param workers: readers, and writers, running at the same time
+        :param batch_size: rows per fetch and per write
+        :param queue_size: batches waiting between readers and writers
+        :param method: auto (COPY on psycopg), insert or copy
+        :param progress: called with the stats after every written batch
+        :return: rows, rows/sec and errors of failed ranges or batches
+        """
+        return copy_table(
+            self.get_db(src),
+            self.get_db(dst),
+            table,
+            dst_table,
+            key_column=key_column,
+            workers=workers,
+            batch_size=batch_size,
+            queue_size=queue_size,
+            method=method,
+            progress=progress,
+        )
 
-def init_database(database: DatabaseClient, schema_name: str = ""):
-    """Init postgresql database
+
+def get_databases() -> Databases:
+    """The Databases singleton, created from settings on first use."""
+    return Databases()
+
+
+def __getattr__(name: str):
+    # databases and db are created on first access, not at import time
+    if name == "databases":
+        return get_databases()
+    if name == "db":
+        return get_databases().default_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def init_database(
+    database: DatabaseClient, schema_name: str = "", use_snapshot: bool = True
+):
+    """Init postgresql database.
+
+    create_all is skipped when the schema snapshot is current and has every
+    SQLModel table.
     :param database:
     :param schema_name:
+    :param use_snapshot: False always runs create_all
     :return:
     """
-    SQLModel.metadata.create_all(database.engine)
     metadata = MetaData(
         schema=schema_name,
     )
+    introspector = database.introspector(schema_name or None)
+    if use_snapshot and introspector.is_current(SQLModel.metadata):
+        return metadata
+    SQLModel.metadata.create_all(database.engine)
     metadata.create_all(database.engine)
+    introspector.refresh()
     return metadata
@@ -1,13 +1,15 @@
 from __future__ import annotations
 
+import inspect
 import typing
 from functools import wraps
 
 from pydantic import BaseModel
 from sqlmodel import SQLModel
 
-from qpydao import databases
 from qpydao import sql_utils
+from qpydao.caching import query_key
+from qpydao.database_client import get_databases
 
 
 def native_sql(
@@ -15,25 +17,103 @@ def native_sql(
     return_type: SQLModel | BaseModel | typing.Any = None,
     modify=False,
     db=None,
+    validate=True,
+    cache=False,
+    ttl: float | None = None,
+    paginate=False,
+    order_by: str | typing.Sequence[str] = ("id",),
+    nullable: typing.Sequence[str] = (),
 ):
+    """Bind a repository method to a sql statement.
+
+    :param sql_statement: sql with :name bind parameters taken from kwargs
+    :param return_type: default the repository base_type
+    :param modify: execute as a write and return the cursor result
+    :param db: database name, default the repository db_qualifier
+    :param validate: False maps trusted rows without validation
+    :param cache: cache mapped results in the client result_cache, callers get copies
+    :param ttl: cache seconds, default config.result_cache_ttl
+    :param paginate: return a keyset Page, the method takes after and page_size
+    :param order_by: unique result columns the pages are sorted by, -name for descending
+    :param nullable: order_by columns that may be NULL, NULLs sort last
+    :return: async def methods run on the async engine and are awaited
+    """
+
     def sql_decorator(func):
+        tables = sql_utils.referenced_tables(sql_statement) or ()
+
+        def prepare(args, kwargs):
+            engine = get_databases().get_db(db or args[0].db_qualifier)
+            new_return_type = args[0].base_type if return_type is None else return_type
+            key = None
+            # reads inside a unit of work may see uncommitted rows
+            if cache and not modify and not paginate and not engine.in_transaction():
+                key = query_key(sql_statement, kwargs, new_return_type, validate)
+            return engine, new_return_type, key
+
+        def to_models(raw_result, new_return_type):
+            return sql_utils.SqlResultMapper.sql_result_to_model(
+                raw_result, new_return_type, validate
+            )
+
+        def page_args(kwargs):
+            return {
+                "after": kwargs.pop("after", None),
+                "page_size": kwargs.pop("page_size", 50),
+                "nullable": nullable,
+            }
+
+        if inspect.iscoroutinefunction(func):
+
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                engine, new_return_type, key = prepare(args, kwargs)
+                if modify:
+                    return await engine.async_execute(sql_statement, **kwargs)
+                if paginate:
+                    page = await engine.async_paginate_query(
+                        sql_statement, order_by, **page_args(kwargs), **kwargs
+                    )
+                    page.items = to_models(page.items, new_return_type)
+                    return page
+                cached = engine.result_cache.get(key) if key else None
+                if cached is not None:
+                    return sql_utils.copy_result(cached)
+                raw_result = await engine.async_plain_query(sql_statement, **kwargs)
+                sql_result = to_models(raw_result, new_return_type)
+                if key is not None:
+                    engine.result_cache.set(
+                        key,
+                        tuple(sql_utils.copy_result(sql_result)),
+                        ttl=ttl,
+                        tables=tables,
+                    )
+                return sql_result
+
+            return async_wrapper
+
         @wraps(func)
         def wrapper(*args, **kwargs):
-            if db is None:
-                engine = databases.get_db(args[0].db_qualifier)
-            else:
-                engine = databases.get_db(db)
-
+            engine, new_return_type, key = prepare(args, kwargs)
             if modify:
-                sql_result = engine.execute(sql_statement, **kwargs)
-            else:
-                raw_result = engine.plain_query(sql_statement, **kwargs)
-                if return_type is None:
-                    new_return_type = args[0].base_type
-                else:
-                    new_return_type = return_type
-                sql_result = sql_utils.SqlResultMapper.sql_result_to_model(
-                    raw_result, new_return_type
+                return engine.execute(sql_statement, **kwargs)
+            if paginate:
+                page = engine.paginate_query(
+                    sql_statement, order_by, **page_args(kwargs), **kwargs
+                )
+                page.items = to_models(page.items, new_return_type)
+                return page
+            cached = engine.result_cache.get(key) if key else None
+            if cached is not None:
+                return sql_utils.copy_result(cached)
+            raw_result = engine.plain_query(sql_statement, **kwargs)
+            sql_result = to_models(raw_result, new_return_type)
+            if key is not None:
+                engine.result_cache.set(
+                    key,
+                    tuple(sql_utils.copy_result(sql_result)),
+                    ttl=ttl,
+                    tables=tables,
                 )
             return sql_result
 
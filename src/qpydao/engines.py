@@ -0,0 +1,495 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+import sqlalchemy
+from pydantic import BaseModel
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from .dao_logger import dao_logger
+from .models import DatabaseConfig
+
+"""
+1. engine factory for database client
+2. connection pool settings from DatabaseConfig
+3. pool statistics and pre-ping policy
+4. server side prepared statements for psycopg and asyncpg
+5. engine registry sharing one engine per config fingerprint
+"""
+
+_PSYCOPG_DRIVERS = ("psycopg", "psycopg_async")
+
+# DatabaseConfig fields that change how an engine is built
+_ENGINE_FIELDS = {
+    "pool_size",
+    "max_overflow",
+    "pool_timeout",
+    "pool_recycle",
+    "pool_use_lifo",
+    "pool_pre_ping",
+    "pool_pre_ping_interval",
+    "echo_queries",
+    "bulk_chunk_size",
+    "compiled_cache_size",
+    "prepare_threshold",
+    "prepared_max",
+    "transaction_pooling",
+}
+
+
+class PoolStatus(BaseModel):
+    """PoolStatus: snapshot of connection pool usage."""
+
+    size: int = 0
+    checked_in: int = 0
+    checked_out: int = 0
+    overflow: int = 0
+    checkouts: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+    # new connections opened by checkouts, not part of the wait
+    connects: int = 0
+    total_connect: float = 0.0
+    max_connect: float = 0.0
+    pings: int = 0
+    pings_skipped: int = 0
+
+    @property
+    def avg_wait(self) -> float:
+        return self.total_wait / self.checkouts if self.checkouts else 0.0
+
+
+class _TimedPoolMixin:
+    """Record how long each checkout waits for a pooled connection.
+
+    Opening a new connection is timed on its own and left out of the wait.
+    """
+
+    _connect_key = "qpydao_connect_time"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.connects = 0
+        self.total_connect = 0.0
+        self.max_connect = 0.0
+
+    def _create_connection(self):
+        start = time.perf_counter()
+        record = super()._create_connection()
+        connected = time.perf_counter() - start
+        self.connects += 1
+        self.total_connect += connected
+        if connected > self.max_connect:
+            self.max_connect = connected
+        # handed to _do_get through the record, checkouts may run concurrently
+        record.info[self._connect_key] = connected
+        return record
+
+    def _do_get(self):
+        start = time.perf_counter()
+        record = None
+        try:
+            record = super()._do_get()
+            return record
+        finally:
+            waited = time.perf_counter() - start
+            if record is not None:
+                waited -= record.info.pop(self._connect_key, 0.0)
+            self.checkouts += 1
+            self.total_wait += waited
+            if waited > self.max_wait:
+                self.max_wait = waited
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+class RecentCheckinPrePing:
+    """Pre-ping only connections that sat idle in the pool longer than interval.
+
+    Connections checked back in recently are assumed alive, which saves the
+    extra round trip ``pool_pre_ping`` adds to every checkout.
+    """
+
+    _checkin_key = "qpydao_checkin_at"
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.pings = 0
+        self.pings_skipped = 0
+
+    def install(self, engine: Engine):
+        event.listen(engine, "checkin", self.on_checkin)
+        event.listen(engine, "checkout", self.on_checkout)
+        self.dialect = engine.dialect
+
+    def on_checkin(self, dbapi_connection, connection_record):
+        connection_record.info[self._checkin_key] = time.monotonic()
+
+    def on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        checkin_at = connection_record.info.pop(self._checkin_key, None)
+        if checkin_at is None or time.monotonic() - checkin_at < self.interval:
+            self.pings_skipped += 1
+            return
+        self.pings += 1
+        try:
+            self.dialect.do_ping(dbapi_connection)
+        except Exception as e:
+            raise exc.DisconnectionError(str(e)) from e
+
+
+def _supports_queue_pool(db_url: str) -> bool:
+    url = make_url(db_url)
+    if url.get_backend_name() == "sqlite":
+        return url.database not in (None, "", ":memory:")
+    return True
+
+
+@functools.lru_cache(maxsize=64)
+def supports_async(db_url: str) -> bool:
+    """True when create_async_engine can run db_url.
+
+    Like postgresql+psycopg or sqlite+aiosqlite, False for sync only drivers like
+    psycopg2.
+    """
+    try:
+        return make_url(db_url).get_dialect(_is_async=True).is_async
+    except exc.SQLAlchemyError:
+        return False
+
+
+def prepared_statement_args(config: DatabaseConfig, db_url: str) -> dict[str, Any]:
+    """Driver connect arguments for prepared statements.
+
+    psycopg prepares a statement once it ran prepare_threshold times on a
+    connection and keeps prepared_max of them. Behind a transaction pooling
+    proxy (pgbouncer pool_mode=transaction) a statement prepared on one server
+    connection is unknown on the next, so transaction_pooling turns them off.
+    """
+    driver = make_url(db_url).get_driver_name()
+    if driver in _PSYCOPG_DRIVERS:
+        if config.transaction_pooling:
+            return {"prepare_threshold": None}
+        if config.prepare_threshold is not None:
+            return {"prepare_threshold": config.prepare_threshold}
+    elif driver == "asyncpg":
+        if config.transaction_pooling:
+            return {"statement_cache_size": 0, "prepared_statement_cache_size": 0}
+        if config.prepared_max is not None:
+            return {"prepared_statement_cache_size": config.prepared_max}
+    return {}
+
+
+def engine_options(
+    config: DatabaseConfig, db_url: str, async_engine: bool = False
+) -> dict[str, Any]:
+    """Translate DatabaseConfig pool settings into create_engine arguments.
+
+    :param config:
+    :param db_url:
+    :param async_engine:
+    :return:
+    """
+    options: dict[str, Any] = {
+        "pool_pre_ping": bool(config.pool_pre_ping)
+        and config.pool_pre_ping_interval is None,
+        "pool_recycle": config.pool_recycle,
+        "echo": config.echo_queries,
+        "insertmanyvalues_page_size": config.bulk_chunk_size,
+    }
+    if config.compiled_cache_size is not None:
+        options["query_cache_size"] = config.compiled_cache_size
+    connect_args = prepared_statement_args(config, db_url)
+    if connect_args:
+        options["connect_args"] = connect_args
+    if not _supports_queue_pool(db_url):
+        return options
+    options["poolclass"] = (
+        TimedAsyncAdaptedQueuePool if async_engine else TimedQueuePool
+    )
+    options["pool_use_lifo"] = bool(config.pool_use_lifo)
+    if config.pool_size is not None:
+        options["pool_size"] = config.pool_size
+    if config.max_overflow is not None:
+        options["max_overflow"] = config.max_overflow
+    if config.pool_timeout is not None:
+        options["pool_timeout"] = config.pool_timeout
+    return options
+
+
+def _install_pre_ping(config: DatabaseConfig, engine: Engine) -> None:
+    if config.pool_pre_ping and config.pool_pre_ping_interval is not None:
+        policy = RecentCheckinPrePing(config.pool_pre_ping_interval)
+        policy.install(engine)
+        engine.pre_ping_policy = policy
+
+
+def _install_prepared_max(config: DatabaseConfig, engine: Engine) -> None:
+    # psycopg has no connect argument for the prepared statement cache size
+    if (
+        config.prepared_max is None
+        or config.transaction_pooling
+        or engine.dialect.driver not in _PSYCOPG_DRIVERS
+    ):
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_prepared_max(dbapi_connection, connection_record):
+        # async drivers wrap the psycopg connection in an adapter
+        connection = getattr(dbapi_connection, "driver_connection", dbapi_connection)
+        connection.prepared_max = config.prepared_max
+
+
+def build_engine(config: DatabaseConfig) -> Engine:
+    engine = sqlalchemy.create_engine(
+        url=config.db_url, **engine_options(config, config.db_url)
+    )
+    _install_pre_ping(config, engine)
+    _install_prepared_max(config, engine)
+    return engine
+
+
+def build_async_engine(config: DatabaseConfig) -> AsyncEngine:
+    db_url = config.async_db_url or config.db_url
+    engine = create_async_engine(
+        url=db_url, **engine_options(config, db_url, async_engine=True)
+    )
+    _install_pre_ping(config, engine.sync_engine)
+    _install_prepared_max(config, engine.sync_engine)
+    return engine
+
+
+def pool_status(engine: Engine | AsyncEngine) -> PoolStatus:
+    """Collect pool usage from an engine's pool.
+
+    :param engine:
+    :return:
+    """
+    if isinstance(engine, AsyncEngine):
+        engine = engine.sync_engine
+    pool = engine.pool
+    status = PoolStatus()
+    if isinstance(pool, QueuePool):
+        status.size = pool.size()
+        status.checked_in = pool.checkedin()
+        status.checked_out = pool.checkedout()
+        status.overflow = max(pool.overflow(), 0)
+    if isinstance(pool, _TimedPoolMixin):
+        status.checkouts = pool.checkouts
+        status.total_wait = pool.total_wait
+        status.max_wait = pool.max_wait
+        status.connects = pool.connects
+        status.total_connect = pool.total_connect
+        status.max_connect = pool.max_connect
+    policy = getattr(engine, "pre_ping_policy", None)
+    if policy is not None:
+        status.pings = policy.pings
+        status.pings_skipped = policy.pings_skipped
+    return status
+
+
+def config_fingerprint(config: DatabaseConfig, async_engine: bool = False) -> str:
+    """Hash of the url and the engine settings of config.
+
+    Configs with the same fingerprint can share one engine. Driver and host names
+    are case-insensitive and the order of url query arguments does not matter.
+    """
+    url = make_url((config.async_db_url if async_engine else None) or config.db_url)
+    normalized = (
+        async_engine,
+        url.drivername.lower(),
+        url.username,
+        url.password,
+        (url.host or "").lower(),
+        url.port,
+        url.database,
+        tuple(sorted(url.query.items())),
+        tuple(sorted(config.model_dump(include=_ENGINE_FIELDS).items())),
+    )
+    return hashlib.sha256(repr(normalized).encode()).hexdigest()
+
+
+def dispose_engine(engine: Engine | AsyncEngine, close: bool = True) -> None:
+    """Close the pooled connections of engine.
+
+    Async engines are disposed on the running event loop, without one on a loop
+    of their own.
+    :param engine:
+    :param close: False only drops the pool, for a forked child whose connections
+        belong to the parent process
+    """
+    if not isinstance(engine, AsyncEngine):
+        engine.dispose(close=close)
+        return
+    if not close:
+        engine.sync_engine.dispose(close=False)
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        asyncio.run(engine.dispose())
+        return
+    loop.create_task(engine.dispose())
+
+
+class EngineStats(BaseModel):
+    """EngineStats: engines created, reused and disposed by an EngineRegistry."""
+
+    created: int = 0
+    reused: int = 0
+    disposed: int = 0
+    open: int = 0
+    in_use: int = 0
+
+    @property
+    def reuse_ratio(self) -> float:
+        acquired = self.created + self.reused
+        return self.reused / acquired if acquired else 0.0
+
+
+class _RegisteredEngine:
+    __slots__ = ("engine", "refs", "last_used")
+
+    def __init__(self, engine: Engine | AsyncEngine):
+        self.engine = engine
+        self.refs = 0
+        self.last_used = time.monotonic()
+
+
+class EngineRegistry:
+    """Share engines between clients with the same config fingerprint.
+
+    Engines are reference counted, an engine nobody holds is disposed after
+    idle_timeout seconds, or right away, least recently used first, when more
+    than max_engines pools are open.
+    """
+
+    def __init__(self, max_engines: int = 32, idle_timeout: float | None = 300):
+        self.max_engines = max_engines
+        self.idle_timeout = idle_timeout
+        self._engines: OrderedDict[str, _RegisteredEngine] = OrderedDict()
+        self._keys: dict[int, str] = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+        self.disposed = 0
+
+    def acquire(
+        self, config: DatabaseConfig, async_engine: bool = False
+    ) -> Engine | AsyncEngine:
+        """Engine for config, created when no engine has its fingerprint.
+
+        Every acquire needs a release.
+        """
+        key = config_fingerprint(config, async_engine)
+        with self._lock:
+            registered = self._engines.get(key)
+            if registered is None:
+                engine = (build_async_engine if async_engine else build_engine)(config)
+                registered = self._engines[key] = _RegisteredEngine(engine)
+                self._keys[id(engine)] = key
+                self.created += 1
+            else:
+                self._engines.move_to_end(key)
+                self.reused += 1
+            registered.refs += 1
+            registered.last_used = time.monotonic()
+            expired = self._expired()
+        self._dispose(expired)
+        return registered.engine
+
+    def release(self, engine: Engine | AsyncEngine) -> None:
+        """Give back an acquired engine, it stays open until it expires."""
+        with self._lock:
+            key = self._keys.get(id(engine))
+            if key is None:
+                return
+            registered = self._engines[key]
+            self._engines.move_to_end(key)
+            registered.refs = max(registered.refs - 1, 0)
+            registered.last_used = time.monotonic()
+            expired = self._expired()
+        self._dispose(expired)
+
+    def sweep(self) -> int:
+        """Dispose expired engines now.
+
+        :return: count of disposed engines
+        """
+        with self._lock:
+            expired = self._expired()
+        self._dispose(expired)
+        return len(expired)
+
+    def dispose_all(self) -> None:
+        with self._lock:
+            expired = [registered.engine for registered in self._engines.values()]
+            self._engines.clear()
+            self._keys.clear()
+            self.disposed += len(expired)
+        for engine in expired:
+            dispose_engine(engine)
+
+    def stats(self) -> EngineStats:
+        with self._lock:
+            return EngineStats(
+                created=self.created,
+                reused=self.reused,
+                disposed=self.disposed,
+                open=len(self._engines),
+                in_use=sum(1 for r in self._engines.values() if r.refs),
+            )
+
+    def _expired(self) -> list[Engine | AsyncEngine]:
+        # caller holds the lock, engines are disposed after it is released
+        now = time.monotonic()
+        idle = [key for key, r in self._engines.items() if not r.refs]
+        expired = []
+        if self.idle_timeout is not None:
+            expired = [
+                key
+                for key in idle
+                if now - self._engines[key].last_used >= self.idle_timeout
+            ]
+        # idle is in least recently used order
+        over = len(self._engines) - len(expired) - self.max_engines
+        for key in idle:
+            if over <= 0:
+                break
+            if key not in expired:
+                expired.append(key)
+                over -= 1
+        if len(self._engines) - len(expired) > self.max_engines:
+            dao_logger.warning(
+                f"{len(self._engines)} engines in use, above max_engines "
+                f"{self.max_engines}"
+            )
+        engines = []
+        for key in expired:
+            registered = self._engines.pop(key)
+            self._keys.pop(id(registered.engine), None)
+            engines.append(registered.engine)
+        self.disposed += len(engines)
+        return engines
+
+    @staticmethod
+    def _dispose(engines: list[Engine | AsyncEngine]) -> None:
+        for engine in engines:
+            dispose_engine(engine)
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any
+
+from pydantic import BaseModel
+
+from .dao_logger import dao_logger
+from .engines import supports_async
+
+"""
+1. scatter-gather: run queries on several databases concurrently
+2. clients with an async capable driver run on the event loop,
+   sync only drivers in worker threads
+3. a failing or slow database is reported in errors, the others still return
+"""
+
+
+class FanOutResult(BaseModel):
+    """FanOutResult: rows per label, errors of the labels that failed."""
+
+    results: dict[str, Any] = {}
+    errors: dict[str, str] = {}
+    elapsed: dict[str, float] = {}
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    @property
+    def partial(self) -> bool:
+        return bool(self.errors) and bool(self.results)
+
+
+async def run_fan_out(
+    jobs: dict[str, tuple[Any, str, dict]],
+    concurrency: int = 10,
+    timeout: float | None = None,
+    use_async: bool = True,
+) -> FanOutResult:
+    """Run plain queries concurrently.
+
+    :param jobs: label -> (client, sql, params)
+    :param concurrency: queries running at the same time
+    :param timeout: seconds per query, counted once it starts
+    :param use_async: run clients with an async capable driver on the event loop
+    :return:
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    # own executor, threads of timed out queries must not hold up asyncio.run
+    executor = ThreadPoolExecutor(
+        max_workers=concurrency, thread_name_prefix="qpydao-fan-out"
+    )
+    loop = asyncio.get_running_loop()
+    fan_out = FanOutResult()
+
+    async def run(label: str, client, sql: str, params: dict) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                if use_async and supports_async(
+                    client.config.async_db_url or client.config.db_url
+                ):
+                    query = client.async_plain_query(sql, **params)
+                else:
+                    query = loop.run_in_executor(
+                        executor, partial(client.plain_query, sql, **params)
+                    )
+                fan_out.results[label] = list(await asyncio.wait_for(query, timeout))
+            except TimeoutError:
+                fan_out.errors[label] = f"timed out after {timeout}s"
+            except Exception as e:
+                fan_out.errors[label] = f"{type(e).__name__}: {e}"
+            finally:
+                fan_out.elapsed[label] = time.perf_counter() - start
+            if label in fan_out.errors:
+                dao_logger.warning(f"fan out {label} failed: {fan_out.errors[label]}")
+
+    try:
+        await asyncio.gather(*(run(label, *job) for label, job in jobs.items()))
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return fan_out
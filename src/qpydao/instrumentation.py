@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import threading
+import time
+from bisect import bisect_left
+from typing import Any
+
+from pydantic import BaseModel, Field
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .dao_logger import dao_logger
+from .engines import PoolStatus
+
+"""
+1. query profiling with sqlalchemy engine events
+2. per statement latency histogram, rows, slowest queries
+3. exporters: in memory, logging, prometheus text format
+"""
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_START_KEY = "_qpydao_query_start"
+
+
+class StatementStats(BaseModel):
+    """StatementStats: aggregated timings of one sql statement."""
+
+    statement: str
+    count: int = 0
+    total_time: float = 0.0
+    max_time: float = 0.0
+    # rows changed by writes, None while only row returning statements ran
+    rows: int | None = None
+    # counts per LATENCY_BUCKETS upper bound, the last slot is +Inf
+    buckets: list[int] = Field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+
+    @property
+    def avg_time(self) -> float:
+        return self.total_time / self.count if self.count else 0.0
+
+
+class QueryRecord(BaseModel):
+    """QueryRecord: one executed statement."""
+
+    statement: str
+    duration: float
+    rows: int | None
+
+
+class ProfileSnapshot(BaseModel):
+    """ProfileSnapshot: profiler state at one point in time."""
+
+    statements: list[StatementStats]
+    slowest: list[QueryRecord]
+    pool: PoolStatus | None = None
+
+
+class QueryProfiler:
+    """Collect query timings from engine events, only attached engines pay for it."""
+
+    def __init__(self, slowest: int = 10, exporters: list[Any] | None = None):
+        self.slowest_size = slowest
+        self.exporters = list(exporters or [])
+        self._stats: dict[str, StatementStats] = {}
+        self._slowest: list[tuple[float, int, QueryRecord]] = []
+        self._counter = itertools.count()
+        self._engines: list[Engine] = []
+        self._lock = threading.Lock()
+
+    def attach(self, engine: Engine) -> None:
+        if engine in self._engines:
+            return
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+        self._engines.append(engine)
+
+    def detach(self) -> None:
+        for engine in self._engines:
+            event.remove(engine, "before_cursor_execute", self._before_cursor_execute)
+            event.remove(engine, "after_cursor_execute", self._after_cursor_execute)
+        self._engines.clear()
+
+    def _before_cursor_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        conn.info.setdefault(_START_KEY, []).append(time.perf_counter())
+
+    def _after_cursor_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        starts = conn.info.get(_START_KEY)
+        if not starts:
+            return
+        duration = time.perf_counter() - starts.pop()
+        # selects are fetched after this event, their rowcount is not a row count
+        rows = None
+        if cursor.description is None and cursor.rowcount >= 0:
+            rows = cursor.rowcount
+        self.record(statement, duration, rows)
+
+    def record(self, statement: str, duration: float, rows: int | None = None) -> None:
+        with self._lock:
+            stats = self._stats.get(statement)
+            if stats is None:
+                stats = self._stats[statement] = StatementStats(statement=statement)
+            stats.count += 1
+            stats.total_time += duration
+            if rows is not None:
+                stats.rows = (stats.rows or 0) + rows
+            stats.max_time = max(stats.max_time, duration)
+            stats.buckets[bisect_left(LATENCY_BUCKETS, duration)] += 1
+            if self.slowest_size <= 0:
+                return
+            item = (
+                duration,
+                next(self._counter),
+                QueryRecord(statement=statement, duration=duration, rows=rows),
+            )
+            if len(self._slowest) < self.slowest_size:
+                heapq.heappush(self._slowest, item)
+            elif duration > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, item)
+
+    def snapshot(self, pool: PoolStatus | None = None) -> ProfileSnapshot:
+        with self._lock:
+            return ProfileSnapshot(
+                statements=[s.model_copy(deep=True) for s in self._stats.values()],
+                slowest=[r for _, _, r in sorted(self._slowest, reverse=True)],
+                pool=pool,
+            )
+
+    def export(self, pool: PoolStatus | None = None) -> ProfileSnapshot:
+        snapshot = self.snapshot(pool)
+        for exporter in self.exporters:
+            exporter.export(snapshot)
+        return snapshot
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+            self._slowest.clear()
+
+
+class InMemoryExporter:
+    """Keep exported snapshots in a list."""
+
+    def __init__(self):
+        self.snapshots: list[ProfileSnapshot] = []
+
+    def export(self, snapshot: ProfileSnapshot) -> None:
+        self.snapshots.append(snapshot)
+
+
+class LoggingExporter:
+    """Write the slowest statements through dao_logger."""
+
+    def __init__(self, top: int = 10):
+        self.top = top
+
+    def export(self, snapshot: ProfileSnapshot) -> None:
+        statements = sorted(snapshot.statements, key=lambda s: -s.total_time)
+        for stats in statements[: self.top]:
+            dao_logger.info(
+                f"count={stats.count} total={stats.total_time:.4f}s "
+                f"avg={stats.avg_time:.4f}s max={stats.max_time:.4f}s "
+                f"rows={stats.rows} sql={stats.statement}"
+            )
+        if snapshot.pool is not None:
+            dao_logger.info(f"pool {snapshot.pool}")
+
+
+def _label(value: str) -> str:
+    value = " ".join(value.split())
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+class PrometheusExporter:
+    """Render snapshots in the Prometheus text exposition format."""
+
+    def __init__(self, prefix: str = "qpydao"):
+        self.prefix = prefix
+        self.text = ""
+
+    def export(self, snapshot: ProfileSnapshot) -> None:
+        self.text = self.render(snapshot)
+
+    def render(self, snapshot: ProfileSnapshot) -> str:
+        p = self.prefix
+        duration = f"{p}_query_duration_seconds"
+        lines = [f"# TYPE {duration} histogram"]
+        for stats in snapshot.statements:
+            label = f'statement="{_label(stats.statement)}"'
+            cumulative = 0
+            for bound, count in zip(
+                (*LATENCY_BUCKETS, "+Inf"), stats.buckets, strict=True
+            ):
+                cumulative += count
+                lines.append(f'{duration}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f"{duration}_sum{{{label}}} {stats.total_time}")
+            lines.append(f"{duration}_count{{{label}}} {stats.count}")
+        lines.append(f"# TYPE {p}_query_rows_total counter")
+        for stats in snapshot.statements:
+            if stats.rows is None:
+                continue
+            label = f'statement="{_label(stats.statement)}"'
+            lines.append(f"{p}_query_rows_total{{{label}}} {stats.rows}")
+        if snapshot.pool is not None:
+            pool = snapshot.pool
+            for name, kind, value in (
+                ("pool_checked_out", "gauge", pool.checked_out),
+                ("pool_overflow", "gauge", pool.overflow),
+                ("pool_checkouts_total", "counter", pool.checkouts),
+                ("pool_wait_seconds_total", "counter", pool.total_wait),
+                ("pool_wait_seconds_max", "gauge", pool.max_wait),
+                ("pool_connects_total", "counter", pool.connects),
+                ("pool_connect_seconds_total", "counter", pool.total_connect),
+            ):
+                lines.append(f"# TYPE {p}_{name} {kind}")
+                lines.append(f"{p}_{name} {value}")
+        return "\n".join(lines) + "\n"
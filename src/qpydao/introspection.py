@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import time
+from pathlib import Path
+from typing import Any
+
+import sqlalchemy
+from pydantic import BaseModel
+from sqlalchemy import MetaData, make_url
+
+from .dao_logger import dao_logger
+from .models import FieldMeta, TableMeta
+from .sql_utils import SqlBuilder
+
+"""
+1. reflect database tables into TableMeta / FieldMeta
+2. one catalog query gives a signature per table, only changed tables are reflected
+3. the snapshot is saved as json, keyed by the hash of all table signatures
+"""
+
+_PG_SIGNATURES = """
+SELECT c.relname AS table_name,
+       md5(string_agg(a.attname || ':' || format_type(a.atttypid, a.atttypmod)
+                      || ':' || a.attnotnull::text, ',' ORDER BY a.attnum)) AS signature
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+WHERE c.relkind IN ('r', 'p', 'v', 'm', 'f')
+  AND n.nspname = coalesce(CAST(:schema AS text), current_schema())
+GROUP BY c.relname
+"""
+
+_SQLITE_SIGNATURES = """
+SELECT name AS table_name, sql AS signature FROM sqlite_master
+WHERE type IN ('table', 'view') AND name NOT LIKE 'sqlite_%'
+"""
+
+
+class SchemaSnapshot(BaseModel):
+    """SchemaSnapshot: reflected tables of one schema and their signatures."""
+
+    schema_name: str | None = None
+    schema_hash: str = ""
+    created_at: float = 0.0
+    tables: dict[str, TableMeta] = {}
+
+
+def schema_hash(signatures: dict[str, str]) -> str:
+    digest = hashlib.sha256()
+    for name in sorted(signatures):
+        digest.update(f"{name}={signatures[name]};".encode())
+    return digest.hexdigest()
+
+
+def _code_type(column_type: Any) -> str:
+    try:
+        return column_type.python_type.__name__
+    except NotImplementedError:
+        return "Any"
+
+
+def field_meta(column: dict[str, Any], primary_keys: set[str]) -> FieldMeta:
+    """FieldMeta of an inspector column, code_value is the sqlmodel default."""
+    primary_key = column["name"] in primary_keys
+    if primary_key:
+        code_value = "Field(default=None, primary_key=True)"
+    elif column.get("nullable", True):
+        code_value = "None"
+    else:
+        code_value = ""
+    return FieldMeta(
+        field_name=column["name"],
+        field_type=str(column["type"]),
+        code_type=_code_type(column["type"]),
+        code_value=code_value,
+        nullable=bool(column.get("nullable", True)),
+        primary_key=primary_key,
+    )
+
+
+class SchemaIntrospector:
+    """Reflect a schema into TableMeta once and keep it current incrementally."""
+
+    def __init__(
+        self,
+        client,
+        schema: str | None = None,
+        cache_dir: str | os.PathLike | None = None,
+    ):
+        self.client = client
+        self.schema = schema or None
+        if cache_dir is None:
+            cache_dir = client.config.schema_cache_dir
+        self.cache_dir = Path(cache_dir).expanduser() if cache_dir else None
+        self.snapshot: SchemaSnapshot | None = None
+        # tables reflected by the last refresh
+        self.reflected: list[str] = []
+
+    @property
+    def cache_file(self) -> Path | None:
+        if self.cache_dir is None:
+            return None
+        url = make_url(self.client.config.db_url)
+        key = f"{url.render_as_string(hide_password=True)}|{self.schema or ''}"
+        digest = hashlib.sha256(key.encode()).hexdigest()[:16]
+        return self.cache_dir / f"schema-{digest}.json"
+
+    def table_signatures(self) -> dict[str, str]:
+        """Signature per table from one catalog query.
+
+        Other dialects fall back to reflecting every table's columns.
+        """
+        engine = self.client.engine
+        dialect = engine.dialect.name
+        if dialect in ("postgresql", "sqlite"):
+            sql = _PG_SIGNATURES if dialect == "postgresql" else _SQLITE_SIGNATURES
+            params = {"schema": self.schema} if dialect == "postgresql" else {}
+            with engine.connect() as conn:
+                rows = conn.execute(SqlBuilder.from_plain_sql(sql), params)
+                return {name: signature or "" for name, signature in rows}
+        inspector = sqlalchemy.inspect(engine)
+        signatures = {}
+        for name in inspector.get_table_names(schema=self.schema):
+            columns = inspector.get_columns(name, schema=self.schema)
+            shape = [(c["name"], str(c["type"]), c["nullable"]) for c in columns]
+            signatures[name] = hashlib.sha256(repr(shape).encode()).hexdigest()
+        return signatures
+
+    def load(self) -> SchemaSnapshot | None:
+        """Snapshot from the cache file, None when missing or unreadable."""
+        if self.snapshot is None and self.cache_file is not None:
+            try:
+                self.snapshot = SchemaSnapshot.model_validate_json(
+                    self.cache_file.read_text()
+                )
+            except (OSError, ValueError):
+                return None
+        return self.snapshot
+
+    def save(self, snapshot: SchemaSnapshot) -> None:
+        """Keep snapshot and write it to the cache file.
+
+        A cache file that can't be written keeps it in memory only.
+        """
+        self.snapshot = snapshot
+        if self.cache_file is None:
+            return
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp = self.cache_file.with_suffix(".tmp")
+            tmp.write_text(snapshot.model_dump_json())
+            os.replace(tmp, self.cache_file)
+        except OSError as e:
+            dao_logger.warning(f"schema snapshot not saved to {self.cache_file}: {e}")
+
+    def is_current(self, metadata: MetaData | None = None) -> bool:
+        """True when the snapshot matches the database.
+
+        With metadata the snapshot must also have every table of it in this schema.
+        """
+        snapshot = self.load()
+        if snapshot is None:
+            return False
+        if metadata is not None:
+            names = {
+                t.name for t in metadata.tables.values() if t.schema == self.schema
+            }
+            if not names <= snapshot.tables.keys():
+                return False
+        return snapshot.schema_hash == schema_hash(self.table_signatures())
+
+    def refresh(self) -> SchemaSnapshot:
+        """Reflect the tables whose signature changed since the snapshot.
+
+        Tables that no longer exist are dropped and the snapshot is saved.
+        """
+        signatures = self.table_signatures()
+        current_hash = schema_hash(signatures)
+        snapshot = self.load()
+        if snapshot is not None and snapshot.schema_hash == current_hash:
+            self.reflected = []
+            return snapshot
+        previous = snapshot.tables if snapshot is not None else {}
+        changed = [
+            name
+            for name, signature in signatures.items()
+            if name not in previous or previous[name].signature != signature
+        ]
+        tables = {name: previous[name] for name in signatures if name not in changed}
+        inspector = sqlalchemy.inspect(self.client.engine)
+        for name in changed:
+            tables[name] = self._reflect(inspector, name, signatures[name])
+        self.reflected = changed
+        dao_logger.info(
+            f"schema {self.schema or 'default'}: reflected {len(changed)} tables"
+        )
+        snapshot = SchemaSnapshot(
+            schema_name=self.schema,
+            schema_hash=current_hash,
+            created_at=time.time(),
+            tables=tables,
+        )
+        self.save(snapshot)
+        return snapshot
+
+    def _reflect(self, inspector, name: str, signature: str) -> TableMeta:
+        primary_keys = set(
+            inspector.get_pk_constraint(name, schema=self.schema).get(
+                "constrained_columns"
+            )
+            or ()
+        )
+        return TableMeta(
+            table_name=name,
+            schema_name=self.schema,
+            signature=signature,
+            fields=[
+                field_meta(column, primary_keys)
+                for column in inspector.get_columns(name, schema=self.schema)
+            ],
+        )
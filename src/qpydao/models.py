@@ -1,13 +1,13 @@
 from __future__ import annotations
 
 from abc import ABCMeta
-from typing import Any
+from typing import Any, ClassVar
 
 from pydantic import BaseModel, model_validator
-from qpyconf import settings
 from sqlmodel import Field, SQLModel
 
 from .exceptions import DatabaseClientConfigError
+from .projection import without_unloaded
 
 
 def _validate_param(name: str, value: str) -> None:
@@ -21,14 +21,38 @@ class DatabaseConfig(BaseModel):
     """database client configurations."""
 
     db_url: str | None = None
+    async_db_url: str | None = None
     host: str = None
     user: str = None
     password: str = None
     database: str = None
     port: int | None = 5432
     pool_size: int | None = 10
+    max_overflow: int | None = 10
+    pool_timeout: float | None = 30
     pool_recycle: int | None = 3600
-    echo_queries: bool | None = True
+    pool_use_lifo: bool = False
+    pool_pre_ping: bool = True
+    pool_pre_ping_interval: float | None = None
+    replica_urls: list[str] = []
+    async_replica_urls: list[str] = []
+    replica_strategy: str = "round_robin"
+    replica_retry_interval: float = 30
+    echo_queries: bool | None = False
+    profile_queries: bool = False
+    profile_slowest: int = 10
+    stream_batch_size: int = 1000
+    bulk_chunk_size: int = 1000
+    compiled_cache_size: int | None = None
+    result_cache_size: int = 1024
+    result_cache_ttl: float | None = 300
+    identity_map_size: int = 4096
+    identity_map_ttl: float | None = 60
+    prepare_threshold: int | None = None
+    prepared_max: int | None = None
+    transaction_pooling: bool = False
+    coalesce_reads: bool = False
+    schema_cache_dir: str | None = None
     charset: str | None = "utf8"
     options: dict[str, Any] = None
 
@@ -40,6 +64,7 @@ class DatabaseConfig(BaseModel):
             _validate_param("password", self.host)
             _validate_param("port", self.host)
             _validate_param("database", self.host)
+        return self
 
 
 class SqlRequestModel(BaseModel):
@@ -58,6 +83,8 @@ class FieldMeta(BaseModel):
     field_type: str
     code_type: str = ""
     code_value: str = ""
+    nullable: bool = True
+    primary_key: bool = False
 
 
 class TableMeta(BaseModel):
@@ -65,12 +92,27 @@ class TableMeta(BaseModel):
 
     table_name: str
     fields: list[FieldMeta]
+    schema_name: str | None = None
+    signature: str = ""
 
 
 class BaseEntity(SQLModel):
-    """BaseEntity: Model for BaseEntity."""
+    """BaseEntity: Model for BaseEntity.
 
-    pass
+    __deferred_columns__ names heavy columns find_by, one_or_none and
+    get_by_id leave unloaded. They load on first access, for every model of
+    the result at once, or with DatabaseClient.load_deferred. model_dump
+    leaves unloaded columns out.
+    """
+
+    __deferred_columns__: ClassVar[tuple[str, ...]] = ()
+
+    def model_dump(self, *, exclude: Any = None, **kwargs) -> dict[str, Any]:
+        return super().model_dump(exclude=without_unloaded(self, exclude), **kwargs)
+
+    def model_dump_json(self, *, exclude: Any = None, **kwargs) -> str:
+        exclude = without_unloaded(self, exclude)
+        return super().model_dump_json(exclude=exclude, **kwargs)
 
 
 class BaseIDModel(BaseEntity):
@@ -78,6 +120,8 @@ class BaseIDModel(BaseEntity):
 
 
 def database_config(db_name: str = "default") -> DatabaseConfig:
+    from qpyconf import settings
+
     return DatabaseConfig(**settings.databases[db_name])
 
 
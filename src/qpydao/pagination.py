@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import base64
+import datetime
+import decimal
+import json
+import uuid
+from collections.abc import Collection, Sequence
+from typing import Any
+
+from pydantic import BaseModel
+from sqlalchemy import and_, false, or_, tuple_
+
+from .exceptions import DAOException
+from .sql_utils import SqlBuilder
+
+"""
+1. keyset (seek) pagination, page n costs the same as page 1
+2. opaque cursor tokens carry the order by values of the last row
+3. NULLs sort last in both directions, nullable columns get NULL aware predicates
+"""
+
+
+class Page(BaseModel):
+    """Page: one page of a keyset paginated query."""
+
+    items: list[Any]
+    next_cursor: str | None = None
+    has_more: bool = False
+    total: int | None = None
+
+
+def parse_order_by(order_by: str | Sequence[str]) -> list[tuple[str, bool]]:
+    """Parse ("name", "-id") into [(name, descending)]."""
+    if isinstance(order_by, str):
+        order_by = [order_by]
+    if not order_by:
+        raise DAOException("keyset pagination needs at least one order by column")
+    return [(o[1:], True) if o.startswith("-") else (o, False) for o in order_by]
+
+
+_DECODERS = {
+    "datetime": datetime.datetime.fromisoformat,
+    "date": datetime.date.fromisoformat,
+    "time": datetime.time.fromisoformat,
+    "decimal": decimal.Decimal,
+    "uuid": uuid.UUID,
+}
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime.datetime):
+        return {"datetime": value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {"date": value.isoformat()}
+    if isinstance(value, datetime.time):
+        return {"time": value.isoformat()}
+    if isinstance(value, decimal.Decimal):
+        return {"decimal": str(value)}
+    if isinstance(value, uuid.UUID):
+        return {"uuid": str(value)}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict) and len(value) == 1:
+        kind, raw = next(iter(value.items()))
+        return _DECODERS[kind](raw)
+    return value
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    payload = json.dumps([_encode_value(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(token: str) -> list[Any]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode()))
+        return [_decode_value(v) for v in payload]
+    except (ValueError, KeyError, TypeError) as e:
+        raise DAOException(f"invalid pagination cursor: {token}") from e
+
+
+def with_primary_key(entity, order: list[tuple[str, bool]]) -> list[tuple[str, bool]]:
+    """Append the primary key so the order is unique and no row is skipped."""
+    names = {name for name, _ in order}
+    descending = order[-1][1]
+    return order + [
+        (c.name, descending)
+        for c in entity.__table__.primary_key.columns
+        if c.name not in names
+    ]
+
+
+def keyset_predicate(
+    columns: Sequence[Any],
+    values: Sequence[Any],
+    descending,
+    nullable: Sequence[bool] | None = None,
+):
+    """Rows strictly after values in (columns, descending) order with NULLs last.
+
+    One row value comparison when all columns sort the same way and none is
+    nullable so btree indexes on the columns are used.
+    """
+    if len(columns) != len(values):
+        raise DAOException("pagination cursor does not match order by columns")
+    nullable = nullable or [False] * len(columns)
+    if len(set(descending)) == 1 and not any(nullable):
+        left, right = tuple_(*columns), tuple_(*values)
+        return left < right if descending[0] else left > right
+    clauses = []
+    for i, column in enumerate(columns):
+        # nothing sorts after NULL in this column
+        if values[i] is None:
+            continue
+        after = column < values[i] if descending[i] else column > values[i]
+        if nullable[i]:
+            after = or_(after, column.is_(None))
+        equal = [
+            c.is_(None) if v is None else c == v
+            for c, v in zip(columns[:i], values[:i], strict=True)
+        ]
+        clauses.append(and_(*equal, after))
+    return or_(*clauses) if clauses else false()
+
+
+def nullable_columns(entity, order: list[tuple[str, bool]]) -> list[bool]:
+    columns = entity.__table__.columns
+    return [columns[name].nullable for name, _ in order]
+
+
+def keyset_select(
+    entity, order: list[tuple[str, bool]], after: str | None, limit: int, **kwargs
+):
+    """Select statement for one keyset page of entity filtered by kwargs.
+
+    :return: statement and bind params
+    """
+    statement, params = SqlBuilder.prepare_select(entity, **kwargs)
+    columns = [getattr(entity, name) for name, _ in order]
+    nullable = nullable_columns(entity, order)
+    if after is not None:
+        statement = statement.where(
+            keyset_predicate(
+                columns, decode_cursor(after), [d for _, d in order], nullable
+            )
+        )
+    statement = statement.order_by(
+        *[
+            _ordered(c, d, n)
+            for c, (_, d), n in zip(columns, order, nullable, strict=True)
+        ]
+    ).limit(limit)
+    return statement, params
+
+
+def _ordered(column, descending: bool, nullable: bool):
+    ordered = column.desc() if descending else column.asc()
+    return ordered.nulls_last() if nullable else ordered
+
+
+def keyset_sql(
+    plain_sql: str,
+    order: list[tuple[str, bool]],
+    with_cursor: bool,
+    nullable: Collection[str] = (),
+    null_values: Collection[str] = (),
+) -> str:
+    """Wrap plain sql so it returns one keyset page.
+
+    Binds :_page_limit and :_after_0.. :_after_n.
+    :param nullable: order columns that may be NULL, sorted last
+    :param null_values: columns whose cursor value is NULL
+    """
+    names = [name for name, _ in order]
+    where = ""
+    if with_cursor:
+        binds = [f":_after_{i}" for i in range(len(order))]
+        if len({desc for _, desc in order}) == 1 and not set(names) & set(nullable):
+            op = "<" if order[0][1] else ">"
+            where = f" WHERE ({', '.join(names)}) {op} ({', '.join(binds)})"
+        else:
+            clauses = []
+            for i, (name, desc) in enumerate(order):
+                if name in null_values:
+                    continue
+                parts = [
+                    f"{n} IS NULL" if n in null_values else f"{n} = {b}"
+                    for n, b in zip(names[:i], binds[:i], strict=True)
+                ]
+                after = f"{name} {'<' if desc else '>'} {binds[i]}"
+                if name in nullable:
+                    after = f"({after} OR {name} IS NULL)"
+                parts.append(after)
+                clauses.append("(" + " AND ".join(parts) + ")")
+            where = " WHERE " + (" OR ".join(clauses) if clauses else "1 = 0")
+    order_sql = ", ".join(
+        f"{n} {'DESC' if d else 'ASC'}{' NULLS LAST' if n in nullable else ''}"
+        for n, d in order
+    )
+    return (
+        f"SELECT * FROM ({plain_sql}) AS _page{where} "  # noqa: S608
+        f"ORDER BY {order_sql} LIMIT :_page_limit"
+    )
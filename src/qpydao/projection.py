@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import weakref
+from collections.abc import Iterable, Sequence
+from typing import Any
+
+import sqlalchemy
+from sqlalchemy.orm import PassiveFlag, defer
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.base import LoaderCallableStatus
+from sqlmodel import SQLModel
+
+from .exceptions import DAOException
+
+"""
+1. columns=: select only these columns, rows instead of models
+2. exclude=: models without these columns, they load on first access
+   or all at once with load_deferred
+3. __deferred_columns__ of an entity is the default exclude of find_by and get_by_id
+"""
+
+
+def deferred_columns(entity: type[SQLModel]) -> tuple[str, ...]:
+    """Columns entity declares as deferred, none for plain SQLModel tables."""
+    return tuple(getattr(entity, "__deferred_columns__", ()))
+
+
+def _names(entity: type[SQLModel], names: str | Iterable[str]) -> tuple[str, ...]:
+    if isinstance(names, str):
+        names = (names,)
+    names = tuple(names)
+    columns = entity.__table__.columns
+    for name in names:
+        if name not in columns:
+            raise DAOException(f"{entity.__name__} has no column {name}")
+    return names
+
+
+def projection(
+    entity: type[SQLModel],
+    columns: str | Sequence[str] | None = None,
+    exclude: str | Iterable[str] | None = None,
+) -> tuple[tuple[str, ...] | None, tuple[str, ...]]:
+    """Checked columns and excluded columns, part of the statement cache key.
+
+    :param entity:
+    :param columns: columns to select, None selects the model
+    :param exclude: columns to defer, None defers __deferred_columns__
+    :return: columns in the given order, excluded columns sorted
+    """
+    if columns is not None:
+        if exclude:
+            raise DAOException("use columns or exclude, not both")
+        columns = _names(entity, columns)
+        if not columns:
+            raise DAOException("columns can't be empty")
+        return columns, ()
+    if exclude is None:
+        exclude = deferred_columns(entity)
+    exclude = _names(entity, exclude)
+    primary_keys = {c.name for c in entity.__table__.primary_key.columns}
+    if primary_keys & set(exclude):
+        raise DAOException(f"primary key of {entity.__name__} can't be excluded")
+    return None, tuple(sorted(set(exclude)))
+
+
+def project(
+    statement,
+    entity: type[SQLModel],
+    columns: tuple[str, ...] | None,
+    exclude: tuple[str, ...],
+):
+    """Select only columns, or defer the excluded columns of the model."""
+    if columns is not None:
+        return statement.with_only_columns(*[getattr(entity, c) for c in columns])
+    if exclude:
+        return statement.options(*[defer(getattr(entity, c)) for c in exclude])
+    return statement
+
+
+def statement_entity(statement) -> type[SQLModel]:
+    """The model a select statement loads."""
+    descriptions = statement.column_descriptions
+    entity = descriptions[0].get("entity") if descriptions else None
+    if len(descriptions) != 1 or entity is None:
+        raise DAOException("columns and exclude need a select of one model")
+    return entity
+
+
+def unloaded_columns(instance: SQLModel) -> set[str]:
+    """Columns of instance deferred when it was loaded and not loaded since."""
+    return sqlalchemy.inspect(instance).unloaded & set(
+        type(instance).__table__.columns.keys()
+    )
+
+
+def fill_deferred(
+    instances: Sequence[SQLModel], rows: Iterable[Any], names: Sequence[str]
+) -> None:
+    """Set the loaded values as if they came with the instance.
+
+    Rows are (primary key, *names), instances are keyed by primary key.
+    """
+    by_key: dict[Any, list[SQLModel]] = {}
+    key = next(iter(type(instances[0]).__table__.primary_key.columns)).name
+    for instance in instances:
+        by_key.setdefault(getattr(instance, key), []).append(instance)
+    for ident, *values in rows:
+        for instance in by_key.get(ident, ()):
+            for name, value in zip(names, values, strict=True):
+                set_committed_value(instance, name, value)
+
+
+class DeferredLoader:
+    """Loads the unloaded columns of the models of one result on first access.
+
+    Every model of the result still missing columns is loaded at once through the
+    client that loaded them, with one IN query per chunk.
+    """
+
+    def __init__(self, client, instances: Sequence[SQLModel]):
+        self.client = client
+        self.instances = [weakref.ref(instance) for instance in instances]
+
+    def __call__(self, state, passive):
+        if not passive & PassiveFlag.SQL_OK:
+            return LoaderCallableStatus.PASSIVE_NO_RESULT
+        instance = state.obj()
+        pending = [i for ref in self.instances if (i := ref()) is not None]
+        self.client.load_deferred([i for i in pending if unloaded_columns(i)])
+        if unloaded_columns(instance):
+            raise DAOException(
+                f"{type(instance).__name__} {state.identity} no longer exists"
+            )
+        return LoaderCallableStatus.ATTR_WAS_SET
+
+
+class AsyncDeferredLoader:
+    """Raises on access of unloaded columns of models loaded by async methods.
+
+    Loading them with the sync engine would block the event loop.
+    """
+
+    def __call__(self, state, passive):
+        if not passive & PassiveFlag.SQL_OK:
+            return LoaderCallableStatus.PASSIVE_NO_RESULT
+        raise DAOException(
+            f"deferred columns of {type(state.obj()).__name__} are not loaded,"
+            " await async_load_deferred first"
+        )
+
+
+def load_on_access(client, instances: Sequence[Any], is_async: bool = False) -> None:
+    """Let deferred columns of loaded models load on first access.
+
+    Models of one statement share their unloaded columns and load together. Models
+    of async methods raise instead, they load with async_load_deferred.
+    """
+    if not instances or not hasattr(instances[0], "__table__"):
+        return
+    if not isinstance(instances[0], SQLModel) or not unloaded_columns(instances[0]):
+        return
+    loader = AsyncDeferredLoader() if is_async else DeferredLoader(client, instances)
+    for instance in instances:
+        state = sqlalchemy.inspect(instance)
+        # detached copies start with the shared, immutable empty callables
+        state.callables = {
+            **state.callables,
+            **dict.fromkeys(unloaded_columns(instance), loader),
+        }
+
+
+def without_unloaded(instance: SQLModel, exclude: Any) -> Any:
+    """The model_dump exclude extended with the unloaded columns of instance."""
+    if getattr(instance, "_sa_instance_state", None) is None:
+        return exclude
+    names = unloaded_columns(instance)
+    if not names:
+        return exclude
+    if exclude is None:
+        return names
+    if isinstance(exclude, dict):
+        return {**exclude, **dict.fromkeys(names, True)}
+    return set(exclude) | names
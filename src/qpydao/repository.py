@@ -1,11 +1,20 @@
 from __future__ import annotations
 
+import asyncio
+from collections.abc import Awaitable
 from typing import Any
 
 from pydantic import BaseModel
 from sqlmodel import SQLModel
 
-from qpydao import databases
+from .database_client import get_databases
+
+
+class _DbClient:
+    """Resolve the repository client on access, not at class definition."""
+
+    def __get__(self, instance, owner):
+        return get_databases().get_db(owner.db_qualifier)
 
 
 class RepositoryMeta(type):
@@ -21,5 +30,31 @@ class RepositoryMeta(type):
         x = super().__new__(cls, name, bases, attrs, **kwargs)
         x.base_type = base_type
         x.db_qualifier = db_qualifier
-        x.db_client = databases.get_db(x.db_qualifier)
+        x.db_client = _DbClient()
         return x
+
+
+async def gather(
+    *calls: Awaitable[Any],
+    concurrency: int | None = None,
+    return_exceptions: bool = False,
+) -> list[Any]:
+    """Await async repository calls concurrently, results in call order.
+
+    Calls of one database share its async connection pool.
+    :param calls: coroutines of async native_sql methods
+    :param concurrency: calls running at the same time, default all of them
+    :param return_exceptions: return errors in place of results instead of raising
+    :return:
+    """
+    if concurrency is None:
+        return await asyncio.gather(*calls, return_exceptions=return_exceptions)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited(call: Awaitable[Any]) -> Any:
+        async with semaphore:
+            return await call
+
+    return await asyncio.gather(
+        *(limited(call) for call in calls), return_exceptions=return_exceptions
+    )
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import itertools
+import threading
+import time
+from collections.abc import Callable
+from typing import Any
+
+from pydantic import BaseModel
+from sqlalchemy import make_url
+
+from .dao_logger import dao_logger
+from .exceptions import DAOException
+
+"""
+1. route reads to read replicas, writes and transactions stay on the primary
+2. round_robin or least_latency (moving average of read latency)
+3. failing replicas are ejected for retry_interval seconds, then tried again
+"""
+
+REPLICA_STRATEGIES = ("round_robin", "least_latency")
+
+
+class ReplicaStatus(BaseModel):
+    """ReplicaStatus: health and latency of one read replica."""
+
+    url: str
+    healthy: bool = True
+    latency: float = 0.0
+    reads: int = 0
+    failures: int = 0
+
+
+class Replica:
+    """One read replica, the engine is created on first use."""
+
+    def __init__(self, url: str, factory: Callable[[str], Any]):
+        self.url = url
+        self.name = make_url(url).render_as_string(hide_password=True)
+        self._factory = factory
+        self._engine = None
+        self.latency = 0.0
+        self.reads = 0
+        self.failures = 0
+        self.ejected_until = 0.0
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            self._engine = self._factory(self.url)
+        return self._engine
+
+
+class ReplicaRouter:
+    """Choose a healthy replica for every read."""
+
+    def __init__(
+        self,
+        urls: list[str],
+        factory: Callable[[str], Any],
+        strategy: str = "round_robin",
+        retry_interval: float = 30,
+        smoothing: float = 0.2,
+    ):
+        if strategy not in REPLICA_STRATEGIES:
+            raise DAOException(
+                f"unknown replica strategy {strategy}, "
+                f"expected one of {REPLICA_STRATEGIES}"
+            )
+        self.replicas = [Replica(url, factory) for url in urls]
+        self.strategy = strategy
+        self.retry_interval = retry_interval
+        self.smoothing = smoothing
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def healthy(self) -> list[Replica]:
+        now = time.monotonic()
+        return [r for r in self.replicas if r.ejected_until <= now]
+
+    def choose(self) -> Replica | None:
+        """A healthy replica, None when every replica is ejected."""
+        replicas = self.healthy()
+        if not replicas:
+            return None
+        if self.strategy == "least_latency":
+            # replicas without reads yet have latency 0 and are measured first
+            return min(replicas, key=lambda r: r.latency)
+        return replicas[next(self._counter) % len(replicas)]
+
+    def record(self, replica: Replica, elapsed: float) -> None:
+        with self._lock:
+            replica.reads += 1
+            if replica.reads == 1:
+                replica.latency = elapsed
+            else:
+                replica.latency += self.smoothing * (elapsed - replica.latency)
+
+    def eject(self, replica: Replica, error: Exception | None = None) -> None:
+        with self._lock:
+            replica.failures += 1
+            replica.ejected_until = time.monotonic() + self.retry_interval
+        dao_logger.warning(
+            f"replica {replica.name} ejected for {self.retry_interval}s: {error}"
+        )
+
+    def status(self) -> list[ReplicaStatus]:
+        now = time.monotonic()
+        return [
+            ReplicaStatus(
+                url=r.name,
+                healthy=r.ejected_until <= now,
+                latency=r.latency,
+                reads=r.reads,
+                failures=r.failures,
+            )
+            for r in self.replicas
+        ]
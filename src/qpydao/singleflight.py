@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any
+
+from pydantic import BaseModel
+
+"""
+1. single-flight: identical reads running at the same time execute once
+2. every waiter gets the result, or the error, of the one execution
+3. threads share SingleFlight, coroutines of one event loop AsyncSingleFlight
+"""
+
+
+class FlightStats(BaseModel):
+    """FlightStats: calls, executions and calls served by another execution."""
+
+    calls: int = 0
+    executions: int = 0
+    coalesced: int = 0
+    in_flight: int = 0
+
+    def __add__(self, other: FlightStats) -> FlightStats:
+        return FlightStats(
+            calls=self.calls + other.calls,
+            executions=self.executions + other.executions,
+            coalesced=self.coalesced + other.coalesced,
+            in_flight=self.in_flight + other.in_flight,
+        )
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    """Collapse identical concurrent calls from threads into one."""
+
+    def __init__(self):
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+        self._in_flight: dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            self.calls += 1
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = self._in_flight[key] = _Call()
+                self.executions += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            call.done.set()
+        return call.result
+
+    def stats(self) -> FlightStats:
+        return FlightStats(
+            calls=self.calls,
+            executions=self.executions,
+            coalesced=self.coalesced,
+            in_flight=len(self._in_flight),
+        )
+
+
+class AsyncSingleFlight:
+    """Collapse identical concurrent coroutine calls into one task.
+
+    The task keeps running when the caller that started it is cancelled.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+        self._in_flight: dict[tuple[Any, Hashable], asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        # tasks belong to one event loop
+        flight_key = (asyncio.get_running_loop(), key)
+        self.calls += 1
+        task = self._in_flight.get(flight_key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._in_flight[flight_key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(flight_key, None))
+            self.executions += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> FlightStats:
+        return FlightStats(
+            calls=self.calls,
+            executions=self.executions,
+            coalesced=self.coalesced,
+            in_flight=len(self._in_flight),
+        )
@@ -1,58 +1,543 @@
 from __future__ import annotations
 
+import copy
+import re
+from collections import namedtuple
+from collections.abc import Iterable, Iterator, Sequence
+from functools import lru_cache
+from itertools import islice
 from typing import Any
 
+import sqlalchemy
 from pydantic import BaseModel
-from sqlalchemy import MetaData
+from sqlalchemy import bindparam
 from sqlalchemy.exc import ResourceClosedError
-from sqlmodel import SQLModel, delete, select, text, update
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlmodel import SQLModel, delete, insert, select, text, update
+
+from .caching import CacheStats, LRUCache
+from .criteria import (
+    OPERATORS,
+    criteria_key,
+    criteria_params,
+    criteria_where,
+    parse_criteria,
+)
+from .dao_logger import dao_logger
+from .exceptions import DAOException
+from .projection import deferred_columns, project, projection
+
+
+def chunked(items: Iterable[Any], size: int) -> Iterator[list[Any]]:
+    """Split items into lists of at most size elements."""
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _filter_key(kwargs: dict) -> tuple:
+    # None filters compile to IS NULL, so they are part of the statement shape
+    return tuple(sorted((k, v is None) for k, v in kwargs.items()))
+
+
+def _filter_binds(filter_key: tuple) -> dict:
+    return {k: None if is_null else bindparam(f"f_{k}") for k, is_null in filter_key}
+
+
+def _filter_params(kwargs: dict) -> dict:
+    return {f"f_{k}": v for k, v in kwargs.items() if v is not None}
+
+
+_TABLE_PATTERN = re.compile(
+    r"\b(?:from|join|update|into)\s+((?:[\w\"]+\.)?[\w\"]+(?:\s*,\s*(?:[\w\"]+\.)?[\w\"]+)*)",
+    re.IGNORECASE,
+)
+
+
+def referenced_tables(plain_sql: str) -> set[str] | None:
+    """Best effort table names used by a sql statement.
+
+    None when no table can be found, so callers fall back to everything.
+    """
+    tables = set()
+    for match in _TABLE_PATTERN.finditer(plain_sql):
+        for name in match.group(1).split(","):
+            tables.add(name.strip().split(".")[-1].strip('"').lower())
+    return tables or None
+
+
+def table_name(entity: type[SQLModel] | Any) -> str:
+    return entity.__table__.name.lower()
+
+
+def primary_key(entity: type[SQLModel] | Any) -> sqlalchemy.Column:
+    """The single primary key column of entity."""
+    primary_keys = entity.__table__.primary_key.columns
+    if len(primary_keys) != 1:
+        raise DAOException(f"a single column primary key is required: {entity}")
+    return next(iter(primary_keys))
 
 
 class SqlBuilder:
+    """Build sql constructs.
+
+    Parameterized constructs are cached in statement_cache and reused, so
+    SQLAlchemy's compiled cache hits too.
+    """
+
+    statement_cache = LRUCache(maxsize=512)
+
+    @staticmethod
+    def cache_stats() -> CacheStats:
+        return SqlBuilder.statement_cache.stats()
+
     @staticmethod
     def from_plain_sql(plain_sql, **kwargs):
-        s = text(plain_sql, **kwargs)
-        return s
+        if kwargs:
+            return text(plain_sql, **kwargs)
+        return SqlBuilder.statement_cache.get_or_set(
+            ("text", plain_sql), lambda: text(plain_sql)
+        )
+
+    @staticmethod
+    def prepare_select(
+        entity: type[SQLModel],
+        columns: Sequence[str] | None = None,
+        exclude: Iterable[str] | None = None,
+        **kwargs,
+    ) -> tuple[Any, dict]:
+        """Cached select with bind parameters and the parameters to execute it.
+
+        The kwargs are criteria: field=value or field__operator=value.
+        :param columns: select only these columns
+        :param exclude: defer these columns, None defers __deferred_columns__
+        """
+        columns, exclude = projection(entity, columns, exclude)
+        criteria = parse_criteria(entity, kwargs)
+        key = criteria_key(criteria)
+        statement = SqlBuilder.statement_cache.get_or_set(
+            ("select", entity, key, columns, exclude),
+            lambda: project(
+                select(entity).where(*criteria_where(entity, key)),
+                entity,
+                columns,
+                exclude,
+            ),
+        )
+        return statement, criteria_params(criteria)
+
+    @staticmethod
+    def prepare_select_one(
+        entity: type[SQLModel],
+        columns: Sequence[str] | None = None,
+        exclude: Iterable[str] | None = None,
+        **kwargs,
+    ) -> tuple[Any, dict]:
+        """prepare_select with LIMIT 1."""
+        columns, exclude = projection(entity, columns, exclude)
+        criteria = parse_criteria(entity, kwargs)
+        key = criteria_key(criteria)
+        statement = SqlBuilder.statement_cache.get_or_set(
+            ("select_one", entity, key, columns, exclude),
+            lambda: project(
+                select(entity).where(*criteria_where(entity, key)).limit(1),
+                entity,
+                columns,
+                exclude,
+            ),
+        )
+        return statement, criteria_params(criteria)
+
+    @staticmethod
+    def build_select_by_ids(entity: type[SQLModel]):
+        """SELECT by primary key with an expanding IN bound to ids.
+
+        __deferred_columns__ of entity are deferred.
+        """
+        return SqlBuilder.statement_cache.get_or_set(
+            ("select_by_ids", entity),
+            lambda: project(
+                select(entity).where(
+                    primary_key(entity).in_(bindparam("ids", expanding=True))
+                ),
+                entity,
+                None,
+                deferred_columns(entity),
+            ),
+        )
+
+    @staticmethod
+    def build_select_columns_by_ids(entity: type[SQLModel], names: tuple[str, ...]):
+        """Primary key and names of the rows with a primary key in ids."""
+        key = primary_key(entity)
+        return SqlBuilder.statement_cache.get_or_set(
+            ("select_columns_by_ids", entity, names),
+            lambda: sqlalchemy.select(
+                key, *[entity.__table__.columns[n] for n in names]
+            ).where(key.in_(bindparam("ids", expanding=True))),
+        )
+
+    @staticmethod
+    def prepare_delete(entity: type[SQLModel], **kwargs) -> tuple[Any, dict]:
+        criteria = parse_criteria(entity, kwargs)
+        key = criteria_key(criteria)
+        statement = SqlBuilder.statement_cache.get_or_set(
+            ("delete", entity, key),
+            lambda: delete(entity).where(*criteria_where(entity, key)),
+        )
+        return statement, criteria_params(criteria)
+
+    @staticmethod
+    def prepare_update(instance: SQLModel, **kwargs) -> tuple[Any, dict]:
+        values = instance.model_dump()
+        key = _filter_key(kwargs)
+        columns = tuple(sorted(values))
+        statement = SqlBuilder.statement_cache.get_or_set(
+            ("update", type(instance), columns, key),
+            lambda: (
+                update(type(instance))
+                .filter_by(id=bindparam("w_id"))
+                .filter_by(**_filter_binds(key))
+                .values({c: bindparam(f"v_{c}") for c in columns})
+            ),
+        )
+        params = {f"v_{k}": v for k, v in values.items()}
+        params["w_id"] = instance.id
+        params.update(_filter_params(kwargs))
+        return statement, params
 
     @staticmethod
     def build_select_query(entity: type[SQLModel], **kwargs):
-        return select(entity).filter_by(**kwargs)
+        statement, params = SqlBuilder.prepare_select(entity, **kwargs)
+        return statement.params(params)
 
     @staticmethod
     def build_delete_statement(entity: type[SQLModel], **kwargs):
-        return delete(entity).filter_by(**kwargs)
+        statement, params = SqlBuilder.prepare_delete(entity, **kwargs)
+        return statement.params(params)
 
     @staticmethod
     def build_filter_query(entity: type[SQLModel], instance: SQLModel, *args):
+        """Select filtered by attributes of instance.
+
+        The args are field names or criteria like age__gte that take the value of
+        their field.
+        """
         filters = {}
-        ## TODO: if time, solve it, 或者Between 这种
         for item in args:
-            filters[item] = getattr(instance, item)
-        return select(entity).filter_by(**filters)
+            field, _, op = item.rpartition("__")
+            if not field or op not in OPERATORS:
+                field = item
+            filters[item] = getattr(instance, field)
+        statement, params = SqlBuilder.prepare_select(entity, **filters)
+        return statement.params(params)
 
     @staticmethod
     def build_update_statement(instance: type[SQLModel], **kwargs):
-        return (
-            update(type(instance))
-            .filter_by(id=instance.id)
-            .filter_by(**kwargs)
-            .values(**instance.model_dump())
+        statement, params = SqlBuilder.prepare_update(instance, **kwargs)
+        return statement.params(params)
+
+    @staticmethod
+    def build_insert_statement(entity: type[SQLModel], returning: bool = False):
+        def build():
+            statement = insert(entity)
+            if returning:
+                statement = statement.returning(*entity.__table__.primary_key.columns)
+            return statement
+
+        return SqlBuilder.statement_cache.get_or_set(
+            ("insert", entity, returning), build
         )
 
+    @staticmethod
+    def build_upsert_statement(
+        entity: type[SQLModel],
+        dialect_name: str,
+        conflict_keys: list[str],
+        update_columns: list[str] | None = None,
+    ):
+        """Insert statement with ON CONFLICT / ON DUPLICATE KEY handling.
+
+        :param entity:
+        :param dialect_name: postgresql, sqlite or mysql
+        :param conflict_keys: columns of the unique constraint to resolve on
+        :param update_columns: columns to overwrite on conflict, none means do nothing
+        :return:
+        """
+        return SqlBuilder.statement_cache.get_or_set(
+            (
+                "upsert",
+                entity,
+                dialect_name,
+                tuple(conflict_keys),
+                tuple(update_columns or ()),
+            ),
+            lambda: SqlBuilder._build_upsert_statement(
+                entity, dialect_name, conflict_keys, update_columns
+            ),
+        )
+
+    @staticmethod
+    def _build_upsert_statement(
+        entity: type[SQLModel],
+        dialect_name: str,
+        conflict_keys: list[str],
+        update_columns: list[str] | None = None,
+    ):
+        if dialect_name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        elif dialect_name == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        elif dialect_name in ("mysql", "mariadb"):
+            from sqlalchemy.dialects.mysql import insert as dialect_insert
+
+            statement = dialect_insert(entity.__table__)
+            return statement.on_duplicate_key_update(
+                {c: statement.inserted[c] for c in update_columns or conflict_keys}
+            )
+        else:
+            raise DAOException(f"upsert is not supported for {dialect_name}")
+        statement = dialect_insert(entity.__table__)
+        if not update_columns:
+            return statement.on_conflict_do_nothing(index_elements=conflict_keys)
+        return statement.on_conflict_do_update(
+            index_elements=conflict_keys,
+            set_={c: statement.excluded[c] for c in update_columns},
+        )
+
+    @staticmethod
+    def to_rows(
+        entity: type[SQLModel], instances: Iterable[SQLModel | BaseModel | dict]
+    ) -> list[dict]:
+        """Convert models or dicts into column dicts for executemany.
+
+        Empty primary keys are dropped so the database generates them.
+        """
+        columns = entity.__table__.columns
+        primary_keys = {c.name for c in entity.__table__.primary_key.columns}
+        rows = []
+        for instance in instances:
+            values = instance if isinstance(instance, dict) else instance.model_dump()
+            rows.append(
+                {
+                    k: v
+                    for k, v in values.items()
+                    if k in columns and not (k in primary_keys and v is None)
+                }
+            )
+        return rows
+
+    @staticmethod
+    def build_batch_update_statement(entity: type[SQLModel], columns: tuple[str, ...]):
+        """UPDATE by primary key for executemany.
+
+        Binds w_<primary key> and v_<column>.
+        """
+
+        def build():
+            table = entity.__table__
+            statement = update(table)
+            for c in table.primary_key.columns:
+                statement = statement.where(c == bindparam(f"w_{c.name}"))
+            return statement.values({c: bindparam(f"v_{c}") for c in columns})
+
+        return SqlBuilder.statement_cache.get_or_set(
+            ("batch_update", entity, columns), build
+        )
+
+    @staticmethod
+    def build_batch_delete_statement(entity: type[SQLModel]):
+        """DELETE by primary key with an expanding IN bound to ids."""
+        return SqlBuilder.statement_cache.get_or_set(
+            ("batch_delete", entity),
+            lambda: delete(entity.__table__).where(
+                primary_key(entity).in_(bindparam("ids", expanding=True))
+            ),
+        )
+
+    @staticmethod
+    def group_updates(
+        instances: Iterable[SQLModel], fields: Iterable[str] | None = None
+    ) -> dict[tuple[type[SQLModel], tuple[str, ...]], list[SQLModel]]:
+        """Group instances by entity and the columns to update.
+
+        The columns are the changed ones from the orm attribute history unless
+        fields are given.
+        Instances without changes are left out.
+        """
+        fields = tuple(sorted(fields)) if fields else None
+        groups = {}
+        for instance in instances:
+            entity = type(instance)
+            columns = fields or _dirty_columns(instance)
+            if columns:
+                groups.setdefault((entity, columns), []).append(instance)
+        return groups
+
+    @staticmethod
+    def to_update_params(
+        instance: SQLModel, columns: tuple[str, ...]
+    ) -> dict[str, Any]:
+        params = {f"v_{c}": getattr(instance, c) for c in columns}
+        for c in instance.__table__.primary_key.columns:
+            value = getattr(instance, c.name)
+            if value is None:
+                raise DAOException(f"can't update {instance} without {c.name}")
+            params[f"w_{c.name}"] = value
+        return params
+
+
+def _dirty_columns(instance: SQLModel) -> tuple[str, ...]:
+    table = instance.__table__
+    state = sqlalchemy.inspect(instance)
+    return tuple(
+        sorted(
+            c.name
+            for c in table.columns
+            if not c.primary_key and state.attrs[c.name].history.has_changes()
+        )
+    )
+
+
+def mark_committed(instance: SQLModel, columns: Iterable[str]) -> None:
+    """Reset the attribute history of columns written outside the session."""
+    for c in columns:
+        set_committed_value(instance, c, getattr(instance, c))
+
+
+def detached_copy(instance: SQLModel) -> SQLModel:
+    """Copy of a loaded model with its own ORM state, unloaded columns stay unloaded.
+
+    Changing the copy or adding it to a session leaves instance untouched.
+    """
+    copied = sqlalchemy.inspect(type(instance)).class_manager.new_instance()
+    copied.__dict__.update(
+        (k, v) for k, v in instance.__dict__.items() if k != "_sa_instance_state"
+    )
+    object.__setattr__(
+        copied, "__pydantic_fields_set__", set(instance.__pydantic_fields_set__)
+    )
+    # the identity key makes the copy detached, a session updates its row
+    sqlalchemy.inspect(copied).key = sqlalchemy.inspect(instance).key
+    return copied
+
+
+def copy_result(result: Iterable[Any]) -> list[Any]:
+    """Copies of mapped models, cached results are never handed out themselves."""
+    copies = []
+    for model in result:
+        if getattr(model, "_sa_instance_state", None) is not None:
+            copies.append(detached_copy(model))
+        elif isinstance(model, BaseModel):
+            copies.append(model.model_copy())
+        else:
+            copies.append(copy.copy(model))
+    return copies
+
+
+class _MappingPlan:
+    """Precompiled row to model plan for trusted rows.
+
+    Table models get a bare mapped instance from the ORM class manager with
+    the row copied into its ``__dict__``, the same way the ORM loads rows,
+    instead of the instrumented ``__init__``. For plain pydantic models the
+    compiled validator is already faster than ``model_construct``, so they
+    keep using the constructor.
+    """
+
+    def __init__(self, model_type: type[BaseModel]):
+        self.model_type = model_type
+        self.fields = model_type.model_fields
+        self.new_instance = None
+        if getattr(model_type, "__table__", None) is not None:
+            sqlalchemy.orm.configure_mappers()
+            manager = sqlalchemy.inspect(model_type).class_manager
+            self.new_instance = manager.new_instance
+
+    def build(self, row) -> Any:
+        if self.new_instance is None:
+            return self.model_type(**row)
+        values = {k: v for k, v in row.items() if k in self.fields}
+        fields_set = set(values)
+        if len(values) < len(self.fields):
+            # like model_construct, required fields missing from the row stay unset
+            for name, field in self.fields.items():
+                if name not in values and not field.is_required():
+                    values[name] = field.get_default(call_default_factory=True)
+        instance = self.new_instance()
+        instance.__dict__.update(values)
+        object.__setattr__(instance, "__pydantic_fields_set__", fields_set)
+        return instance
+
+
+@lru_cache(maxsize=256)
+def _mapping_plan(model_type: type[BaseModel]) -> _MappingPlan:
+    return _MappingPlan(model_type)
+
+
+@lru_cache(maxsize=256)
+def _record_type(name: str, fields: tuple[str, ...]):
+    return namedtuple(name, fields, rename=True)
+
 
 class SqlResultMapper:
     @staticmethod
     def sql_result_to_model(
-        result: list[dict], model_type: type[SQLModel, BaseModel]
+        result: list[dict],
+        model_type: type[SQLModel, BaseModel],
+        validate: bool = True,
     ) -> list[Any]:
+        """Map rows to model_type.
+
+        :param result: rows as mappings
+        :param model_type:
+        :param validate: False maps table models without validation, trusted rows only
+        :return:
+        """
+        all_list = []
+        try:
+            if validate or not (
+                isinstance(model_type, type) and issubclass(model_type, BaseModel)
+            ):
+                for row in result:
+                    all_list.append(model_type(**row))
+            else:
+                build = _mapping_plan(model_type).build
+                for row in result:
+                    all_list.append(build(row))
+        except ResourceClosedError as e:
+            dao_logger.warning(f"result has no rows to map: {e}")
+        return all_list
+
+    @staticmethod
+    def sql_result_to_records(
+        result: list[dict], model_type: type[SQLModel, BaseModel] | None = None
+    ) -> list[tuple]:
+        """Map rows to lightweight named tuples with the row's columns."""
         all_list = []
         try:
+            record_type = None
             for row in result:
-                all_list.append(model_type(**row))
+                if record_type is None:
+                    name = f"{model_type.__name__}Record" if model_type else "Record"
+                    record_type = _record_type(name, tuple(row.keys()))
+                all_list.append(record_type._make(row.values()))
         except ResourceClosedError as e:
-            print(e)
+            dao_logger.warning(f"result has no rows to map: {e}")
         return all_list
 
+    @staticmethod
+    def stream_to_model(
+        partitions: Iterable[list[dict]],
+        model_type: type[SQLModel, BaseModel],
+        validate: bool = True,
+    ) -> Iterator[Any]:
+        """Map each partition only when the consumer reaches it."""
+        for partition in partitions:
+            yield from SqlResultMapper.sql_result_to_model(
+                partition, model_type, validate
+            )
+
     @staticmethod
     def sqlmodel_query_result_to_model(result) -> list[Any]:
         return [item[0] for item in result]
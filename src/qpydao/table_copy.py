@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import math
+import queue
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+
+from pydantic import BaseModel
+from sqlmodel import SQLModel, select
+
+from .dao_logger import dao_logger
+from .exceptions import DAOException
+from .sql_utils import chunked
+
+"""
+1. copy a table between databases without loading it into memory
+2. readers stream key ranges with server side cursors into a bounded queue
+3. writers take batches from the queue and write them with executemany or COPY
+"""
+
+COPY_METHODS = ("auto", "insert", "copy")
+
+# ranges per reader, small ranges keep readers busy when keys are skewed
+_RANGES_PER_WORKER = 4
+
+# seconds between checks of the stop flag while the queue is full
+_PUT_INTERVAL = 0.1
+
+
+class CopyStats(BaseModel):
+    """CopyStats: progress of a table copy, errors of failed ranges or batches."""
+
+    table: str
+    rows: int = 0
+    batches: int = 0
+    ranges: int = 0
+    ranges_done: int = 0
+    elapsed: float = 0.0
+    errors: list[str] = []
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+
+def key_ranges(
+    client, entity: type[SQLModel], key_column: str | None, parts: int
+) -> list[tuple[int | None, int | None]]:
+    """Split an integer key into at most parts inclusive ranges.
+
+    There is one unbounded range when there is no integer key. A nullable key is
+    rejected, rows with a NULL key are in no range.
+    """
+    if key_column is None or parts <= 1:
+        return [(None, None)]
+    column = entity.__table__.columns[key_column]
+    try:
+        if column.type.python_type is not int:
+            return [(None, None)]
+    except NotImplementedError:
+        return [(None, None)]
+    if column.nullable:
+        raise DAOException(
+            f"key column {key_column} is nullable, use a NOT NULL column"
+            " or key_column=None"
+        )
+    preparer = client.engine.dialect.identifier_preparer
+    key = preparer.quote(key_column)
+    row = client.plain_query(
+        f"SELECT min({key}) AS lo, max({key}) AS hi"  # noqa: S608
+        f" FROM {preparer.format_table(entity.__table__)}"
+    )[0]
+    if row["lo"] is None:
+        return []
+    lo, hi = row["lo"], row["hi"]
+    step = max(1, math.ceil((hi - lo + 1) / parts))
+    return [(start, min(start + step - 1, hi)) for start in range(lo, hi + 1, step)]
+
+
+def range_select(
+    entity: type[SQLModel], key_column: str | None, lo: int | None, hi: int | None
+):
+    """Core select of the rows in a key range.
+
+    Column types are kept so values are written back unchanged.
+    """
+    table = entity.__table__
+    statement = select(table)
+    if lo is not None:
+        key = table.columns[key_column]
+        statement = statement.where(key >= lo, key <= hi)
+    return statement
+
+
+def _error(e: Exception) -> str:
+    # the driver error, without the statement and every parameter of the batch
+    return f"{type(e).__name__}: {getattr(e, 'orig', None) or e}"
+
+
+def _writer(dst, method: str) -> Callable[[type[SQLModel], list[dict]], int]:
+    if method not in COPY_METHODS:
+        raise DAOException(f"unknown copy method {method}, use one of {COPY_METHODS}")
+    if method == "auto":
+        method = "copy" if dst.engine.dialect.driver == "psycopg" else "insert"
+    if method == "copy":
+        return dst.copy_insert
+    return dst.batch_insert
+
+
+def copy_table(
+    src,
+    dst,
+    entity: type[SQLModel],
+    dst_entity: type[SQLModel] | None = None,
+    key_column: str | None = "id",
+    workers: int = 4,
+    batch_size: int = 5000,
+    queue_size: int = 8,
+    method: str = "auto",
+    progress: Callable[[CopyStats], None] | None = None,
+) -> CopyStats:
+    """Stream rows of entity from src into dst with parallel readers and writers.
+
+    :param src: source DatabaseClient
+    :param dst: destination DatabaseClient
+    :param entity: table to read
+    :param dst_entity: table to write, default entity
+    :param key_column: integer column to split into ranges, None reads one range
+    :param workers: readers, and writers, running at the same time
+    :param batch_size: rows fetched per round trip and written per batch
+    :param queue_size: batches waiting between readers and writers
+    :param method: auto (COPY on psycopg), insert or copy
+    :param progress: called with the stats after every written batch
+    :return:
+    """
+    dst_entity = dst_entity or entity
+    write = _writer(dst, method)
+    ranges = key_ranges(src, entity, key_column, workers * _RANGES_PER_WORKER)
+    stats = CopyStats(table=entity.__table__.name, ranges=len(ranges))
+    batches: queue.Queue[list[dict] | None] = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    lock = threading.Lock()
+    start = time.perf_counter()
+
+    def fail(message: str) -> None:
+        with lock:
+            stats.errors.append(message)
+        dao_logger.warning(f"copy {stats.table} failed: {message}")
+        stop.set()
+
+    def put(batch: list[dict]) -> bool:
+        # a full queue with failed writers must not block readers forever
+        while not stop.is_set():
+            try:
+                batches.put(batch, timeout=_PUT_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def read(lo: int | None, hi: int | None) -> None:
+        statement = range_select(entity, key_column, lo, hi)
+        try:
+            rows = src.stream_query(statement, batch_size=batch_size)
+            for batch in chunked((dict(row) for row in rows), batch_size):
+                if not put(batch):
+                    return
+        except Exception as e:
+            fail(f"range {lo}..{hi}: {_error(e)}")
+            return
+        with lock:
+            stats.ranges_done += 1
+
+    def consume() -> None:
+        while (batch := batches.get()) is not None:
+            if stop.is_set():
+                continue
+            try:
+                write(dst_entity, batch)
+                with lock:
+                    stats.rows += len(batch)
+                    stats.batches += 1
+                    stats.elapsed = time.perf_counter() - start
+                    if progress is not None:
+                        progress(stats)
+            except Exception as e:
+                fail(f"batch of {len(batch)} rows: {_error(e)}")
+
+    writers = ThreadPoolExecutor(workers, thread_name_prefix="qpydao-copy-write")
+    readers = ThreadPoolExecutor(workers, thread_name_prefix="qpydao-copy-read")
+    with writers:
+        for _ in range(workers):
+            writers.submit(consume)
+        with readers:
+            for lo, hi in ranges:
+                readers.submit(read, lo, hi)
+        for _ in range(workers):
+            batches.put(None)
+    stats.elapsed = time.perf_counter() - start
+    dao_logger.info(
+        f"copied {stats.rows} rows of {stats.table} in {stats.elapsed:.2f}s,"
+        f" {stats.rows_per_sec:.0f} rows/sec"
+    )
+    return stats
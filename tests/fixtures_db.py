@@ -3,7 +3,7 @@ from __future__ import annotations
 from datetime import datetime
 
 from qpydao import BaseIDModel, databases
-from qpydao.bootstrap import init_database
+from qpydao import init_database
 
 # db_config = DatabaseConfig(db_url="sqlite:///test.db")
 dao = databases.get_db("default")
@@ -19,6 +19,12 @@ class Hero(BaseIDModel, table=True, extend_existing=True):
     created_date: datetime = datetime.now()
 
 
+class HeroStory(BaseIDModel, table=True, extend_existing=True):
+    __deferred_columns__ = ("story",)
+    name: str
+    story: str | None = None
+
+
 def init_db_test():
     try:
         init_database(dao)
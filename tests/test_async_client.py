@@ -0,0 +1,137 @@
+import pytest
+from sqlmodel import select
+
+from qpydao import DAOException, SqlResultMapper, databases
+
+from .fixtures_db import Hero, HeroStory, dao, init_db_test
+
+init_db_test()
+
+
+@pytest.mark.asyncio
+async def test_async_save_and_find():
+    h1 = Hero(name="async_test", secret_name="scret_name", age=20)
+    saved = await dao.async_save(h1)
+    assert saved.id is not None
+    result = await dao.async_find_by(Hero, name="async_test")
+    assert len(result) > 0
+    one = await dao.async_find_one(Hero, id=saved.id)
+    assert one.name == "async_test"
+
+
+@pytest.mark.asyncio
+async def test_async_batch_save():
+    instances = [
+        Hero(name="async_batch", secret_name="scret_name", age=i) for i in range(3)
+    ]
+    await dao.async_batch_save(instances)
+    result = await dao.async_find_by(Hero, name="async_batch")
+    assert len(result) >= 3
+
+
+@pytest.mark.asyncio
+async def test_async_batch_insert():
+    rows = [{"name": "async_bulk", "secret_name": "s", "age": i} for i in range(5)]
+    assert await dao.async_batch_insert(Hero, rows, chunk_size=2) == 5
+    ids = await dao.async_batch_insert(Hero, rows, chunk_size=2, returning=True)
+    assert len(ids) == 5
+    assert len(await dao.async_get_many_by_ids(Hero, [row[0] for row in ids])) == 5
+
+
+@pytest.mark.asyncio
+async def test_async_update_and_delete():
+    h1 = await dao.async_save(Hero(name="async_upd", secret_name="s", age=1))
+    h1.age = 99
+    await dao.async_update_by_id(h1)
+    updated = await dao.async_one_or_none(Hero, id=h1.id)
+    assert updated.age == 99
+    await dao.async_delete_by(Hero, id=h1.id)
+    assert await dao.async_one_or_none(Hero, id=h1.id) is None
+
+
+@pytest.mark.asyncio
+async def test_async_stream_query():
+    rows = [
+        row async for row in dao.async_stream_query("select * from hero", batch_size=2)
+    ]
+    result = SqlResultMapper.sql_result_to_model(rows, Hero)
+    print(len(result))
+
+
+@pytest.mark.asyncio
+async def test_async_stream_models():
+    heroes = [
+        hero async for hero in dao.async_stream_models("select * from hero", Hero)
+    ]
+    assert all(isinstance(hero, Hero) for hero in heroes)
+    heroes = [hero async for hero in dao.async_stream_models(select(Hero))]
+    assert all(isinstance(hero, Hero) for hero in heroes)
+
+
+@pytest.mark.asyncio
+async def test_async_execute():
+    await dao.async_execute(
+        "update hero set age= :age where name= :name", name="async_test", age=21
+    )
+    result = await dao.async_plain_query(
+        "select * from hero where name= :name", name="async_test"
+    )
+    assert all(row["age"] == 21 for row in result)
+
+
+@pytest.mark.asyncio
+async def test_async_unit_of_work():
+    async with dao.async_unit_of_work():
+        hero = await dao.async_save(Hero(name="async_uow", secret_name="s", age=1))
+        await dao.async_execute(
+            "update hero set age= :age where id= :id", age=5, id=hero.id
+        )
+    assert (await dao.async_find_one(Hero, id=hero.id)).age == 5
+
+
+@pytest.mark.asyncio
+async def test_async_batch_update_and_delete():
+    heroes = [Hero(name="async_bu", secret_name="s", age=i) for i in range(3)]
+    await dao.async_batch_save(heroes)
+    for hero in heroes:
+        hero.age = 50
+    assert await dao.async_batch_update(heroes, fields=["age"]) == 3
+    result = await dao.async_find_by(Hero, name="async_bu", age=50)
+    assert len(result) >= 3
+    assert await dao.async_batch_delete(Hero, [hero.id for hero in heroes]) == 3
+
+
+@pytest.mark.asyncio
+async def test_async_get_by_id():
+    hero = await dao.async_save(Hero(name="async_get", secret_name="s", age=1))
+    assert (await dao.async_get_by_id(Hero, hero.id)).name == "async_get"
+    assert await dao.async_get_many_by_ids(Hero, [-1]) == []
+
+
+@pytest.mark.asyncio
+async def test_async_fan_out():
+    result = await databases.async_fan_out(
+        queries={
+            "a": ("default", "select 1 as n", None),
+            "b": ("default", "select 2 as n", None),
+        }
+    )
+    assert result.ok
+    assert result.results["b"][0]["n"] == 2
+
+
+@pytest.mark.asyncio
+async def test_async_projection():
+    await dao.async_save(HeroStory(name="async_deferred", story="long story"))
+    rows = await dao.async_find_by(HeroStory, columns=["story"], name="async_deferred")
+    assert rows[0].story == "long story"
+    story = await dao.async_one_or_none(HeroStory, name="async_deferred")
+    assert "story" not in story.__dict__
+    await dao.async_load_deferred([story])
+    assert story.story == "long story"
+    lazy = await dao.async_one_or_none(HeroStory, name="async_deferred")
+    # the sync engine would block the event loop
+    with pytest.raises(DAOException):
+        _ = lazy.story
+    await dao.async_load_deferred(lazy)
+    assert lazy.story == "long story"
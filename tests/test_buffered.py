@@ -0,0 +1,91 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from qpydao import AsyncBufferedWriter, BufferedWriter, DAOException
+
+from .fixtures_db import Hero, dao, init_db_test
+
+init_db_test()
+
+
+def count_heroes(name):
+    return dao.count(Hero, name=name)
+
+
+def test_buffered_writer_flush_by_size():
+    before = count_heroes("buffered_size")
+    with BufferedWriter(dao, max_rows=10, max_delay=60) as writer:
+        for i in range(25):
+            writer.save(Hero(name="buffered_size", secret_name="s", age=i))
+        deadline = time.monotonic() + 5
+        while writer.stats().flushed_rows < 20 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert writer.stats().flushed_rows >= 20
+    stats = writer.stats()
+    assert stats.saved == stats.flushed_rows == 25
+    assert stats.pending == 0
+    assert count_heroes("buffered_size") == before + 25
+
+
+def test_buffered_writer_flush_by_time():
+    before = count_heroes("buffered_time")
+    writer = BufferedWriter(dao, max_rows=1000, max_delay=0.05)
+    writer.save(Hero(name="buffered_time", secret_name="s", age=1))
+    deadline = time.monotonic() + 5
+    while writer.stats().flushes == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert count_heroes("buffered_time") == before + 1
+    writer.close()
+    with pytest.raises(DAOException):
+        writer.save(Hero(name="buffered_time", secret_name="s", age=2))
+
+
+def test_buffered_writer_backpressure():
+    release = threading.Event()
+
+    class SlowClient:
+        def batch_insert(self, entity, rows, chunk_size=None):
+            release.wait()
+            return len(rows)
+
+    writer = BufferedWriter(SlowClient(), max_rows=2, max_delay=0, max_pending=4)
+    for i in range(4):
+        writer.save(Hero(name="blocked", secret_name="s", age=i))
+    with pytest.raises(DAOException):
+        writer.save(Hero(name="blocked", secret_name="s", age=5), timeout=0.05)
+    assert writer.stats().blocked == 1
+    release.set()
+    writer.save(Hero(name="blocked", secret_name="s", age=6), timeout=5)
+    writer.close()
+    assert writer.stats().flushed_rows == 5
+
+
+def test_buffered_writer_errors():
+    failures = []
+    saved = dao.save(Hero(name="buffered_original", secret_name="s"))
+    writer = BufferedWriter(dao, max_rows=10, max_delay=60, on_error=failures.append)
+    writer.save(Hero(id=saved.id, name="duplicate", secret_name="s"))
+    writer.close()
+    assert writer.stats().failed_rows == 1
+    assert failures[0].table == "hero"
+    assert failures[0].rows[0]["name"] == "duplicate"
+    assert failures == writer.failures
+
+
+@pytest.mark.asyncio
+async def test_async_buffered_writer():
+    before = count_heroes("async_buffered")
+    async with AsyncBufferedWriter(dao, max_rows=10, max_delay=0.05) as writer:
+        for i in range(15):
+            await writer.save(Hero(name="async_buffered", secret_name="s", age=i))
+            if i == 9:
+                # the flush task runs once save yields to the loop
+                await asyncio.sleep(0.01)
+                assert writer.stats().flushed_rows == 10
+    stats = writer.stats()
+    assert stats.flushed_rows == 15
+    assert stats.flushes == 2
+    assert count_heroes("async_buffered") == before + 15
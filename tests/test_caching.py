@@ -0,0 +1,33 @@
+import time
+
+from qpydao import LRUCache, ResultCache
+
+
+def test_lru_eviction():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert "b" not in cache
+    assert cache.get("a") == 1
+
+
+def test_ttl_expiry():
+    cache = LRUCache(maxsize=2, ttl=0.01)
+    cache.set("a", 1)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert cache.stats().misses == 1
+
+
+def test_invalidate_tables():
+    cache = ResultCache(maxsize=10)
+    cache.set("heroes", [1], tables=["hero"])
+    cache.set("teams", [2], tables=["team"])
+    cache.invalidate_tables({"hero"})
+    assert "heroes" not in cache
+    assert "teams" in cache
+    assert cache.stats().invalidations == 1
+    cache.invalidate_tables(None)
+    assert len(cache) == 0
@@ -2,11 +2,15 @@
 # postgresql: postgresql: // scott: tiger @ localhost:5432 / mydatabase
 # jdbc:postgresql://localhost:5432/mydatabase?currentSchema=myschema
 # pip install psycopg2-binary
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
+from sqlalchemy import event
 from sqlmodel import select
 
-from qpydao.core.sql_utils import SqlResultMapper
-from tests.fixtures_db import Hero, dao, init_db_test
+from qpydao import DAOException
+from qpydao.sql_utils import SqlBuilder, SqlResultMapper
+from tests.fixtures_db import Hero, HeroStory, dao, init_db_test
 
 init_db_test()
 
@@ -91,3 +95,300 @@ def test_update_by():
     print(r2.__class__)
     dao.update_by_id(r2)
     print(dao.find_by(Hero, id=r2.id)[0])
+
+
+def test_stream_query():
+    rows = list(dao.stream_query("select * from hero", batch_size=2))
+    assert len(rows) == len(dao.plain_query("select * from hero"))
+
+
+def test_stream_models():
+    heroes = list(dao.stream_models("select * from hero", Hero, batch_size=2))
+    assert all(isinstance(hero, Hero) for hero in heroes)
+    heroes = list(dao.stream_models(select(Hero), batch_size=2))
+    assert all(isinstance(hero, Hero) for hero in heroes)
+
+
+def test_batch_save_sets_ids():
+    instances = [Hero(name=f"batch{i}", secret_name="s", age=i) for i in range(5)]
+    dao.batch_save(instances, chunk_size=2)
+    assert all(instance.id is not None for instance in instances)
+
+
+def test_batch_insert():
+    rows = [{"name": "bulk", "secret_name": "s", "age": i} for i in range(5)]
+    assert dao.batch_insert(Hero, rows, chunk_size=2) == 5
+    ids = dao.batch_insert(Hero, rows, returning=True)
+    assert len(ids) == 5
+
+
+def test_batch_upsert():
+    hero = dao.save(Hero(name="upsert", secret_name="s", age=1))
+    rows = [{"id": hero.id, "name": "upsert", "secret_name": "s", "age": 2}]
+    dao.batch_upsert(Hero, rows, conflict_keys=["id"])
+    assert dao.find_one(Hero, id=hero.id).age == 2
+
+
+def test_query_columnar():
+    columns = dao.query_columnar("select id, age from hero", output="lists")
+    rows = dao.plain_query("select id, age from hero")
+    assert columns["id"] == [row["id"] for row in rows]
+    numpy = pytest.importorskip("numpy")
+    arrays = dao.query_columnar("select id, age from hero", batch_size=2)
+    assert isinstance(arrays["id"], numpy.ndarray)
+    pytest.importorskip("pyarrow")
+    table = dao.query_columnar("select id, age from hero", output="arrow")
+    assert table.num_rows == len(rows)
+
+
+def test_unit_of_work_commits_once():
+    with dao.unit_of_work() as session:
+        hero = dao.save(Hero(name="uow", secret_name="s", age=1))
+        hero.age = 2
+        dao.update_by_id(hero)
+        dao.execute("update hero set age= :age where id= :id", age=3, id=hero.id)
+        assert dao.find_one(Hero, id=hero.id).age == 3
+        assert dao.in_transaction()
+        assert session is dao._session_var.get()
+    assert not dao.in_transaction()
+    assert dao.find_one(Hero, id=hero.id).age == 3
+
+
+def test_unit_of_work_rollback():
+    with pytest.raises(RuntimeError), dao.unit_of_work():
+        hero = dao.save(Hero(name="uow_rollback", secret_name="s", age=1))
+        raise RuntimeError("rollback")
+    assert dao.find_one(Hero, id=hero.id) is None
+
+
+def test_unit_of_work_invalidates_after_commit():
+    hero = dao.save(Hero(name="uow_cache", secret_name="s", age=1))
+    assert dao.get_by_id(Hero, hero.id).age == 1
+    with pytest.raises(RuntimeError), dao.unit_of_work():
+        dao.update_by_id(Hero(id=hero.id, name="uow_cache", secret_name="s", age=9))
+        raise RuntimeError("rollback")
+    hits = dao.identity_map.stats().hits
+    assert dao.get_by_id(Hero, hero.id).age == 1
+    assert dao.identity_map.stats().hits == hits + 1
+    with dao.unit_of_work():
+        dao.update_by_id(Hero(id=hero.id, name="uow_cache", secret_name="s", age=2))
+        # other threads read the committed row until the unit of work commits
+        with ThreadPoolExecutor(1) as pool:
+            assert pool.submit(dao.get_by_id, Hero, hero.id).result().age == 1
+    assert dao.get_by_id(Hero, hero.id).age == 2
+
+
+def test_paginate():
+    dao.delete_by(Hero, name="page")
+    rows = [{"name": "page", "secret_name": "s", "age": i % 3} for i in range(7)]
+    dao.batch_insert(Hero, rows)
+    seen = []
+    page = dao.paginate(
+        Hero, order_by=("-age",), page_size=3, count="exact", name="page"
+    )
+    assert page.total == 7
+    while True:
+        seen.extend(hero.id for hero in page.items)
+        if not page.has_more:
+            break
+        page = dao.paginate(
+            Hero, order_by=("-age",), after=page.next_cursor, page_size=3, name="page"
+        )
+    assert len(seen) == len(set(seen)) == 7
+
+
+def test_paginate_nullable():
+    dao.delete_by(Hero, name="page_null")
+    ages = [3, None, 1, None, 2, 0, None, 4]
+    dao.batch_insert(
+        Hero, [{"name": "page_null", "secret_name": "s", "age": a} for a in ages]
+    )
+    for order_by in ("age", "-age"):
+        seen, after = [], None
+        while True:
+            page = dao.paginate(
+                Hero, order_by=order_by, after=after, page_size=2, name="page_null"
+            )
+            seen.extend(hero.age for hero in page.items)
+            if not page.has_more:
+                break
+            after = page.next_cursor
+        numbers = sorted(a for a in ages if a is not None)
+        if order_by == "-age":
+            numbers.reverse()
+        assert seen == numbers + [None, None, None]
+
+    sql = "select id, age from hero where name= :name"
+    seen, after = [], None
+    while True:
+        page = dao.paginate_query(
+            sql,
+            ("age", "id"),
+            after=after,
+            page_size=3,
+            nullable=["age"],
+            name="page_null",
+        )
+        seen.extend(row["age"] for row in page.items)
+        if not page.has_more:
+            break
+        after = page.next_cursor
+    assert seen == [0, 1, 2, 3, 4, None, None, None]
+    with pytest.raises(DAOException):
+        dao.paginate_query(sql, ("age", "id"), after=after, name="page_null")
+
+
+def test_paginate_query():
+    dao.delete_by(Hero, name="page_sql")
+    rows = [{"name": "page_sql", "secret_name": "s", "age": i} for i in range(5)]
+    dao.batch_insert(Hero, rows)
+    sql = "select id, age from hero where name= :name"
+    page = dao.paginate_query(
+        sql, ("age", "id"), page_size=2, count=True, name="page_sql"
+    )
+    assert [row["age"] for row in page.items] == [0, 1]
+    assert page.total == 5
+    page = dao.paginate_query(
+        sql, ("age", "id"), after=page.next_cursor, page_size=2, name="page_sql"
+    )
+    assert [row["age"] for row in page.items] == [2, 3]
+
+
+def test_batch_update():
+    heroes = [Hero(name=f"bu{i}", secret_name="s", age=i) for i in range(4)]
+    dao.batch_save(heroes)
+    loaded = dao.get_many_by_ids(Hero, [hero.id for hero in heroes])
+    for hero in loaded:
+        hero.age = 100
+    loaded[0].secret_name = "changed"
+    groups = SqlBuilder.group_updates(loaded)
+    assert sorted(columns for _, columns in groups) == [
+        ("age",),
+        ("age", "secret_name"),
+    ]
+    assert dao.batch_update(loaded, chunk_size=2) == len(loaded)
+    assert dao.batch_update(loaded) == 0
+    assert all(dao.find_one(Hero, id=hero.id).age == 100 for hero in loaded)
+    assert dao.find_one(Hero, id=loaded[0].id).secret_name == "changed"
+    missing = Hero(id=-1, name="bu_missing", secret_name="s", age=1)
+    assert dao.batch_update([missing], fields=["age"]) == 0
+
+
+def test_batch_delete():
+    ids = dao.batch_insert(
+        Hero, [{"name": "bd", "secret_name": "s"} for _ in range(5)], returning=True
+    )
+    assert dao.batch_delete(Hero, [row[0] for row in ids], chunk_size=2) == 5
+    assert dao.find_by(Hero, name="bd") == []
+
+
+def test_get_by_id():
+    heroes = [Hero(name=f"get{i}", secret_name="s", age=i) for i in range(3)]
+    dao.batch_save(heroes)
+    ids = [hero.id for hero in heroes]
+    first = dao.get_by_id(Hero, ids[0])
+    assert first.name == "get0"
+    hits = dao.identity_map.stats().hits
+    cached = dao.get_by_id(Hero, ids[0])
+    assert dao.identity_map.stats().hits == hits + 1
+    assert cached is not first and cached == first
+    # callers get their own copies, changing one leaves the cache untouched
+    cached.age = 99
+    many = dao.get_many_by_ids(Hero, [ids[2], -1, ids[0], ids[1]])
+    assert [hero.name for hero in many] == ["get2", "get0", "get1"]
+    assert many[1].age == 0
+    first.age = 42
+    dao.update_by_id(first)
+    assert dao.get_by_id(Hero, ids[0]).age == 42
+    dao.execute("update hero set age= :age where id= :id", age=7, id=ids[1])
+    assert dao.get_by_id(Hero, ids[1]).age == 7
+
+
+def test_find_one_limit():
+    statement, _ = SqlBuilder.prepare_select_one(Hero, name="test3")
+    assert "LIMIT" in str(statement)
+    assert dao.find_one(Hero, name="test3").name == "test3"
+
+
+def test_find_by_criteria():
+    dao.delete_by(Hero, name__startswith="criteria_")
+    dao.batch_insert(
+        Hero,
+        [Hero(name=f"criteria_{i}", secret_name="100%_sure", age=i) for i in range(10)],
+    )
+    found = dao.find_by(Hero, name__startswith="criteria_", age__gte=3, age__lt=6)
+    assert sorted(h.age for h in found) == [3, 4, 5]
+    found = dao.find_by(Hero, name__startswith="criteria_", age__between=(8, 9))
+    assert sorted(h.age for h in found) == [8, 9]
+    found = dao.find_by(Hero, name__in=["criteria_1", "criteria_2"], age__ne=2)
+    assert [h.name for h in found] == ["criteria_1"]
+    assert dao.find_by(Hero, name__contains="riteria_7")[0].age == 7
+    assert dao.find_by(Hero, name__ilike="%RITERIA_7")[0].age == 7
+    # % and _ in the value are matched literally
+    assert not dao.find_by(Hero, secret_name__startswith="100%x")
+    assert dao.count(Hero, name__startswith="criteria_", age__in=[1, 2, 3]) == 3
+    dao.delete_by(Hero, name__startswith="criteria_", age__gte=5)
+    assert dao.count(Hero, name__startswith="criteria_") == 5
+
+
+def test_index_report():
+    report = dao.index_report(Hero, id__gte=10, name__contains="x", age=1)
+    assert report.supported == ["id__gte"]
+    missing = {advice.column: advice for advice in report.missing}
+    assert missing["name"].kind == "trgm"
+    assert "gin_trgm_ops" in missing["name"].suggestion
+    assert missing["age"].suggestion.startswith("CREATE INDEX ix_hero_age")
+    assert not report.ok
+    prefix = dao.index_report(Hero, name__startswith="x").missing[0]
+    assert prefix.kind == "pattern"
+    if dao.engine.dialect.name == "postgresql":
+        assert "text_pattern_ops" in prefix.suggestion
+
+
+def test_find_by_projection():
+    dao.delete_by(Hero, name="projected")
+    dao.save(Hero(name="projected", secret_name="s", age=3))
+    rows = dao.find_by(Hero, columns=["name", "age"], name="projected")
+    assert [(row.name, row.age) for row in rows] == [("projected", 3)]
+    assert dao.one_or_none(Hero, columns="age", name="projected") == (3,)
+    hero = dao.find_one(Hero, exclude=["secret_name"], name="projected")
+    assert "secret_name" not in hero.__dict__
+    assert hero.secret_name == "s"
+    rows = dao.query_for_model(
+        select(Hero).where(Hero.name == "projected"), columns=["id"]
+    )
+    assert rows[0].id == hero.id
+
+
+def test_deferred_columns():
+    dao.delete_by(HeroStory, name="deferred")
+    dao.batch_save([HeroStory(name="deferred", story=f"story {i}") for i in range(3)])
+    stories = dao.find_by(HeroStory, name="deferred")
+    assert len(stories) == 3
+    assert "story" not in stories[0].model_dump()
+    assert "story" not in stories[0].model_dump_json()
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(dao.engine, "before_cursor_execute", count)
+    try:
+        assert stories[2].story.startswith("story")
+        assert all("story" in story.__dict__ for story in stories)
+    finally:
+        event.remove(dao.engine, "before_cursor_execute", count)
+    # the first access loads the column of the whole result
+    assert len(statements) == 1
+    dao.load_deferred(stories)
+    assert sorted(s.story for s in stories) == ["story 0", "story 1", "story 2"]
+    assert dao.find_by(HeroStory, exclude=(), name="deferred")[0].story is not None
+    story = dao.get_by_id(HeroStory, stories[0].id)
+    assert dao.load_deferred(story, "story").story == stories[0].story
+    assert dao.get_by_id(HeroStory, stories[0].id).story == stories[0].story
+    lazy = dao.find_one(HeroStory, exclude=["story"], id=stories[1].id)
+    assert lazy.story == stories[1].story
+    gone = dao.find_one(HeroStory, id=stories[2].id)
+    dao.delete_by(HeroStory, id=stories[2].id)
+    with pytest.raises(DAOException):
+        _ = gone.story
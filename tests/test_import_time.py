@@ -0,0 +1,46 @@
+import subprocess
+import sys
+
+# generous budget for `import qpydao` in a fresh interpreter, seconds
+IMPORT_BUDGET = 0.2
+
+_PROBE = """
+import sys, time
+start = time.perf_counter()
+import qpydao
+elapsed = time.perf_counter() - start
+heavy = [m for m in ("sqlalchemy", "sqlmodel", "qpyconf", "loguru") if m in sys.modules]
+print(elapsed)
+print(",".join(heavy))
+"""
+
+
+def test_import_is_lazy():
+    output = subprocess.run(  # noqa: S603
+        [sys.executable, "-c", _PROBE], capture_output=True, text=True, check=True
+    ).stdout.splitlines()
+    print(output)
+    assert float(output[0]) < IMPORT_BUDGET
+    assert output[1] == ""
+
+
+def test_lazy_attributes():
+    import qpydao
+
+    assert "DatabaseClient" in dir(qpydao)
+    assert qpydao.DatabaseClient.__name__ == "DatabaseClient"
+    assert qpydao.databases is qpydao.Databases()
+    assert qpydao.db is qpydao.databases.default_client()
+
+
+def test_logger_attribute():
+    # loading the submodule must not replace qpydao.dao_logger with a module
+    probe = (
+        "import loguru, qpydao, qpydao.database_client\n"
+        "from qpydao.dao_logger import dao_logger\n"
+        "print(dao_logger is loguru.logger and qpydao.dao_logger is loguru.logger)"
+    )
+    output = subprocess.run(  # noqa: S603
+        [sys.executable, "-c", probe], capture_output=True, text=True, check=True
+    ).stdout
+    assert output.strip() == "True"
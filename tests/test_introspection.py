@@ -0,0 +1,60 @@
+from qpydao import DatabaseClient, DatabaseConfig, SchemaIntrospector, init_database
+
+from .fixtures_db import Hero, dao
+
+
+def test_introspect_table_meta(tmp_path):
+    init_database(dao)
+    introspector = SchemaIntrospector(dao, cache_dir=tmp_path)
+    snapshot = introspector.refresh()
+    hero = snapshot.tables[Hero.__tablename__]
+    fields = {field.field_name: field for field in hero.fields}
+    assert fields["id"].primary_key
+    assert not fields["name"].nullable
+    assert fields["age"].nullable
+    assert fields["name"].code_type == "str"
+    assert introspector.cache_file.exists()
+    assert introspector.is_current(Hero.metadata)
+
+
+def test_introspect_in_memory_by_default():
+    assert DatabaseConfig.model_fields["schema_cache_dir"].default is None
+    client = DatabaseClient(dao.config.model_copy(update={"schema_cache_dir": None}))
+    introspector = SchemaIntrospector(client)
+    assert introspector.cache_file is None
+    assert Hero.__tablename__ in introspector.refresh().tables
+    assert introspector.is_current(Hero.metadata)
+    client.close()
+
+
+def test_introspect_incremental(tmp_path):
+    init_database(dao)
+    introspector = SchemaIntrospector(dao, cache_dir=tmp_path)
+    introspector.refresh()
+    assert Hero.__tablename__ in introspector.reflected
+
+    # a new introspector reads the cache file, nothing changed
+    introspector = SchemaIntrospector(dao, cache_dir=tmp_path)
+    introspector.refresh()
+    assert introspector.reflected == []
+
+    dao.execute("CREATE TABLE introspect_probe (id INTEGER PRIMARY KEY, label TEXT)")
+    try:
+        assert not introspector.is_current()
+        snapshot = introspector.refresh()
+        assert introspector.reflected == ["introspect_probe"]
+        assert "introspect_probe" in snapshot.tables
+    finally:
+        dao.execute("DROP TABLE introspect_probe")
+    snapshot = introspector.refresh()
+    assert "introspect_probe" not in snapshot.tables
+
+
+def test_introspect_unwritable_cache(tmp_path):
+    blocker = tmp_path / "not_a_dir"
+    blocker.write_text("")
+    introspector = SchemaIntrospector(dao, cache_dir=blocker / "cache")
+    snapshot = introspector.refresh()
+    assert Hero.__tablename__ in snapshot.tables
+    assert not introspector.cache_file.exists()
+    assert introspector.is_current(Hero.metadata)
@@ -1,8 +1,12 @@
+import pytest
+from sqlalchemy import event
+
 from qpydao import databases
-from qpydao.core.decorators import native_sql
-from qpydao.repository import RepositoryMeta
+from qpydao.decorators import native_sql
+from qpydao.repository import RepositoryMeta, gather
 
 from .fixtures_db import *
+from .fixtures_db import Hero
 
 init_db_test()
 
@@ -23,6 +27,9 @@ class HeroRepo(metaclass=RepositoryMeta, base_type=Hero):
     def update_name(self, name, new_name):
         pass
 
+    @native_sql("select * from hero where name= :name", cache=True, ttl=60)
+    def find_hero_by_name_cached(self, name): ...
+
 
 def test_default_db():
     db = databases.get_db("default")
@@ -36,3 +43,95 @@ def test_repo():
     print(result)
     repo.find_hero_by_name(name="new_test")
     repo.update_name(name="test", new_name="new_test")
+
+
+def test_repo_cache():
+    repo = HeroRepo()
+    cache = databases.get_db("default").result_cache
+    first = repo.find_hero_by_name_cached(name="test6")
+    hits = cache.stats().hits
+    assert repo.find_hero_by_name_cached(name="test6") == first
+    assert cache.stats().hits == hits + 1
+    repo.update_name(name="not_exists", new_name="still_not_exists")
+    repo.find_hero_by_name_cached(name="test6")
+    assert cache.stats().hits == hits + 1
+
+
+def test_repo_cache_returns_copies():
+    repo = HeroRepo()
+    first = repo.find_hero_by_name_cached(name="test6")
+    assert first
+    first[0].age = -1
+    cached = repo.find_hero_by_name_cached(name="test6")
+    assert cached[0] is not first[0]
+    assert cached[0].age != -1
+
+
+def test_repo_cache_invalidated_after_commit():
+    repo = HeroRepo()
+    client = databases.get_db("default")
+    repo.find_hero_by_name_cached(name="test6")
+
+    def read_before_commit(conn):
+        # a concurrent reader still sees the rows before the write
+        repo.find_hero_by_name_cached(name="test6")
+
+    event.listen(client.engine, "commit", read_before_commit)
+    try:
+        repo.update_name(name="not_exists", new_name="still_not_exists")
+    finally:
+        event.remove(client.engine, "commit", read_before_commit)
+    hits = client.result_cache.stats().hits
+    repo.find_hero_by_name_cached(name="test6")
+    assert client.result_cache.stats().hits == hits
+
+
+class HeroPageRepo(metaclass=RepositoryMeta, base_type=Hero):
+    @native_sql("select * from hero", paginate=True, order_by=("-id",))
+    def find_hero_page(self, after=None, page_size=50): ...
+
+
+def test_repo_paginate():
+    repo = HeroPageRepo()
+    page = repo.find_hero_page(page_size=2)
+    assert len(page.items) <= 2
+    assert all(isinstance(hero, Hero) for hero in page.items)
+    if page.has_more:
+        next_page = repo.find_hero_page(after=page.next_cursor, page_size=2)
+        assert next_page.items[0].id < page.items[-1].id
+
+
+class AsyncHeroRepo(metaclass=RepositoryMeta, base_type=Hero):
+    @native_sql("select * from hero where name= :name")
+    async def find_hero_by_name(self, name): ...
+
+    @native_sql("update hero set age= :age where name= :name", modify=True)
+    async def update_age(self, name, age): ...
+
+    @native_sql("select * from hero", paginate=True, order_by=("-id",))
+    async def find_hero_page(self, after=None, page_size=50): ...
+
+
+@pytest.mark.asyncio
+async def test_async_repo():
+    repo = AsyncHeroRepo()
+    await repo.update_age(name="test6", age=190)
+    heroes = await repo.find_hero_by_name(name="test6")
+    assert heroes and all(isinstance(hero, Hero) for hero in heroes)
+    assert all(hero.age == 190 for hero in heroes)
+    page = await repo.find_hero_page(page_size=2)
+    assert len(page.items) <= 2
+    if page.has_more:
+        next_page = await repo.find_hero_page(after=page.next_cursor, page_size=2)
+        assert next_page.items[0].id < page.items[-1].id
+
+
+@pytest.mark.asyncio
+async def test_gather():
+    repo = AsyncHeroRepo()
+    names = ["test3", "test4", "test6", "not_exists"]
+    results = await gather(
+        *(repo.find_hero_by_name(name=name) for name in names), concurrency=2
+    )
+    assert [bool(heroes) for heroes in results] == [True, True, True, False]
+    assert results[0][0].name == "test3"
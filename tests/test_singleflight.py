@@ -0,0 +1,85 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from qpydao import AsyncSingleFlight, SingleFlight
+
+from .fixtures_db import dao
+
+
+def test_single_flight_threads():
+    flight = SingleFlight()
+    executions = []
+    started = threading.Event()
+
+    def query():
+        executions.append(1)
+        started.set()
+        time.sleep(0.1)
+        return [1, 2, 3]
+
+    results = []
+
+    def call():
+        results.append(flight.do("key", query))
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait()
+    followers = [threading.Thread(target=call) for _ in range(4)]
+    for thread in followers:
+        thread.start()
+    for thread in [leader, *followers]:
+        thread.join()
+    assert len(executions) == 1
+    assert results == [[1, 2, 3]] * 5
+    stats = flight.stats()
+    assert (stats.calls, stats.executions, stats.coalesced) == (5, 1, 4)
+    assert stats.in_flight == 0
+
+
+def test_single_flight_error():
+    flight = SingleFlight()
+
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        flight.do("key", fail)
+    assert flight.do("key", lambda: 1) == 1
+
+
+@pytest.mark.asyncio
+async def test_async_single_flight():
+    flight = AsyncSingleFlight()
+    executions = []
+
+    async def query():
+        executions.append(1)
+        await asyncio.sleep(0.05)
+        return "rows"
+
+    results = await asyncio.gather(*(flight.do("key", query) for _ in range(5)))
+    assert results == ["rows"] * 5
+    assert len(executions) == 1
+    assert flight.stats().coalesced == 4
+
+
+@pytest.mark.asyncio
+async def test_client_coalescing():
+    dao.enable_coalescing()
+    try:
+        sql = "select * from hero where name= :name"
+        rows = await asyncio.gather(
+            *(dao.async_plain_query(sql, name="test3") for _ in range(5))
+        )
+        assert all(r == rows[0] for r in rows)
+        assert dao.plain_query(sql, name="test3") == rows[0]
+        stats = dao.coalescing_stats()
+        print(stats)
+        assert stats.calls == 6
+        assert stats.executions + stats.coalesced == stats.calls
+    finally:
+        dao.disable_coalescing()
@@ -0,0 +1,98 @@
+import pytest
+
+from qpydao import DAOException, SqlBuilder, SqlResultMapper
+
+from .fixtures_db import Hero, HeroStory
+
+
+def test_select_statement_is_cached():
+    SqlBuilder.statement_cache.clear()
+    first, params = SqlBuilder.prepare_select(Hero, name="a", age=1)
+    second, other_params = SqlBuilder.prepare_select(Hero, age=2, name="b")
+    assert first is second
+    assert params == {"f_name": "a", "f_age": 1}
+    assert other_params == {"f_name": "b", "f_age": 2}
+    stats = SqlBuilder.cache_stats()
+    assert stats.hits == 1
+    assert stats.misses == 1
+
+
+def test_none_filter_is_null():
+    statement = SqlBuilder.build_select_query(Hero, age=None)
+    assert "IS NULL" in str(statement)
+
+
+def test_plain_sql_is_cached():
+    sql = "select * from hero where name= :name"
+    assert SqlBuilder.from_plain_sql(sql) is SqlBuilder.from_plain_sql(sql)
+
+
+def test_cache_is_bounded():
+    cache = SqlBuilder.statement_cache
+    maxsize = cache.maxsize
+    cache.maxsize = 2
+    try:
+        for i in range(5):
+            SqlBuilder.from_plain_sql(f"select {i}")
+        assert len(cache) == 2
+    finally:
+        cache.maxsize = maxsize
+
+
+def test_map_without_validation():
+    rows = [{"id": 1, "name": "a", "secret_name": "s", "age": 1, "extra": 1}]
+    validated = SqlResultMapper.sql_result_to_model(rows, Hero)
+    constructed = SqlResultMapper.sql_result_to_model(rows, Hero, validate=False)
+    assert validated[0].model_dump() == constructed[0].model_dump()
+    # required fields missing from the row are left unset, defaults are filled
+    partial = SqlResultMapper.sql_result_to_model([{"name": "a"}], Hero, validate=False)
+    dumped = partial[0].model_dump()
+    assert "secret_name" not in dumped
+    assert dumped["name"] == "a" and dumped["age"] is None
+
+
+def test_map_to_records():
+    rows = [{"id": 1, "name": "a"}, {"id": 2, "name": "b"}]
+    records = SqlResultMapper.sql_result_to_records(rows, Hero)
+    assert records[1].name == "b"
+    assert type(records[0]).__name__ == "HeroRecord"
+
+
+def test_criteria_statements():
+    statement, params = SqlBuilder.prepare_select(
+        Hero, age__between=(1, 10), name__startswith="te_st", id__in=[1, 2]
+    )
+    sql = str(statement)
+    assert "BETWEEN" in sql and "LIKE" in sql and "IN" in sql
+    assert params["f_name__startswith"] == "te\\_st%"
+    assert params["f_age__between_lo"] == 1
+    again, _ = SqlBuilder.prepare_select(
+        Hero, age__between=(5, 6), name__startswith="x", id__in=[3]
+    )
+    assert again is statement
+    contains, params = SqlBuilder.prepare_select(Hero, name__contains="x")
+    assert "LIKE" in str(contains) and "ILIKE" not in str(contains).upper()
+    assert params["f_name__contains"] == "%x%"
+    null_statement, params = SqlBuilder.prepare_select(Hero, age__isnull=True)
+    assert "IS NULL" in str(null_statement) and params == {}
+    with pytest.raises(DAOException):
+        SqlBuilder.prepare_select(Hero, missing__gte=1)
+    with pytest.raises(DAOException):
+        SqlBuilder.prepare_select(Hero, age__between=1)
+
+
+def test_projection_statements():
+    statement, _ = SqlBuilder.prepare_select(Hero, columns=["id", "name"], age=1)
+    assert [c.name for c in statement.selected_columns] == ["id", "name"]
+    again, _ = SqlBuilder.prepare_select(Hero, columns=["id", "name"], age=2)
+    assert again is statement
+    deferred, _ = SqlBuilder.prepare_select(HeroStory, name="x")
+    assert "herostory.story" not in str(deferred)
+    loaded, _ = SqlBuilder.prepare_select(HeroStory, exclude=(), name="x")
+    assert "herostory.story" in str(loaded)
+    with pytest.raises(DAOException):
+        SqlBuilder.prepare_select(Hero, columns=["missing"])
+    with pytest.raises(DAOException):
+        SqlBuilder.prepare_select(Hero, columns=["name"], exclude=["age"])
+    with pytest.raises(DAOException):
+        SqlBuilder.prepare_select(Hero, exclude=["id"])
@@ -0,0 +1,92 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import make_url
+from sqlmodel import SQLModel
+
+from qpydao import BaseIDModel, DAOException, databases, init_database, key_ranges
+
+from .fixtures_db import Hero, dao
+
+
+class HeroArchive(BaseIDModel, table=True, extend_existing=True):
+    name: str
+    secret_name: str
+    age: int | None = None
+    created_date: datetime = datetime.now()
+
+
+def test_key_ranges():
+    init_database(dao)
+    dao.batch_insert(
+        Hero, [Hero(name=f"range{i}", secret_name="copy", age=i) for i in range(20)]
+    )
+    ranges = key_ranges(dao, Hero, "id", 4)
+    assert len(ranges) <= 4
+    assert ranges[0][0] == dao.plain_query("select min(id) as lo from hero")[0]["lo"]
+    assert ranges[-1][1] == dao.plain_query("select max(id) as hi from hero")[0]["hi"]
+    assert key_ranges(dao, Hero, "name", 4) == [(None, None)]
+    assert key_ranges(dao, Hero, None, 4) == [(None, None)]
+    # rows with a NULL age would be in no range
+    with pytest.raises(DAOException):
+        key_ranges(dao, Hero, "age", 4)
+
+
+@pytest.fixture
+def copy_target(tmp_path):
+    """Another database, sqlite writers wait for readers of the same file."""
+    url = make_url(dao.config.db_url)
+    if url.get_backend_name() != "sqlite":
+        yield dao, "default"
+        return
+    target = url.set(database=str(tmp_path / "copy_target.db"))
+    client = databases.register_db(
+        "copy_target",
+        dao.config.model_copy(update={"db_url": target.render_as_string()}),
+    )
+    SQLModel.metadata.create_all(client.engine)
+    yield client, "copy_target"
+    databases.unregister_db("copy_target")
+
+
+def test_copy_table(copy_target):
+    init_database(dao)
+    dao.batch_insert(
+        Hero, [Hero(name=f"copy{i}", secret_name="copy", age=i) for i in range(300)]
+    )
+    target, dst = copy_target
+    target.execute("DELETE FROM heroarchive")
+    seen = []
+    stats = databases.copy_table(
+        "default",
+        dst,
+        Hero,
+        HeroArchive,
+        workers=3,
+        batch_size=50,
+        queue_size=2,
+        method="insert",
+        progress=lambda s: seen.append(s.rows),
+    )
+    print(stats)
+    assert stats.ok
+    assert stats.ranges_done == stats.ranges
+    assert stats.rows == dao.count(Hero) == target.count(HeroArchive)
+    assert seen[-1] == stats.rows
+    assert stats.rows_per_sec > 0
+    copied = target.plain_query("select id, name from heroarchive order by id")
+    assert copied == dao.plain_query("select id, name from hero order by id")
+
+
+def test_copy_table_error(copy_target):
+    init_database(dao)
+    target, dst = copy_target
+    target.execute("DELETE FROM heroarchive")
+    dao.batch_insert(Hero, [Hero(name="dup", secret_name="copy", age=1)])
+    databases.copy_table("default", dst, Hero, HeroArchive, key_column=None)
+    # copying again collides on the primary keys
+    stats = databases.copy_table(
+        "default", dst, Hero, HeroArchive, key_column=None, method="insert"
+    )
+    assert not stats.ok
+    assert stats.errors[0].startswith("batch of")